@@ -1,4 +1,6 @@
 # Gunicorn configuration for production
+import gc
+import sys
 
 bind = "0.0.0.0:5000"
 workers = 2  # 2 workers for 2 CPU cores
@@ -10,6 +12,11 @@ max_requests_jitter = 50
 timeout = 120
 keepalive = 2
 
+# Load the app (CSV data, indexes) once in the master; workers are forked
+# from it and share the read-only dataframes copy-on-write. Matches and notes
+# live in SQLite and are read through the change-feed cache in every worker.
+preload_app = True
+
 # Logging
 accesslog = "/var/log/gunicorn/access.log"
 errorlog = "/var/log/gunicorn/error.log"
@@ -23,4 +30,14 @@ daemon = False
 pidfile = '/var/run/gunicorn/chemopad.pid'
 user = None
 group = None
-tmp_upload_dir = None
\ No newline at end of file
+tmp_upload_dir = None
+
+def when_ready(server):
+    """Freeze preloaded objects so the garbage collector doesn't dirty shared pages"""
+    gc.freeze()
+
+def pre_fork(server, worker):
+    """Close the master's SQLite connection so workers never inherit it"""
+    database = sys.modules.get('database')
+    if database is not None:
+        database.close_db()
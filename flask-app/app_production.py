@@ -1,13 +1,23 @@
-from flask import Flask, render_template, jsonify, request, send_file, session, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, send_file, send_from_directory, session, redirect, url_for, g, has_request_context
 import pandas as pd
+import numpy as np
 import json
 import os
+import uuid
 from datetime import datetime, timedelta
 import logging
 from functools import wraps
 from werkzeug.middleware.proxy_fix import ProxyFix
 import markdown
 import database  # Import our new database module
+import automatch
+import duplicates
+import jobs
+import progress
+import ranking
+import restore
+import snapshot
+import thumbnails
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'chemopad-secret-key-2024')
@@ -38,6 +48,23 @@ def add_cache_control(response):
         response.headers['Expires'] = '0'
     return response
 
+# Run queued background jobs in every worker, including ones left over from a restart
+@app.before_request
+def start_job_dispatcher():
+    jobs.start()
+
+def get_snapshot():
+    """Matches, matched cards, notes and invalid cards for this request (see database.get_snapshot)
+
+    Taken on first use and kept in g, so every read within a request comes
+    from the same database version. Outside a request, the latest snapshot.
+    """
+    if not has_request_context():
+        return database.get_snapshot()
+    if 'snapshot' not in g:
+        g.snapshot = database.get_snapshot()
+    return g.snapshot
+
 def login_required(f):
     """Decorator to require login for a route"""
     @wraps(f)
@@ -47,18 +74,194 @@ def login_required(f):
 
         if 'authenticated' not in session or not session['authenticated']:
             return redirect(url_for('login'))
+        if 'annotator_id' not in session:
+            # Sessions from before annotator ids were issued at login
+            session['annotator_id'] = uuid.uuid4().hex
         return f(*args, **kwargs)
     return decorated_function
 
 # Global data storage
 annotations_df = None
+all_annotations_df = None  # Including missing_card rows, used by export
 project_cards_df = None
-matches = {}  # {annotation_annot_id: project_card_id}
-notes = {}  # Store notes for each annotation  # {annotation_annot_id: project_card_id}
+# Matches and notes are not kept here: every worker reads them through the
+# database module's change-feed cache so all workers see the same state.
+
+# Annotation lookup index (rebuilt by load_data)
+pad_annot_ids = {}  # {(API, PAD#): array of annot_ids}
+api_pads = {}  # {API: sorted list of PAD#s}
+annot_positions = {}  # {annot_id: row position in annotations_df}
+pad_first_api = {}  # {PAD#: API of the first annotation row with that PAD#}
+
+# Gallery index (rebuilt by load_data)
+GALLERY_LIGHTING_ORDER = ['lightbox', 'benchtop', 'no light']
+GALLERY_PAGE_SIZE = 60
+GALLERY_MAX_PAGE_SIZE = 500
+gallery_df = None  # Annotations in gallery order (grouped by lighting) with lowercased filter columns
+gallery_records = []  # Static item fields per gallery position
+gallery_lighting = []  # Lighting values in section order
+gallery_facets = {}  # {'lighting': {value: count}, 'cameras': [...], 'apis': [...]}
+_gallery_status = (None, None)  # (matches dict it was built from, match status per gallery position)
+
+# Project card lookup index (rebuilt by load_data)
+cards_by_id = {}  # {card id: candidate dict}
+candidates_by_sample = {}  # {sample_id: list of candidate dicts, in file order}
+
+# Card inventory index (rebuilt by load_data)
+INVENTORY_PAGE_SIZE = 60
+INVENTORY_MAX_PAGE_SIZE = 500
+inventory_df = None  # Project cards in inventory order (grouped by API) with lowercased filter columns
+inventory_records = []  # Static card fields per inventory position
+inventory_facets = {}  # {'apis': {api: count}, 'cameras': [...]}
+_inventory_status = (None, None, None)  # (matched cards, invalid cards, (is_matched, is_invalid) per position)
+
+def build_annotation_index(df):
+    """Build the (API, PAD#) group index used by every view"""
+    global pad_annot_ids, api_pads, annot_positions, pad_first_api
+
+    annot_ids = df['annot_id'].astype('int64').to_numpy()
+
+    # groupby().indices gives row positions per group in a single pass
+    groups = df.groupby(['API', 'PAD#'], sort=False).indices
+    pad_annot_ids = {(api, int(pad)): annot_ids[positions] for (api, pad), positions in groups.items()}
+
+    api_pads = {}
+    for api, pad in pad_annot_ids:
+        api_pads.setdefault(api, []).append(pad)
+    for pads in api_pads.values():
+        pads.sort()
+
+    annot_positions = {int(annot_id): position for position, annot_id in enumerate(annot_ids)}
+
+    first_rows = df.drop_duplicates('PAD#')
+    pad_first_api = dict(zip(first_rows['PAD#'].astype('int64'), first_rows['API']))
+
+def build_gallery_index(df):
+    """Precompute the gallery order, filter columns and item fields used by /api/gallery"""
+    global gallery_df, gallery_records, gallery_lighting, gallery_facets, _gallery_status
+
+    lighting = df['Lighting (lightbox, benchtop, benchtop dark)']
+    # Known conditions first, anything else after them in order of appearance
+    gallery_lighting = sorted(dict.fromkeys(lighting), key=lambda x: GALLERY_LIGHTING_ORDER.index(x)
+                              if x in GALLERY_LIGHTING_ORDER else len(GALLERY_LIGHTING_ORDER))
+    rank = lighting.map({value: position for position, value in enumerate(gallery_lighting)})
+    ordered = df.iloc[rank.argsort(kind='stable')]
+
+    concentration = ordered['mg concentration (w/w mg/mg or w/v mg/mL)']
+    records = pd.DataFrame({
+        'annot_id': ordered['annot_id'].astype('int64'),
+        'pad_num': ordered['PAD#'].astype('int64'),
+        'lighting': ordered['Lighting (lightbox, benchtop, benchtop dark)'],
+        'camera': ordered['Camera'],
+        'background': ordered['black/white background'],
+        'api': ordered['API'],
+        'sample': ordered['Sample'].where(ordered['Sample'].notna(), ''),
+        'concentration': concentration.astype(object).where(concentration.notna(), ''),
+    }).reset_index(drop=True)
+    gallery_records = records.to_dict('records')
+
+    gallery_df = pd.DataFrame({
+        'annot_id': records['annot_id'],
+        'lighting': records['lighting'],
+        'lighting_key': records['lighting'].str.lower(),
+        'camera_key': records['camera'].str.lower(),
+        'background_key': records['background'].str.lower(),
+        'api': records['api'],
+        'pad_text': records['pad_num'].astype(str),
+        'sample_key': records['sample'].astype(str).str.lower(),
+    })
+
+    gallery_facets = {
+        'lighting': records['lighting'].value_counts().to_dict(),
+        'cameras': sorted(records['camera'].unique()),
+        'apis': sorted(records['api'].unique()),
+    }
+    _gallery_status = (None, None)
+
+def get_gallery_status(matches):
+    """Match status per gallery position, recomputed only when the matches change"""
+    global _gallery_status
+
+    # The matches cache is copy-on-write, so the same dict means the same matches
+    built_from, status = _gallery_status
+    if built_from is not matches:
+        status = gallery_df['annot_id'].map(lambda annot_id: _match_status(matches.get(annot_id)))
+        _gallery_status = (matches, status)
+    return status
+
+def _match_status(card_id):
+    if card_id is None:
+        return 'unmatched'
+    return 'no_match' if card_id == 'no_match' else 'matched'
+
+def build_card_index(df):
+    """Build the project card dicts served to templates and /api/cards, keyed by id, sample_id and position"""
+    global cards_by_id, candidates_by_sample, inventory_df, inventory_records, inventory_facets, _inventory_status
+
+    # Derived columns, computed once for all cards
+    sample_name = df['sample_name'].fillna('Unknown').astype(str)
+    api = sample_name.where(~sample_name.str.contains('(', regex=False),
+                            sample_name.str.split('(', n=1).str[0].str.strip())
+    image_url = df['processed_file_location'].str.replace('/var/www/html/', 'https://pad.crc.nd.edu/', regex=False)
+    image_url = image_url.astype(object).where(image_url.notna(), None)
+
+    cards_by_id = {}
+    candidates_by_sample = {}
+    # to_dict gives native Python values, so the dicts can go straight to templates and JSON
+    for card, url in zip(df.to_dict('records'), image_url):
+        card['image_url'] = url
+        cards_by_id.setdefault(card['id'], card)
+        candidates_by_sample.setdefault(card['sample_id'], []).append(card)
+
+    # Inventory sections are APIs in alphabetical order, cards in file order within each
+    records = pd.DataFrame({
+        'card_id': df['id'].astype('int64'),
+        'pad_id': df['sample_id'].astype(object).where(df['sample_id'].notna(), 'N/A'),
+        'api': api,
+        'sample_name': sample_name,
+        'camera': df['camera_type_1'].fillna('Unknown'),
+        'date': df['date_of_creation'].fillna(''),
+        'image_url': image_url,
+        'quantity': df['quantity'].astype(object).where(df['quantity'].notna(), None),
+        'notes': df['notes'].fillna(''),
+    }).sort_values('api', kind='stable').reset_index(drop=True)
+    inventory_records = records.to_dict('records')
+
+    inventory_df = pd.DataFrame({
+        'card_id': records['card_id'],
+        'api': records['api'],
+        'api_key': records['api'].str.lower(),
+        'camera_key': records['camera'].astype(str).str.lower(),
+        'card_id_text': records['card_id'].astype(str),
+        'sample_key': records['sample_name'].str.lower(),
+    })
+
+    inventory_facets = {
+        'apis': records['api'].value_counts().to_dict(),
+        'cameras': sorted(records['camera'].unique()),
+    }
+    _inventory_status = (None, None, None)
+
+def get_inventory_status(matched_cards, invalid_cards):
+    """is_matched and is_invalid per inventory position, recomputed only when either changes"""
+    global _inventory_status
+
+    # Both caches are copy-on-write, so the same dicts mean the same state
+    built_matched, built_invalid, status = _inventory_status
+    if built_matched is not matched_cards or built_invalid is not invalid_cards:
+        status = (inventory_df['card_id'].isin(list(matched_cards)),
+                  inventory_df['card_id'].isin(list(invalid_cards)))
+        _inventory_status = (matched_cards, invalid_cards, status)
+    return status
+
+def get_pad_rows(api_name, pad_num):
+    """Get the annotation rows for one (API, PAD#) group"""
+    ids = pad_annot_ids.get((api_name, pad_num), ())
+    return annotations_df.iloc[[annot_positions[int(annot_id)] for annot_id in ids]]
 
 def load_data():
     """Load all CSV data"""
-    global annotations_df, project_cards_df
+    global annotations_df, all_annotations_df, project_cards_df
 
     # Use absolute paths for production
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -66,27 +269,31 @@ def load_data():
 
     # Load annotations (skip missing cards)
     annotations_file = os.path.join(data_dir, 'chemoPAD-annotations-final.csv')
-    annotations_df = pd.read_csv(annotations_file)
-    annotations_df = annotations_df[annotations_df['missing_card'] != True].copy()
+    all_annotations_df = snapshot.load_csv(annotations_file)
+    annotations_df = all_annotations_df[all_annotations_df['missing_card'] != True].copy()
     # No need to create row_id, we'll use annot_id directly
+    build_annotation_index(annotations_df)
+    build_gallery_index(annotations_df)
 
     # Load project cards
     project_cards_file = os.path.join(data_dir, 'project_cards.csv')
-    project_cards_df = pd.read_csv(project_cards_file)
+    project_cards_df = snapshot.load_csv(project_cards_file)
+    build_card_index(project_cards_df)
+    ranking.configure(candidates_by_sample, annotations_df)
 
     logger.info(f"Loaded {len(annotations_df)} annotations from {annotations_file}")
     logger.info(f"Loaded {len(project_cards_df)} project cards from {project_cards_file}")
 
-    # Load existing matches from database
-    global matches
-    matches = database.get_all_matches()
-
-    # Load existing notes from database
-    global notes
-    notes = database.get_all_notes()
+    # Warm the shared matches/notes cache from the database
+    state = database.get_snapshot()
+    matches = state['matches']
+    notes = state['notes']
 
     logger.info(f"Loaded {len(matches)} matches and {len(notes)} notes from database")
 
+    # Build per-API / per-PAD# progress counts (kept up to date on every save)
+    progress.configure(pad_annot_ids)
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Login page with password authentication"""
@@ -94,6 +301,7 @@ def login():
         password = request.form.get('password', '')
         if password == PASSWORD:
             session['authenticated'] = True
+            session['annotator_id'] = uuid.uuid4().hex  # Attributes saved matches and notes to this login
             session.permanent = True
             logger.info("User successfully authenticated")
             return redirect(url_for('dashboard'))
@@ -136,22 +344,15 @@ def help():
 @login_required
 def dashboard():
     """API Dashboard - Level 1"""
+    # Pick up writes made by other workers since our last sync
+    progress.refresh(get_snapshot())
+
     # Group by API
     api_stats = []
 
-    for api in annotations_df['API'].unique():
-        if pd.isna(api):
-            continue
-
-        api_data = annotations_df[annotations_df['API'] == api]
-        unique_pads = api_data['PAD#'].unique()
-
+    for api, unique_pads in api_pads.items():
         # Count completed PAD#s (all rows for that PAD# are matched)
-        completed_pads = 0
-        for pad in unique_pads:
-            pad_rows = api_data[api_data['PAD#'] == pad]
-            if all(annot_id in matches for annot_id in pad_rows['annot_id']):
-                completed_pads += 1
+        completed_pads = progress.get_api_progress(api)['completed_pads']
 
         api_stats.append({
             'name': api,
@@ -164,11 +365,12 @@ def dashboard():
     api_stats.sort(key=lambda x: x['name'])
 
     # Calculate overall stats for dashboard cards
+    totals = progress.get_totals()
     stats = {
         'total_annotations': len(annotations_df),
         'total_project_cards': len(project_cards_df),
-        'total_matches': len(matches),
-        'total_notes': len(notes)
+        'total_matches': totals['matches'],
+        'total_notes': totals['notes']
     }
 
     return render_template('dashboard.html', apis=api_stats, stats=stats)
@@ -177,47 +379,48 @@ def dashboard():
 @login_required
 def pad_list(api_name):
     """PAD# List for specific API - Level 2"""
-    # Reload matches and notes from database to get latest data
-    global matches, notes
-    matches = database.get_all_matches()
-    notes = database.get_all_notes()
+    # Used cards and progress counts from this request's snapshot
+    state = get_snapshot()
+    matched_cards = state['matched_cards']
+    progress.refresh(state)
 
-    api_data = annotations_df[annotations_df['API'] == api_name]
+    # Auto-matcher proposals still waiting for review
+    proposal_counts = {}
+    for proposal in automatch.current_proposals(api_name, snapshot=state):
+        proposal_counts[proposal['pad_num']] = proposal_counts.get(proposal['pad_num'], 0) + 1
 
     pad_stats = []
-    for pad in api_data['PAD#'].unique():
-        pad_rows = api_data[api_data['PAD#'] == pad]
-        matched_count = sum(1 for annot_id in pad_rows['annot_id'] if annot_id in matches)
+    for pad in api_pads.get(api_name, []):
+        pad_ids = pad_annot_ids[(api_name, pad)]
+        pad_progress = progress.get_pad_progress(api_name, pad)
+        matched_count = pad_progress['matched'] + pad_progress['no_match']
 
         # Count rows with notes
-        notes_count = sum(1 for annot_id in pad_rows['annot_id'] if annot_id in notes)
+        notes_count = pad_progress['notes']
 
         # Get sample name from first row
-        sample = pad_rows.iloc[0]['Sample'] if pd.notna(pad_rows.iloc[0]['Sample']) else ''
+        first_row = annotations_df.iloc[annot_positions[int(pad_ids[0])]]
+        sample = first_row['Sample'] if pd.notna(first_row['Sample']) else ''
 
         # Get candidates info for this PAD
-        pad_candidates = project_cards_df[project_cards_df['sample_id'] == pad]
+        pad_candidates = candidates_by_sample.get(pad, [])
         total_candidates = len(pad_candidates)
 
         # Count selected candidates and deleted candidates
-        selected_candidates = 0
-        deleted_candidates = 0
-        for idx, candidate in pad_candidates.iterrows():
-            if candidate['id'] in matches.values():
-                selected_candidates += 1
-            if candidate['deleted']:
-                deleted_candidates += 1
+        selected_candidates = sum(1 for candidate in pad_candidates if candidate['id'] in matched_cards)
+        deleted_candidates = sum(1 for candidate in pad_candidates if candidate['deleted'])
 
         pad_stats.append({
             'pad_num': int(pad),
             'sample': sample,
-            'total_rows': len(pad_rows),
+            'total_rows': len(pad_ids),
             'matched_rows': matched_count,
             'notes_count': notes_count,
             'candidates_selected': selected_candidates,
             'candidates_available': total_candidates,
             'candidates_deleted': deleted_candidates,
-            'status': 'complete' if matched_count == len(pad_rows) else
+            'proposals': proposal_counts.get(int(pad), 0),
+            'status': 'complete' if matched_count == len(pad_ids) else
                      'partial' if matched_count > 0 else 'not_started'
         })
 
@@ -235,35 +438,35 @@ def pad_list(api_name):
     return render_template('pad_list.html',
                          api_name=api_name,
                          pads=pad_stats,
-                         api_progress=api_progress)
+                         api_progress=api_progress,
+                         total_proposals=sum(proposal_counts.values()))
 
 @app.route('/match/<path:api_name>/<int:pad_num>')
 @login_required
 def match_page(api_name, pad_num):
     """Annotation Matching page - Level 3"""
-    # Reload matches and notes from database to get latest data
-    global matches, notes
-    matches = database.get_all_matches()
-    notes = database.get_all_notes()
+    # Read matches, notes and used cards from this request's snapshot
+    state = get_snapshot()
+    matches = state['matches']
+    notes = state['notes']
 
     # Get all annotation rows for this PAD#
-    pad_annotations = annotations_df[
-        (annotations_df['API'] == api_name) &
-        (annotations_df['PAD#'] == pad_num)
-    ].copy()
+    pad_annotations = get_pad_rows(api_name, pad_num)
 
-    # Get all project cards for this PAD# (sample_id)
-    candidates = project_cards_df[
-        project_cards_df['sample_id'] == pad_num
-    ].copy()
+    # Get all project cards for this PAD# (sample_id), marking which are already used
+    used_ids = state['matched_cards']
+    candidates_data = [
+        {**candidate, 'is_used': candidate['id'] in used_ids}
+        for candidate in candidates_by_sample.get(pad_num, [])
+    ]
 
-    # Mark which candidates are already used
-    used_ids = set(matches.values())
-    candidates['is_used'] = candidates['id'].isin(used_ids)
+    # Rank the candidates against every row at once, most likely card first
+    rankings = ranking.rank_pad(pad_num, pad_annotations['annot_id'].tolist(), matches, used_ids)
+    proposed = {proposal['annot_id']: proposal['card_id'] for proposal in automatch.current_proposals(pad_num=pad_num, snapshot=state)}
 
-    # Prepare annotation rows with their matches and notes
+    # Prepare annotation rows with their matches, notes and ranked candidates
     rows_data = []
-    for idx, row in pad_annotations.iterrows():
+    for (idx, row), ranked in zip(pad_annotations.iterrows(), rankings):
         row_dict = row.to_dict()
         annot_id = int(row['annot_id'])
         matched_id = matches.get(annot_id)
@@ -271,17 +474,19 @@ def match_page(api_name, pad_num):
         row_dict['matched_id'] = matched_id if matched_id != "no_match" else None
         row_dict['is_no_match'] = matched_id == "no_match"
         row_dict['notes'] = notes.get(annot_id, '')
+        row_dict['proposed_id'] = proposed.get(annot_id)
+        row_dict['version'] = state['match_versions'].get(annot_id, 0)
+        row_dict['candidates'] = [
+            {**candidates_data[position], 'rank': rank, 'score': score, 'confidence': confidence}
+            for rank, (position, score, confidence) in enumerate(ranked, 1)
+        ]
         rows_data.append(row_dict)
 
-    # Convert candidates to dict for JSON
-    candidates_data = candidates.to_dict('records')
-
     # Calculate progress - count both matched candidates and no_match rows
     matched_count = sum(1 for r in rows_data if r['matched_id'] or r['is_no_match'])
 
     # Get list of all PAD#s for this API to find next/previous ones
-    api_data = annotations_df[annotations_df['API'] == api_name]
-    all_pads = sorted(api_data['PAD#'].unique())
+    all_pads = api_pads.get(api_name, [])
 
     # Find next and previous PAD#s in sequence
     next_pad = None
@@ -303,22 +508,21 @@ def match_page(api_name, pad_num):
                          matched_count=matched_count,
                          total_rows=len(rows_data),
                          next_pad=next_pad,
-                         prev_pad=prev_pad)
+                         prev_pad=prev_pad,
+                         proposal_count=sum(1 for r in rows_data if r['proposed_id']))
 
 @app.route('/match-card/<int:card_id>')
 @login_required
 def match_card_redirect(card_id):
     """Redirect from card ID to the appropriate matching page"""
-    # Find the card in project_cards_df
-    card_row = project_cards_df[project_cards_df['id'] == card_id]
+    # Find the card in the card index
+    card = cards_by_id.get(card_id)
 
-    if card_row.empty:
+    if card is None:
         # Card not found, redirect to dashboard with error
         logger.warning(f"Card ID {card_id} not found")
         return redirect(url_for('dashboard'))
 
-    card = card_row.iloc[0]
-
     # Get PAD# (sample_id) from the card
     pad_num = card['sample_id']
 
@@ -330,81 +534,297 @@ def match_card_redirect(card_id):
         api_name = sample_name if pd.notna(sample_name) else 'Unknown'
 
     # Find if there's a matching annotation for this PAD#
-    matching_annotations = annotations_df[
-        (annotations_df['API'] == api_name) &
-        (annotations_df['PAD#'] == pad_num)
-    ]
-
-    if not matching_annotations.empty:
+    if (api_name, pad_num) in pad_annot_ids:
         # Redirect to the matching page for this API/PAD
         return redirect(url_for('match_page', api_name=api_name, pad_num=pad_num))
     else:
         # No matching annotation found, try to find any annotation with this PAD#
-        any_pad_annotations = annotations_df[annotations_df['PAD#'] == pad_num]
-        if not any_pad_annotations.empty:
+        if pad_num in pad_first_api:
             # Use the first API found
-            first_api = any_pad_annotations.iloc[0]['API']
+            first_api = pad_first_api[pad_num]
             return redirect(url_for('match_page', api_name=first_api, pad_num=pad_num))
         else:
             # No annotations at all for this PAD#, redirect to dashboard
             logger.info(f"No annotations found for PAD# {pad_num}")
             return redirect(url_for('dashboard'))
 
+@app.route('/thumb/<int:card_id>')
+@login_required
+def thumbnail(card_id):
+    """Thumbnail of a project card image (?size= in pixels, WebP if the browser accepts it)"""
+    card = cards_by_id.get(card_id)
+    if card is None or card['image_url'] is None:
+        return jsonify({'error': 'No image for this card'}), 404
+
+    try:
+        size = thumbnails.pick_size(int(request.args.get('size', thumbnails.DEFAULT_SIZE)))
+    except ValueError:
+        return jsonify({'error': 'size must be an integer'}), 400
+    # Only an explicit image/webp counts: */* and image/* come from clients that may not decode WebP
+    accepts_webp = any(mimetype == 'image/webp' and quality > 0 for mimetype, quality in request.accept_mimetypes)
+    fmt = 'webp' if accepts_webp else 'jpeg'
+
+    try:
+        path = thumbnails.get_thumbnail(card_id, card['processed_file_location'], size, fmt)
+    except thumbnails.ThumbnailError as e:
+        logger.warning(f"Thumbnail for card {card_id} failed: {e}")
+        return jsonify({'error': 'Card image unavailable'}), 502
+
+    etag = thumbnails.thumbnail_etag(path)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif thumbnails.ACCEL_PREFIX:
+        # nginx serves the file from its internal location
+        response = Response(mimetype=thumbnails.FORMATS[fmt]['mimetype'])
+        response.headers['X-Accel-Redirect'] = thumbnails.accel_path(path)
+    else:
+        response = send_file(path, mimetype=thumbnails.FORMATS[fmt]['mimetype'], etag=False)
+
+    # Card images do not change, so browsers may keep thumbnails without revalidating
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    response.headers['Vary'] = 'Accept'
+    return response
+
+# Auto-backups wait this long (seconds) so a burst of PAD completions shares one backup
+AUTO_BACKUP_DELAY = 60
+
+def backup_if_pads_complete(annot_ids):
+    """Create an auto-backup if saving annot_ids completed any (API, PAD#)"""
+    pads = set()
+    for annot_id in annot_ids:
+        position = annot_positions.get(annot_id)
+        if position is not None:
+            annotation = annotations_df.iloc[position]
+            pads.add((annotation['API'], int(annotation['PAD#'])))
+
+    if not pads:
+        return
+
+    progress.refresh()
+    completed = [(api_name, pad_num) for api_name, pad_num in sorted(pads)
+                 if progress.get_pad_progress(api_name, pad_num)['complete']]
+
+    if completed:
+        # PAD is complete! Queue an auto-backup
+        for api_name, pad_num in completed:
+            logger.info(f"PAD {pad_num} for API {api_name} is now complete. Queueing auto-backup.")
+        jobs.enqueue('backup', 'auto', coalesce_key='backup:auto', delay=AUTO_BACKUP_DELAY)
+
+@app.route('/api/pad-state')
+@login_required
+def pad_state():
+    """Current matches and row versions of one PAD# (?api=, ?pad=), for refreshing the match page in place"""
+    api_name = request.args.get('api', '')
+    try:
+        pad_num = int(request.args['pad'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'pad must be an integer'}), 400
+    if (api_name, pad_num) not in pad_annot_ids:
+        return jsonify({'error': 'Unknown API / PAD#'}), 404
+
+    state = get_snapshot()
+    rows = []
+    for annot_id in pad_annot_ids[(api_name, pad_num)]:
+        annot_id = int(annot_id)
+        card_id = state['matches'].get(annot_id)
+        rows.append({
+            'annot_id': annot_id,
+            'matched_id': card_id if card_id != "no_match" else None,
+            'is_no_match': card_id == "no_match",
+            'version': state['match_versions'].get(annot_id, 0),
+        })
+    used_cards = [candidate['id'] for candidate in candidates_by_sample.get(pad_num, [])
+                  if candidate['id'] in state['matched_cards']]
+    return jsonify({'rows': rows, 'used_cards': used_cards})
+
+def match_conflict(error, current=None):
+    """409 response for a match write that lost a race, with the current state to recover from"""
+    return jsonify({'success': False, 'conflict': True, 'error': error, 'current': current or {}}), 409
+
 @app.route('/api/save_match', methods=['POST'])
 @login_required
 def save_match():
-    """Save a match between annotation row and project card"""
+    """Save a match between annotation row and project card
+
+    With "version" (the row version the page was rendered with) the save is a
+    compare-and-set: if someone else changed the row since, nothing is saved
+    and a 409 carries the row's current card_id and version.
+    """
     data = request.json
     annot_id = int(data['annot_id'])  # Changed from row_id to annot_id
     card_id = data.get('card_id')
     is_no_match = data.get('is_no_match', False)
+    expected_version = int(data['version']) if data.get('version') is not None else None
 
     try:
         if card_id and card_id != "no_match":
             card_id = int(card_id)
-            # Check if card_id is already used
-            current_matches = database.get_all_matches()
-            if card_id in current_matches.values():
-                return jsonify({'success': False, 'error': 'ID already matched to another annotation'})
-            database.save_match(annot_id, card_id)
+            # Check if card_id is already used (the unique index catches races)
+            owner = get_snapshot()['matched_cards'].get(card_id)
+            if owner is not None:
+                return match_conflict('ID already matched to another annotation', {'card_owner': owner})
+            try:
+                version = database.save_match(annot_id, card_id, session['annotator_id'], expected_version)
+            except database.CardAlreadyMatchedError:
+                return match_conflict('ID already matched to another annotation')
         elif is_no_match:
             # Mark as no match
-            database.save_match(annot_id, "no_match")
+            version = database.save_match(annot_id, "no_match", session['annotator_id'], expected_version)
         else:
             # Unmatching - delete the entry
-            database.save_match(annot_id, None)
-
-        # Reload matches for in-memory cache
-        global matches
-        matches = database.get_all_matches()
+            version = database.save_match(annot_id, None, session['annotator_id'], expected_version)
 
         # Check if this PAD is now complete and create auto-backup
         if card_id or is_no_match:  # Only check completion if we're adding a match, not removing
-            # Find the PAD# for this annotation
-            annotation = annotations_df[annotations_df['annot_id'] == annot_id]
-            if not annotation.empty:
-                api_name = annotation.iloc[0]['API']
-                pad_num = annotation.iloc[0]['PAD#']
-
-                # Get all annotations for this PAD
-                pad_annotations = annotations_df[
-                    (annotations_df['API'] == api_name) &
-                    (annotations_df['PAD#'] == pad_num)
-                ]
-
-                # Check if all annotations for this PAD are now matched
-                all_matched = all(annot_id in matches for annot_id in pad_annotations['annot_id'])
-
-                if all_matched:
-                    # PAD is complete! Create auto-backup
-                    logger.info(f"PAD {pad_num} for API {api_name} is now complete. Creating auto-backup.")
-                    database.create_file_backup('auto')
+            backup_if_pads_complete([annot_id])
 
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'version': version})
+    except database.MatchConflictError as e:
+        return match_conflict('Someone else changed this row meanwhile', e.conflicts[annot_id])
     except Exception as e:
         logger.error(f"Error saving match: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/save_matches', methods=['POST'])
+@login_required
+def save_matches():
+    """Save matches for many annotation rows (e.g. a whole PAD#) in one transaction
+
+    Expects {"matches": [{"annot_id": ..., "card_id": ..., "is_no_match": ..., "version": ...}, ...]}
+    with the same per-item meaning as /api/save_match. Either all items are
+    saved or none are; a 409 lists the rows whose version no longer matches.
+    """
+    data = request.json or {}
+    items = data.get('matches')
+    if not isinstance(items, list):
+        return jsonify({'success': False, 'error': 'matches list required'}), 400
+
+    try:
+        batch = {}
+        expected_versions = {}
+        for item in items:
+            if not isinstance(item, dict):
+                return jsonify({'success': False, 'error': f'Invalid match item: {item!r}'}), 400
+            version = item.get('version')
+            if version is not None:
+                if not isinstance(version, int) or isinstance(version, bool):
+                    return jsonify({'success': False, 'error': f'Invalid version: {version!r}'}), 400
+                expected_versions[int(item['annot_id'])] = version
+            card_id = item.get('card_id')
+            if card_id and card_id != "no_match":
+                card_id = int(card_id)
+            elif item.get('is_no_match', False):
+                card_id = "no_match"
+            else:
+                card_id = None
+            batch[int(item['annot_id'])] = card_id
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid match item: {e}'}), 400
+
+    # Check cards are not used twice in the batch or by an annotation outside it
+    matched_cards = get_snapshot()['matched_cards']
+    seen_cards = set()
+    conflicts = set()
+    for annot_id, card_id in batch.items():
+        if card_id in (None, "no_match"):
+            continue
+        owner = matched_cards.get(card_id)
+        if card_id in seen_cards or (owner is not None and owner != annot_id and owner not in batch):
+            conflicts.add(card_id)
+        seen_cards.add(card_id)
+    if conflicts:
+        return match_conflict(f'IDs already matched to another annotation: {sorted(conflicts)}')
+
+    try:
+        saved = database.save_matches_bulk(batch.items(), session['annotator_id'], expected_versions)
+    except database.CardAlreadyMatchedError:
+        return match_conflict('ID already matched to another annotation')
+    except database.MatchConflictError as e:
+        return match_conflict('Someone else changed these rows meanwhile', e.conflicts)
+    except Exception as e:
+        logger.error(f"Error saving matches: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+    # Only check completion for rows that gained a match
+    backup_if_pads_complete([annot_id for annot_id, card_id in batch.items() if card_id is not None])
+
+    return jsonify({'success': True, 'saved': saved})
+
+@app.route('/api/proposals')
+@login_required
+def match_proposals():
+    """Auto-matcher proposals still open for review (?api=, ?pad=)"""
+    try:
+        pad_num = int(request.args['pad']) if request.args.get('pad') else None
+    except ValueError:
+        return jsonify({'error': 'pad must be an integer'}), 400
+    proposals = automatch.current_proposals(request.args.get('api') or None, pad_num, get_snapshot())
+    return jsonify({'proposals': proposals, 'total': len(proposals)})
+
+@app.route('/api/proposals/run', methods=['POST'])
+@login_required
+def run_auto_match():
+    """Re-run the auto-matcher over every PAD#, replacing the staged proposals"""
+    try:
+        proposed, elapsed = automatch.run(pad_annot_ids)
+    except Exception as e:
+        logger.error(f"Error running auto-match: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'proposed': proposed, 'seconds': round(elapsed, 2)})
+
+@app.route('/api/proposals/accept', methods=['POST'])
+@login_required
+def accept_proposals():
+    """Save staged proposals as matches in one transaction
+
+    Expects {"api": ..., "pad_num": ..., "annot_ids": [...], "min_confidence": ...},
+    every field optional; proposals whose row or card was matched since they
+    were staged are skipped.
+    """
+    data = request.json or {}
+    try:
+        pad_num = int(data['pad_num']) if data.get('pad_num') is not None else None
+        annot_ids = {int(annot_id) for annot_id in data['annot_ids']} if data.get('annot_ids') is not None else None
+        min_confidence = float(data.get('min_confidence', 0))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid request: {e}'}), 400
+
+    state = get_snapshot()
+    proposals = [proposal for proposal in automatch.current_proposals(data.get('api') or None, pad_num, state)
+                 if (annot_ids is None or proposal['annot_id'] in annot_ids)
+                 and proposal['confidence'] >= min_confidence]
+    if not proposals:
+        return jsonify({'success': True, 'accepted': 0})
+
+    # Only rows still unmatched as of the snapshot the proposals were checked against
+    batch = [(proposal['annot_id'], proposal['card_id']) for proposal in proposals]
+    expected_versions = {annot_id: state['match_versions'].get(annot_id, 0) for annot_id, _ in batch}
+    try:
+        saved = database.save_matches_bulk(batch, session['annotator_id'], expected_versions)
+    except (database.CardAlreadyMatchedError, database.MatchConflictError):
+        return match_conflict('Some proposed rows or cards were matched meanwhile, try again')
+    except Exception as e:
+        logger.error(f"Error accepting proposals: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+    database.delete_match_proposals([annot_id for annot_id, _ in batch])
+    logger.info(f"Accepted {saved} auto-match proposals")
+    backup_if_pads_complete([annot_id for annot_id, _ in batch])
+
+    return jsonify({'success': True, 'accepted': saved})
+
+@app.route('/api/events')
+@login_required
+def match_events():
+    """Audit trail of match and note events, newest first (?annot_id=, ?annotator=, ?limit=)"""
+    try:
+        annot_id = int(request.args['annot_id']) if request.args.get('annot_id') else None
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({'error': 'annot_id and limit must be integers'}), 400
+    return jsonify({'events': database.get_match_events(annot_id, request.args.get('annotator'), limit)})
+
 @app.route('/api/save_note', methods=['POST'])
 @login_required
 def save_note():
@@ -414,11 +834,7 @@ def save_note():
     note_text = data.get('note', '')
 
     try:
-        database.save_note(annot_id, note_text)
-
-        # Reload notes for in-memory cache
-        global notes
-        notes = database.get_all_notes()
+        database.save_note(annot_id, note_text, session['annotator_id'])
 
         return jsonify({'success': True})
     except Exception as e:
@@ -470,129 +886,191 @@ def backup_info():
         logger.error(f"Error getting backup info: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/export')
+@app.route('/api/backup/catalog')
 @login_required
-def export_data():
-    """Export all matched data to CSV"""
-    # Reload notes and matches from database to get latest data
-    global matches, notes
-    matches = database.get_all_matches()
-    notes = database.get_all_notes()
+def backup_catalog():
+    """List cataloged backups (optionally ?type= and ?kind=full|delta) to pick one for restore"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({'backups': database.get_backup_catalog(request.args.get('type'),
+                                                           request.args.get('kind'), limit)})
 
-    # Create a file backup before export
-    database.create_file_backup('export')
+@app.route('/api/backup/verify/<filename>', methods=['POST'])
+@login_required
+def verify_backup(filename):
+    """Check a backup file against its cataloged size and checksum"""
+    return jsonify(database.verify_backup(filename))
 
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+@app.route('/api/backup/diff')
+@login_required
+def backup_diff():
+    """Row-level diff between two sources: 'live', a backup filename, or '@<timestamp>'
 
-    # Load ALL annotations including those with missing_card=True
-    annotations_file = os.path.join(base_dir, 'data', 'chemoPAD-annotations-final.csv')
-    all_annotations_df = pd.read_csv(annotations_file)
+    Query parameters: old (required), new (default live), table, limit (rows per category, default 100)
+    """
+    old_source = request.args.get('old')
+    if not old_source:
+        return jsonify({'error': 'old source required'}), 400
+    tables = [request.args['table']] if request.args.get('table') else None
 
-    # Create export dataframe - keep original annotation columns + missing_card flag
-    original_columns = ['annot_id', 'PAD#', 'Camera', 'Lighting (lightbox, benchtop, benchtop dark)',
-                       'black/white background', 'API', 'Sample',
-                       'mg concentration (w/w mg/mg or w/v mg/mL)', '% Conc', 'missing_card']
+    try:
+        limit = int(request.args.get('limit', 100))
+        return jsonify(restore.diff(old_source, request.args.get('new', 'live'), tables, limit))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    except restore.RestoreError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/backup/restore', methods=['POST'])
+@login_required
+def backup_restore():
+    """Restore the live database from a backup or '@<timestamp>' in one transaction
+
+    Expects {"source": ..., "tables": [...] (optional), "keys": [...] (optional)}.
+    A full pre_restore backup is taken first.
+    """
+    data = request.json or {}
+    if not data.get('source') or not isinstance(data['source'], str):
+        return jsonify({'success': False, 'error': 'source required'}), 400
+
+    tables = data.get('tables')
+    if tables is not None and (not isinstance(tables, list)
+                               or not all(isinstance(table, str) and table in restore.RESTORE_TABLES
+                                          for table in tables)):
+        return jsonify({'success': False, 'error': f'tables must be a list of: {sorted(restore.RESTORE_TABLES)}'}), 400
+
+    keys = data.get('keys')
+    if keys is not None:
+        # Keys are annot_ids or card_ids, given as integers or digit strings
+        if not isinstance(keys, list) or not all(
+                (isinstance(key, int) and not isinstance(key, bool)) or (isinstance(key, str) and key.isdigit())
+                for key in keys):
+            return jsonify({'success': False, 'error': 'keys must be a list of integer ids'}), 400
+        keys = [int(key) for key in keys]
+
+    try:
+        counts = restore.restore(data['source'], tables, keys)
+    except restore.RestoreError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except database.CardAlreadyMatchedError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    return jsonify({'success': True, 'restored': counts})
+
+# Export layout: original annotation columns + missing_card flag, then matched card fields
+EXPORT_ANNOTATION_COLUMNS = ['annot_id', 'PAD#', 'Camera', 'Lighting (lightbox, benchtop, benchtop dark)',
+                             'black/white background', 'API', 'Sample',
+                             'mg concentration (w/w mg/mg or w/v mg/mL)', '% Conc', 'missing_card']
+EXPORT_CARD_FIELDS = ['sample_name', 'quantity', 'camera_type_1', 'deleted',
+                      'date_of_creation', 'processed_file_location']
+EXPORT_ID_COLUMNS = ['annot_id', 'PAD#', 'matched_id', 'matched_sample_id']
+EXPORT_CHUNK_ROWS = 1000  # Annotation rows joined per chunk in streaming mode
+
+def format_id_column(series):
+    """Format an ID column as integers without decimals, keeping "no_match" and blanking the rest"""
+    values = series.astype('object')
+    is_no_match = values.eq("no_match")
+    numeric = pd.to_numeric(values.where(~is_no_match), errors='coerce')
+    numeric = numeric.where(np.isfinite(numeric))
+
+    formatted = pd.Series('', index=series.index, dtype='object')
+    valid = numeric.notna()
+    # Truncate like int(float(x))
+    formatted[valid] = np.trunc(numeric[valid]).astype('int64').astype(str)
+    formatted[is_no_match] = "no_match"
+    return formatted
+
+def build_export_lookups(matches, notes):
+    """Build the matches, notes and project_cards frames joined by build_export_frame"""
+    matches_df = pd.DataFrame({
+        'annot_key': pd.array(list(matches.keys()), dtype='Int64'),
+        'matched_id': pd.array(list(matches.values()), dtype='object'),
+    })
+    notes_df = pd.DataFrame({
+        'annot_key': pd.array(list(notes.keys()), dtype='Int64'),
+        'notes': pd.array(list(notes.values()), dtype='object'),
+    })
+
+    # Nullable dtypes keep ints/bools formatted as-is for rows without a card
+    card_fields = ['sample_id'] + [field for field in EXPORT_CARD_FIELDS if field in project_cards_df.columns]
+    cards = project_cards_df.drop_duplicates('id')[['id'] + card_fields].copy()
+    for column in cards.columns:
+        if pd.api.types.is_bool_dtype(cards[column]):
+            cards[column] = cards[column].astype('boolean')
+        elif pd.api.types.is_integer_dtype(cards[column]):
+            cards[column] = cards[column].astype('Int64')
+    cards = cards.rename(columns={field: f'matched_{field}' for field in card_fields})
+    cards['card_found'] = True
+    cards = cards.astype({'id': 'Int64'})
+
+    return {'matches': matches_df, 'notes': notes_df, 'cards': cards}
+
+def build_export_frame(source_df, matches, notes, lookups=None):
+    """Join annotations with matches, notes and project_cards into the export layout"""
+    if lookups is None:
+        lookups = build_export_lookups(matches, notes)
 
     # Only keep original columns that exist
-    keep_columns = [col for col in original_columns if col in all_annotations_df.columns]
-    export_df = all_annotations_df[keep_columns].copy()
+    keep_columns = [col for col in EXPORT_ANNOTATION_COLUMNS if col in source_df.columns]
+    export_df = source_df[keep_columns].copy()
+    annot_keys = pd.Series(np.trunc(pd.to_numeric(export_df['annot_id'], errors='coerce')),
+                           index=export_df.index).astype('Int64')
 
     # Add matched_id column - map using annot_id directly
-    export_df['matched_id'] = None
-    for idx in export_df.index:
-        annot_id = int(export_df.at[idx, 'annot_id'])
-        if annot_id in matches:
-            export_df.at[idx, 'matched_id'] = matches[annot_id]
-
-    # Add matched_sample_id right after matched_id
-    export_df['matched_sample_id'] = None
-
-    # Add other project_cards fields for matched rows
-    project_fields = ['sample_name', 'quantity', 'camera_type_1', 'deleted',
-                     'date_of_creation', 'processed_file_location']
-    for field in project_fields:
-        export_df[f'matched_{field}'] = None
-
-    # Add URL field (will be generated from processed_file_location)
+    matched_id = pd.DataFrame({'annot_key': annot_keys}).merge(
+        lookups['matches'], on='annot_key', how='left')['matched_id']
+    matched_id.index = export_df.index
+    export_df['matched_id'] = matched_id
+
+    is_no_match = matched_id.astype('object').eq("no_match")
+    card_keys = pd.to_numeric(matched_id.where(~is_no_match), errors='coerce')
+    card_keys = card_keys.where(card_keys == np.trunc(card_keys)).astype('Int64')
+    card_data = pd.DataFrame({'id': card_keys}).merge(lookups['cards'], on='id', how='left')
+    card_data.index = export_df.index
+    card_found = card_data['card_found'].eq(True)
+
+    # Add matched_sample_id right after matched_id, then other project_cards fields
+    export_df['matched_sample_id'] = card_data['matched_sample_id'].where(card_found)
+    for field in EXPORT_CARD_FIELDS:
+        column = f'matched_{field}'
+        export_df[column] = card_data[column].where(card_found) if column in card_data else None
+
+    # Generate URL from processed_file_location
     export_df['matched_url'] = None
-
-    # Add notes column for student observations
-    export_df['notes'] = None
-
-    # Fill in project data for matched rows
-    for annot_id, card_id in matches.items():
-        # Find the row with this annot_id
-        matching_rows = export_df[export_df['annot_id'] == annot_id]
-        if len(matching_rows) == 0:
-            continue  # Skip if annot_id not found in export (shouldn't happen)
-
-        orig_idx = matching_rows.index[0]
-
-        if card_id == "no_match":
-            # For no_match annotations, still add the notes
-            if annot_id in notes:
-                export_df.at[orig_idx, 'notes'] = notes[annot_id]
-            export_df.at[orig_idx, 'matched_id'] = "no_match"
-        elif card_id in project_cards_df['id'].values:
-            card_data = project_cards_df[project_cards_df['id'] == card_id].iloc[0]
-
-            # Add sample_id right after matched_id
-            export_df.at[orig_idx, 'matched_sample_id'] = card_data.get('sample_id')
-
-            # Add other fields
-            for field in project_fields:
-                if field in card_data:
-                    export_df.at[orig_idx, f'matched_{field}'] = card_data[field]
-
-            # Generate URL from processed_file_location
-            if 'processed_file_location' in card_data and pd.notna(card_data['processed_file_location']):
-                export_df.at[orig_idx, 'matched_url'] = f"https://pad.crc.nd.edu{card_data['processed_file_location']}"
-
-            # Add notes if any
-            if annot_id in notes:
-                export_df.at[orig_idx, 'notes'] = notes[annot_id]
-
-    # Add notes for rows that have notes but aren't in matches
-    # This handles annotations with notes that haven't been matched or marked as no_match yet
-    for annot_id, note_text in notes.items():
-        if annot_id not in matches:
-            # Find the row with this annot_id
-            matching_rows = export_df[export_df['annot_id'] == annot_id]
-            if len(matching_rows) > 0:
-                orig_idx = matching_rows.index[0]
-                export_df.at[orig_idx, 'notes'] = note_text
+    if 'matched_processed_file_location' in card_data:
+        location = card_data['matched_processed_file_location']
+        has_location = card_found & location.notna()
+        export_df.loc[has_location, 'matched_url'] = 'https://pad.crc.nd.edu' + location[has_location].astype(str)
+
+    # Add notes column for student observations. Rows matched to a card id
+    # that is not in project_cards carry no notes.
+    note_values = pd.DataFrame({'annot_key': annot_keys}).merge(
+        lookups['notes'], on='annot_key', how='left')['notes']
+    note_values.index = export_df.index
+    has_match = matched_id.notna()
+    export_df['notes'] = note_values.where(~has_match | is_no_match | card_found)
 
     # Remove processed_file_location (we have URL instead) but keep missing_card column
     export_df = export_df.drop(columns=['matched_processed_file_location'], errors='ignore')
 
     # Convert ID columns to ensure they export as integers without decimals
-    # We need to handle this specially for CSV export
-    id_columns = ['annot_id', 'PAD#', 'matched_id', 'matched_sample_id']
-
-    # Store original dtypes for restoration if needed
-    for col in id_columns:
+    for col in EXPORT_ID_COLUMNS:
         if col in export_df.columns:
-            # Convert column to object type first to prevent pandas auto-conversion
-            # Handle NaN/None values carefully
-            def format_id(x):
-                # Check if value is NaN, None, or empty string
-                if pd.isna(x) or x is None or (isinstance(x, str) and x == ''):
-                    return ''
-                # Check if value is "no_match" - special case to preserve
-                if x == "no_match":
-                    return "no_match"
-                # Convert to integer (removing any decimal) then to string
-                try:
-                    return str(int(float(x)))
-                except (ValueError, TypeError):
-                    return ''
-
-            export_df[col] = export_df[col].apply(format_id)
-            # Force object dtype to ensure strings aren't converted back to float
-            export_df[col] = export_df[col].astype('object')
+            export_df[col] = format_id_column(export_df[col])
 
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return export_df
+
+def iter_export_csv(source_df, matches, notes, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the export CSV chunk by chunk, joining one slice of annotations at a time"""
+    lookups = build_export_lookups(matches, notes)
+    for start in range(0, max(len(source_df), 1), chunk_rows):
+        chunk = build_export_frame(source_df.iloc[start:start + chunk_rows], matches, notes, lookups)
+        yield chunk.to_csv(index=False, header=(start == 0), na_rep='')
+
+def get_exports_dir():
+    """Get the exports directory (exports/ at the project root)"""
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     exports_dir = os.path.join(base_dir, 'exports')
 
@@ -600,29 +1078,113 @@ def export_data():
     if not os.path.exists(exports_dir):
         os.makedirs(exports_dir)
 
-    filename = os.path.join(exports_dir, f'chemopad_matched_export_{timestamp}.csv')
+    return exports_dir
+
+def write_export_file(timestamp):
+    """Write the full export CSV under exports/ and return its path"""
+    # Export ALL annotations including those with missing_card=True
+    state = get_snapshot()
+    export_df = build_export_frame(all_annotations_df, state['matches'], state['notes'])
+
+    filename = os.path.join(get_exports_dir(), f'chemopad_matched_export_{timestamp}.csv')
 
     # Export to CSV with special handling to preserve integer format
     # Use float_format to prevent .0 decimals, but since we converted to strings, this shouldn't be needed
     export_df.to_csv(filename, index=False, na_rep='')
 
+    return filename
+
+def export_job():
+    """Job handler: write an export file for later download"""
+    filename = write_export_file(datetime.now().strftime('%Y%m%d_%H%M%S'))
+    return {'filename': os.path.basename(filename)}
+
+jobs.register('export', export_job)
+
+@app.route('/api/export')
+@login_required
+def export_data():
+    """Export all matched data to CSV
+
+    Query parameters:
+        stream=1: stream the CSV as it is generated instead of writing it under exports/ first
+        job=1: write the file in a background job and return its id; download it from
+            /api/export/download/<filename> once /api/jobs/<id> reports it done
+        backup=sync|background|skip: how to take the pre-export database backup
+            (default: sync for a plain file export, so a successful response means the
+            backup exists; background with stream=1 or job=1)
+    """
+    stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+    as_job = request.args.get('job', '').lower() in ('1', 'true', 'yes')
+    backup_mode = request.args.get('backup', 'background' if stream or as_job else 'sync')
+    if backup_mode not in ('sync', 'background', 'skip'):
+        return jsonify({'error': f"Invalid backup mode: {backup_mode}"}), 400
+
+    # Create a file backup before export
+    if backup_mode == 'sync':
+        database.create_file_backup('export')
+    elif backup_mode == 'background':
+        jobs.enqueue('backup', 'export', coalesce_key='backup:export')
+
+    if as_job:
+        job_id = jobs.enqueue('export', coalesce_key='export')
+        return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+    # Generate filename with timestamp
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if stream:
+        # ALL annotations including those with missing_card=True, joined chunk by chunk
+        state = get_snapshot()
+        return Response(iter_export_csv(all_annotations_df, state['matches'], state['notes']),
+                        mimetype='text/csv',
+                        headers={
+                            'Content-Disposition': f'attachment; filename=chemopad_export_{timestamp}.csv',
+                            'X-Accel-Buffering': 'no',  # Let nginx pass chunks through
+                        })
+
+    filename = write_export_file(timestamp)
+
     return send_file(filename, as_attachment=True, download_name=f'chemopad_export_{timestamp}.csv')
 
+@app.route('/api/export/download/<filename>')
+@login_required
+def download_export(filename):
+    """Download an export file written by an export job"""
+    return send_from_directory(get_exports_dir(), filename, as_attachment=True)
+
+@app.route('/api/jobs')
+@login_required
+def list_jobs():
+    """List recent background jobs, optionally filtered by ?status="""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({'jobs': jobs.get_jobs(request.args.get('status'), limit)})
+
+@app.route('/api/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Get the status and result of one background job"""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/api/stats')
 @login_required
 def get_stats():
     """Get overall statistics"""
+    progress.refresh(get_snapshot())
+    totals = progress.get_totals()
+
     total_annotations = len(annotations_df)
-    matched_annotations = len(matches)
+    matched_annotations = totals['matches']
 
     # Count completed PAD#s
-    pad_groups = annotations_df.groupby('PAD#')
-    completed_pads = 0
-    total_pads = len(pad_groups)
-
-    for pad, group in pad_groups:
-        if all(annot_id in matches for annot_id in group['annot_id']):
-            completed_pads += 1
+    total_pads = totals['total_pads']
+    completed_pads = totals['completed_pads']
 
     return jsonify({
         'total_annotations': total_annotations,
@@ -636,168 +1198,189 @@ def get_stats():
 @app.route('/gallery')
 @login_required
 def gallery():
-    """Annotation Review - Quality review of PAD annotations organized by lighting conditions"""
-    # Reload matches from database to get latest data
-    global matches
-    matches = database.get_all_matches()
+    """Annotation Review - Quality review of PAD annotations organized by lighting conditions
 
+    Only the filters are rendered here; items are loaded page by page from /api/gallery.
+    """
     # Get optional API filter from URL parameter
     api_filter = request.args.get('api', None)
 
-    # Prepare image data with all annotations
-    gallery_data = []
-
-    for idx, row in annotations_df.iterrows():
-        annot_id = row['annot_id']
-        pad_num = row['PAD#']
-
-        # Get match status
-        matched_card_id = matches.get(annot_id, None)
-        match_status = 'unmatched' if matched_card_id is None else ('no_match' if matched_card_id == 'no_match' else 'matched')
-
-        # If matched to a card, get the image URL
-        image_url = None
-        if matched_card_id and matched_card_id != 'no_match':
-            # Find the project card
-            card = project_cards_df[project_cards_df['id'] == matched_card_id]
-            if not card.empty:
-                image_path = card.iloc[0]['processed_file_location']
-                if pd.notna(image_path):
-                    # Convert path to URL
-                    image_url = image_path.replace('/var/www/html/', 'https://pad.crc.nd.edu/')
-
-        # Get note if exists
-        note = notes.get(annot_id, '')
-
-        gallery_data.append({
-            'annot_id': int(annot_id),
-            'pad_num': int(pad_num),
-            'lighting': row['Lighting (lightbox, benchtop, benchtop dark)'],
-            'camera': row['Camera'],
-            'background': row['black/white background'],
-            'api': row['API'],
-            'sample': row['Sample'] if pd.notna(row['Sample']) else '',
-            'concentration': row['mg concentration (w/w mg/mg or w/v mg/mL)'] if pd.notna(row['mg concentration (w/w mg/mg or w/v mg/mL)']) else '',
-            'match_status': match_status,
-            'image_url': image_url,
-            'card_id': matched_card_id if matched_card_id and matched_card_id != 'no_match' else None,
-            'note': note
-        })
-
-    # Group by lighting condition
-    lighting_groups = {}
-    for item in gallery_data:
-        lighting = item['lighting']
-        if lighting not in lighting_groups:
-            lighting_groups[lighting] = []
-        lighting_groups[lighting].append(item)
+    return render_template('gallery.html',
+                         total_count=len(gallery_records),
+                         lighting_counts=gallery_facets['lighting'],
+                         sorted_lighting=gallery_lighting,
+                         unique_cameras=gallery_facets['cameras'],
+                         unique_apis=gallery_facets['apis'],
+                         page_size=GALLERY_PAGE_SIZE,
+                         api_filter=api_filter)
 
-    # Sort lighting groups for consistent display
-    lighting_order = ['lightbox', 'benchtop', 'no light']
-    sorted_lighting = sorted(lighting_groups.keys(), key=lambda x: lighting_order.index(x) if x in lighting_order else 999)
+@app.route('/api/gallery')
+@login_required
+def gallery_items():
+    """Filtered gallery items in gallery order, one page per request
 
-    # Get unique values for filters
-    unique_cameras = sorted(annotations_df['Camera'].unique())
-    unique_apis = sorted(annotations_df['API'].unique())
+    Filters (each may be repeated, none means all): lighting, camera,
+    background, api, status (matched, no_match, unmatched); q searches
+    PAD# and Sample. Pass the returned next_cursor as ?cursor= for the next page.
+    """
+    try:
+        limit = min(int(request.args.get('limit', GALLERY_PAGE_SIZE)), GALLERY_MAX_PAGE_SIZE)
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else -1
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+
+    # Read matches and notes from this request's snapshot
+    state = get_snapshot()
+    matches = state['matches']
+    notes = state['notes']
+
+    mask = pd.Series(True, index=gallery_df.index)
+    for param, column in (('lighting', 'lighting_key'), ('camera', 'camera_key'), ('background', 'background_key')):
+        values = [value.lower() for value in request.args.getlist(param) if value]
+        if values:
+            mask &= gallery_df[column].isin(values)
+    apis = [value for value in request.args.getlist('api') if value and value != 'all']
+    if apis:
+        mask &= gallery_df['api'].isin(apis)
+    statuses = [value for value in request.args.getlist('status') if value]
+    if statuses:
+        mask &= get_gallery_status(matches).isin(statuses)
+    search = request.args.get('q', '').strip().lower()
+    if search:
+        mask &= (gallery_df['pad_text'].str.contains(search, regex=False) |
+                 gallery_df['sample_key'].str.contains(search, regex=False))
+
+    positions = np.flatnonzero(mask.to_numpy())
+    start = np.searchsorted(positions, cursor, side='right')
+    page = positions[start:start + limit]
+
+    items = []
+    for position in page:
+        item = dict(gallery_records[position])
+        matched_card_id = matches.get(item['annot_id'])
+        is_card = matched_card_id is not None and matched_card_id != 'no_match'
+        card = cards_by_id.get(matched_card_id) if is_card else None
+        item.update({
+            'match_status': _match_status(matched_card_id),
+            'image_url': card['image_url'] if card is not None else None,
+            'card_id': matched_card_id if is_card else None,
+            'note': notes.get(item['annot_id'], '')
+        })
+        items.append(item)
 
-    return render_template('gallery.html',
-                         gallery_data=gallery_data,
-                         lighting_groups=lighting_groups,
-                         sorted_lighting=sorted_lighting,
-                         unique_cameras=unique_cameras,
-                         unique_apis=unique_apis,
-                         api_filter=api_filter)
+    has_more = start + limit < len(positions)
+    return jsonify({
+        'items': items,
+        'next_cursor': str(page[-1]) if has_more else None,
+        'total': len(positions),
+        'lighting_counts': gallery_df.loc[mask, 'lighting'].value_counts().to_dict()
+    })
 
 @app.route('/cards-gallery')
 @login_required
 def cards_gallery():
-    """Lab Card Inventory - Gallery of all project cards (matched and unmatched)"""
-    # Reload matches from database
-    global matches
-    matches = database.get_all_matches()
-
-    # Get invalid cards
-    invalid_cards = database.get_all_invalid_cards()
+    """Lab Card Inventory - Gallery of all project cards (matched and unmatched)
 
+    Only the filters are rendered here; cards are loaded page by page from /api/cards.
+    """
     # Get optional API filter from URL parameter
     api_filter = request.args.get('api', None)
 
-    # Get all matched card IDs
-    matched_card_ids = set([card_id for card_id in matches.values() if card_id != 'no_match'])
-
-    # Prepare ALL cards data (both matched and unmatched)
-    cards_data = []
-
-    for idx, row in project_cards_df.iterrows():
-        card_id = row['id']
-
-        # Extract API/drug name from sample_name
-        sample_name = row['sample_name'] if pd.notna(row['sample_name']) else 'Unknown'
-        api = sample_name.split('(')[0].strip() if '(' in sample_name else sample_name
-
-        # Get image URL
-        image_url = None
-        if pd.notna(row['processed_file_location']):
-            image_url = row['processed_file_location'].replace('/var/www/html/', 'https://pad.crc.nd.edu/')
-
-        # Parse camera type
-        camera = row['camera_type_1'] if pd.notna(row['camera_type_1']) else 'Unknown'
-
-        # Parse date
-        date_created = row['date_of_creation'] if pd.notna(row['date_of_creation']) else ''
-
-        # Check if matched
-        is_matched = card_id in matched_card_ids
-
-        # Check if marked as invalid
-        is_invalid = card_id in invalid_cards
-        invalid_reason = invalid_cards.get(card_id, '') if is_invalid else ''
-
-        # Get PAD ID (sample_id)
-        pad_id = row['sample_id'] if pd.notna(row['sample_id']) else 'N/A'
-
-        cards_data.append({
-            'card_id': int(card_id),
-            'pad_id': pad_id,  # PAD ID from sample_id field
-            'api': api,
-            'sample_name': sample_name,
-            'camera': camera,
-            'date': date_created,
-            'image_url': image_url,
-            'is_matched': is_matched,
-            'is_invalid': is_invalid,
-            'invalid_reason': invalid_reason,
-            'quantity': row['quantity'] if pd.notna(row['quantity']) else None,
-            'notes': row['notes'] if pd.notna(row['notes']) else ''
-        })
-
-    # Group by API
-    api_groups = {}
-    for card in cards_data:
-        api = card['api']
-        if api not in api_groups:
-            api_groups[api] = []
-        api_groups[api].append(card)
-
-    # Sort API groups alphabetically
-    sorted_apis = sorted(api_groups.keys())
-
-    # Get unique cameras for filters
-    unique_cameras = sorted(set([card['camera'] for card in cards_data]))
-
     # Count matched vs unmatched
-    total_matched = sum(1 for card in cards_data if card['is_matched'])
-    total_unmatched = len(cards_data) - total_matched
+    matched_card_ids = get_snapshot()['matched_cards']
+    total_matched = sum(1 for card_id in matched_card_ids if card_id in cards_by_id)
 
     return render_template('cards_gallery.html',
-                         cards_data=cards_data,
-                         api_groups=api_groups,
-                         sorted_apis=sorted_apis,
-                         unique_cameras=unique_cameras,
+                         api_counts=inventory_facets['apis'],
+                         sorted_apis=sorted(inventory_facets['apis']),
+                         unique_cameras=inventory_facets['cameras'],
                          api_filter=api_filter,
-                         total_cards=len(cards_data),
+                         page_size=INVENTORY_PAGE_SIZE,
+                         total_cards=len(inventory_records),
                          total_matched=total_matched,
-                         total_unmatched=total_unmatched)
+                         total_unmatched=len(inventory_records) - total_matched)
+
+@app.route('/api/cards')
+@login_required
+def inventory_cards():
+    """Filtered project cards in inventory order, one page per request
+
+    Filters (each may be repeated, none means all): api, camera,
+    match (matched, unmatched), status (valid, invalid), similar=1 for cards
+    with suggested duplicates; q searches card id and sample name. Pass the
+    returned next_cursor as ?cursor= for the next page.
+    """
+    try:
+        limit = min(int(request.args.get('limit', INVENTORY_PAGE_SIZE)), INVENTORY_MAX_PAGE_SIZE)
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else -1
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+
+    state = get_snapshot()
+    matched_card_ids = state['matched_cards']
+    invalid_cards = state['invalid_cards']
+    is_matched, is_invalid = get_inventory_status(matched_card_ids, invalid_cards)
+    similar = duplicates.get_suggestions()
+
+    mask = pd.Series(True, index=inventory_df.index)
+    apis = [value.lower() for value in request.args.getlist('api') if value and value != 'all']
+    if apis:
+        mask &= inventory_df['api_key'].isin(apis)
+    cameras = [value.lower() for value in request.args.getlist('camera') if value]
+    if cameras:
+        mask &= inventory_df['camera_key'].isin(cameras)
+    match_filter = set(request.args.getlist('match'))
+    if match_filter:
+        mask &= (is_matched & ('matched' in match_filter)) | (~is_matched & ('unmatched' in match_filter))
+    status_filter = set(request.args.getlist('status'))
+    if status_filter:
+        mask &= (is_invalid & ('invalid' in status_filter)) | (~is_invalid & ('valid' in status_filter))
+    if request.args.get('similar') == '1':
+        mask &= inventory_df['card_id'].isin(list(similar))
+    search = request.args.get('q', '').strip().lower()
+    if search:
+        mask &= (inventory_df['card_id_text'].str.contains(search, regex=False) |
+                 inventory_df['sample_key'].str.contains(search, regex=False))
+
+    positions = np.flatnonzero(mask.to_numpy())
+    start = np.searchsorted(positions, cursor, side='right')
+    page = positions[start:start + limit]
+
+    cards = []
+    for position in page:
+        card = dict(inventory_records[position])
+        card_id = card['card_id']
+        card.update({
+            'is_matched': card_id in matched_card_ids,
+            'is_invalid': card_id in invalid_cards,
+            'invalid_reason': invalid_cards.get(card_id, ''),
+            'similar_cards': [other_id for other_id, _ in similar.get(card_id, ())]
+        })
+        cards.append(card)
+
+    has_more = start + limit < len(positions)
+    return jsonify({
+        'cards': cards,
+        'next_cursor': str(page[-1]) if has_more else None,
+        'total': len(positions),
+        'api_counts': inventory_df.loc[mask, 'api'].value_counts().to_dict()
+    })
+
+@app.route('/api/duplicates')
+@login_required
+def duplicate_groups():
+    """Groups of cards whose images are near-duplicates (hashes from scripts/find_duplicates.py)"""
+    similar = duplicates.get_suggestions()
+    invalid_cards = get_snapshot()['invalid_cards']
+    groups = []
+    for group in duplicates.group_similar(similar):
+        groups.append({
+            'cards': group,
+            'pairs': [{'card_id': card_id, 'similar_to': other_id, 'distance': distance}
+                      for card_id in group for other_id, distance in similar[card_id] if card_id < other_id],
+            'flagged': [card_id for card_id in group if card_id in invalid_cards]
+        })
+    return jsonify({'groups': groups})
 
 @app.route('/api/mark-card-invalid', methods=['POST'])
 @login_required
@@ -0,0 +1,148 @@
+"""
+Batch auto-matcher for ChemoPAD Annotation Matcher
+Proposes a card for every unmatched annotation row by solving each PAD# as an
+assignment problem over the candidate scores from ranking.py (Hungarian
+algorithm): each card goes to at most one row, cards already matched or marked
+invalid are left out, and weak assignments are dropped. Proposals are staged in
+the match_proposals table until a reviewer accepts them.
+"""
+
+import time
+import logging
+
+import numpy as np
+
+import database
+import ranking
+
+logger = logging.getLogger(__name__)
+
+# Assignments scoring below this are not proposed: the camera has to agree
+# (ranking.WEIGHTS['camera']) and the card must not be deleted with the wrong API
+MIN_SCORE = 4.0
+
+def hungarian(cost):
+    """Minimum-cost assignment of rows to columns (Kuhn-Munkres with potentials)
+
+    cost is an n x m array. Returns (rows, cols) index arrays of the
+    min(n, m) assigned pairs, sorted by row.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # 1-based with column 0 as the augmenting path root, as in the textbook version
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # Row assigned to each column, 0 for none
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        visited = np.zeros(m + 1, dtype=bool)
+        while owner[j0] != 0:
+            visited[j0] = True
+            i0 = owner[j0]
+            free = ~visited
+            free[0] = False
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            j1 = int(np.argmin(np.where(free, minv, np.inf)))
+            delta = minv[j1]
+            u[owner[visited]] += delta
+            v[visited] -= delta
+            minv[free] -= delta
+            j0 = j1
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(owner[1:])
+    rows = owner[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+def group_by_pad(pad_index):
+    """{PAD#: [(annot_id, API), ...]} from {(API, PAD#): annot_ids}
+
+    A PAD# listed under several APIs shares one set of cards, so its rows are solved together.
+    """
+    pads = {}
+    for (api_name, pad_num), annot_ids in pad_index.items():
+        pads.setdefault(pad_num, []).extend((int(annot_id), api_name) for annot_id in annot_ids)
+    return pads
+
+def propose_pad(pad_num, rows, matches, matched_cards, invalid_cards, min_score=MIN_SCORE):
+    """Proposals for the unmatched rows of one PAD#, as a list of dicts"""
+    annot_ids = [annot_id for annot_id, _ in rows]
+    open_rows = [i for i, annot_id in enumerate(annot_ids) if matches.get(annot_id) is None]
+    if not open_rows:
+        return []
+
+    # All rows are scored so the session score sees the PAD#'s existing matches
+    scored = ranking.score_pad(pad_num, annot_ids, matches, matched_cards)
+    if scored is None:
+        return []
+    card_ids, scores = scored
+    free_cards = np.flatnonzero([card_id not in matched_cards and card_id not in invalid_cards
+                                 for card_id in card_ids])
+    if not len(free_cards):
+        return []
+
+    scores = scores[np.ix_(open_rows, free_cards)]
+    confidence = ranking.confidences(scores)
+    proposals = []
+    for i, j in zip(*hungarian(-scores)):
+        if scores[i, j] < min_score:
+            continue
+        annot_id, api_name = rows[open_rows[i]]
+        proposals.append({
+            'annot_id': annot_id,
+            'card_id': int(card_ids[free_cards[j]]),
+            'api': api_name,
+            'pad_num': int(pad_num),
+            'score': float(scores[i, j]),
+            'confidence': float(confidence[i, j]),
+        })
+    return proposals
+
+def propose(pad_index, matches, matched_cards, invalid_cards, min_score=MIN_SCORE):
+    """Proposals for every unmatched row of every PAD# in {(API, PAD#): annot_ids}"""
+    proposals = []
+    for pad_num, rows in group_by_pad(pad_index).items():
+        proposals.extend(propose_pad(pad_num, rows, matches, matched_cards, invalid_cards, min_score))
+    return proposals
+
+def run(pad_index, min_score=MIN_SCORE):
+    """Solve every PAD# against the current database state and replace the staged proposals
+
+    ranking.configure must have been called. Returns (proposal count, seconds taken).
+    """
+    start_time = time.perf_counter()
+    snapshot = database.get_snapshot()
+    proposals = propose(pad_index, snapshot['matches'], snapshot['matched_cards'], snapshot['invalid_cards'], min_score)
+    database.replace_match_proposals(proposals)
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Auto-match proposed {len(proposals)} matches for {len(pad_index)} PAD#s in {elapsed:.2f}s")
+    return len(proposals), elapsed
+
+def current_proposals(api_name=None, pad_num=None, snapshot=None):
+    """Staged proposals whose row is still unmatched and whose card is still free and valid
+
+    snapshot is a database.get_snapshot() to check against, by default the latest.
+    """
+    if snapshot is None:
+        snapshot = database.get_snapshot()
+    return [proposal for proposal in database.get_match_proposals(api_name, pad_num)
+            if snapshot['matches'].get(proposal['annot_id']) is None
+            and proposal['card_id'] not in snapshot['matched_cards']
+            and proposal['card_id'] not in snapshot['invalid_cards']]
@@ -4,35 +4,166 @@ Uses SQLite for reliable concurrent access and data persistence
 """
 
 import sqlite3
+import gzip
+import hashlib
 import json
 import os
+import shutil
+import threading
 from datetime import datetime
 from contextlib import contextmanager
 import logging
 
 logger = logging.getLogger(__name__)
 
+class CardAlreadyMatchedError(Exception):
+    """Raised when a card_id is already matched to another annotation"""
+
+class MatchConflictError(Exception):
+    """Raised when a compare-and-set write finds matches changed since the caller read them
+
+    conflicts is {annot_id: {'card_id', 'version'}} with the current state of each changed row.
+    """
+
+    def __init__(self, conflicts):
+        super().__init__(f"Matches changed since they were read: {sorted(conflicts)}")
+        self.conflicts = conflicts
+
+# Tables whose writes are recorded in change_log, with their key column
+LOGGED_TABLES = {
+    'matches': 'annot_id',
+    'notes': 'annot_id',
+    'invalid_cards': 'card_id',
+}
+
+# Value column of each logged table, recorded in change_log as old_value / new_value
+LOGGED_VALUES = {
+    'matches': 'card_id',
+    'notes': 'note_text',
+    'invalid_cards': 'reason',
+}
+
+# match_events field recorded for writes to each table
+EVENT_FIELDS = {'matches': 'match', 'notes': 'note'}
+
+# Events older than this that no longer describe the current state are dropped by compaction
+EVENT_RETENTION_DAYS = 90
+
+# Tables that can be diffed and restored (see restore.py): {table: (key column, value column)}
+RESTORE_TABLES = {table: (key, LOGGED_VALUES[table]) for table, key in LOGGED_TABLES.items()}
+
+# Callbacks notified after save_match / save_note commit
+_change_listeners = []
+
+# Keep this many change_log entries; caches further behind do a full reload
+CHANGE_LOG_RETENTION = 50000
+
+# Above this many changed keys a full reload is cheaper than keyed lookups
+CACHE_MAX_DELTA_KEYS = 2000
+
+# In-process copy of matches / notes / invalid_cards at a change_log version.
+# Published dicts are never mutated, a refresh swaps in new ones.
+_cache_lock = threading.Lock()
+_cache = {'version': None, 'matches': {}, 'matched_cards': {}, 'match_versions': {}, 'notes': {}, 'invalid_cards': {}}
+
+# Applied once to every pooled connection
+CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',  # Write-Ahead Logging for better concurrency
+    'PRAGMA synchronous=NORMAL',  # Durable with WAL, fsync only at checkpoints
+    'PRAGMA cache_size=-16000',  # 16 MB page cache kept warm between requests
+    'PRAGMA mmap_size=268435456',  # Read up to 256 MB of the file through mmap
+    'PRAGMA temp_store=MEMORY',
+]
+
+# Pages copied per step of an online backup; SQLite's read lock is only held
+# for one step at a time, so writers are never queued behind a whole copy
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_COMPRESSLEVEL = 6
+
+# Backup types written as deltas against the latest full backup
+DELTA_BACKUP_TYPES = {'auto'}
+DELTA_BACKUP_FORMAT = 2  # 1 listed deleted rows as [key, None] among the changed rows
+
+BACKUP_SUFFIXES = ('.db', '.db.gz', '.json.gz')
+
+# Columns of backup_catalog written by _catalog_backup
+BACKUP_CATALOG_COLUMNS = ['filename', 'backup_type', 'kind', 'size', 'checksum', 'change_seq', 'base_filename',
+                          'matches_count', 'notes_count', 'invalid_cards_count', 'created_at']
+
+# Serializes backups within this process (e.g. two background auto-backups)
+_backup_lock = threading.Lock()
+
+# One connection per thread, reused across requests (see get_db)
+_local = threading.local()
+
+# Connections inherited from a parent process, kept referenced so they are never closed here
+_abandoned_connections = []
+
 def get_db_path():
-    """Get the database file path"""
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    db_dir = os.path.join(base_dir, 'database')
+    """Get the database file path (CHEMOPAD_DB_PATH overrides the default)"""
+    db_path = os.environ.get('CHEMOPAD_DB_PATH')
+    if not db_path:
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        db_path = os.path.join(base_dir, 'database', 'chemopad.db')
+    db_dir = os.path.dirname(db_path)
 
     # Create database directory if it doesn't exist
     if not os.path.exists(db_dir):
         os.makedirs(db_dir)
 
-    return os.path.join(db_dir, 'chemopad.db')
+    return db_path
+
+def get_backup_dir():
+    """Get the backup directory, next to the database file"""
+    backup_dir = os.path.join(os.path.dirname(get_db_path()), 'backups')
+
+    # Create backup directory if it doesn't exist
+    if not os.path.exists(backup_dir):
+        os.makedirs(backup_dir)
+
+    return backup_dir
+
+def _connect():
+    """Open and configure a new database connection"""
+    conn = sqlite3.connect(get_db_path(),
+                           timeout=30.0,  # 30 second timeout for locks
+                           cached_statements=256)  # Prepared statements reused while the connection lives
+    conn.row_factory = sqlite3.Row  # Enable column access by name
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
 
 @contextmanager
 def get_db():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(get_db_path(), timeout=30.0)  # 30 second timeout for locks
-    conn.row_factory = sqlite3.Row  # Enable column access by name
-    conn.execute('PRAGMA journal_mode=WAL')  # Write-Ahead Logging for better concurrency
+    """Context manager for the calling thread's pooled database connection
+
+    The connection stays open for reuse. Nested uses share it, and any
+    transaction still open when the outermost block exits is rolled back,
+    matching the old close-on-exit behaviour.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        if conn is not None:
+            # Inherited across fork: never use or close the parent's connection
+            _abandoned_connections.append(conn)
+        conn = _local.conn = _connect()
+        _local.pid = os.getpid()
+        _local.depth = 0
+
+    _local.depth += 1
     try:
         yield conn
     finally:
+        _local.depth -= 1
+        if _local.depth == 0 and conn.in_transaction:
+            conn.rollback()
+
+def close_db():
+    """Close the calling thread's pooled connection (e.g. before forking workers)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
         conn.close()
+    _local.conn = None
 
 def init_db():
     """Initialize database tables"""
@@ -47,6 +178,21 @@ def init_db():
             )
         ''')
 
+        # A card can only be matched to one annotation ("no_match" may repeat)
+        try:
+            conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_card_id
+                ON matches (card_id) WHERE card_id != 'no_match'
+            ''')
+        except sqlite3.IntegrityError:
+            duplicates = conn.execute('''
+                SELECT card_id, GROUP_CONCAT(annot_id) FROM matches
+                WHERE card_id != 'no_match'
+                GROUP BY card_id HAVING COUNT(*) > 1
+            ''').fetchall()
+            logger.error(f"Cannot enforce unique card_id, duplicate matches found: "
+                         f"{[(row[0], row[1]) for row in duplicates]}")
+
         # Create notes table with annot_id as primary key
         conn.execute('''
             CREATE TABLE IF NOT EXISTS notes (
@@ -76,67 +222,702 @@ def init_db():
             )
         ''')
 
+        # Create change log so other processes can detect writes cheaply, and
+        # with the old/new values so past states can be reconstructed (restore.py)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_key INTEGER NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                operation TEXT,
+                old_value,
+                new_value
+            )
+        ''')
+
+        # Triggers are (re)created under the write lock so no write goes unlogged
+        conn.execute('BEGIN IMMEDIATE')
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(change_log)')}
+        if 'operation' not in columns:
+            # Older change logs only recorded keys: add the value columns and replace the triggers
+            for column in ('operation TEXT', 'old_value', 'new_value'):
+                conn.execute(f'ALTER TABLE change_log ADD COLUMN {column}')
+            for table in LOGGED_TABLES:
+                for event in ('insert', 'update', 'delete'):
+                    conn.execute(f'DROP TRIGGER IF EXISTS {table}_log_{event}')
+
+        for table, key in LOGGED_TABLES.items():
+            value = LOGGED_VALUES[table]
+            for event, ref, old_value, new_value in (('INSERT', 'NEW', 'NULL', f'NEW.{value}'),
+                                                     ('UPDATE', 'NEW', f'OLD.{value}', f'NEW.{value}'),
+                                                     ('DELETE', 'OLD', f'OLD.{value}', 'NULL')):
+                conn.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_log_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        INSERT INTO change_log (table_name, row_key, operation, old_value, new_value)
+                        VALUES ('{table}', {ref}.{key}, '{event}', {old_value}, {new_value});
+                    END
+                ''')
+        conn.commit()
+
+        # Create per-annotation row versions for compare-and-set match writes. Kept
+        # by triggers on every write to matches, including deletes, so a version
+        # never repeats even when a match is removed and made again.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS match_versions (
+                annot_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+        for event, ref in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS matches_version_{event.lower()}
+                AFTER {event} ON matches
+                BEGIN
+                    INSERT INTO match_versions (annot_id, version) VALUES ({ref}.annot_id, 1)
+                    ON CONFLICT (annot_id) DO UPDATE SET version = version + 1;
+                END
+            ''')
+        conn.commit()
+
+        # Create append-only log of match and note events; matches and notes hold
+        # the current state materialized from it (see event_state_sql)
+        conn.execute('BEGIN IMMEDIATE')
+        events_exist = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'match_events'").fetchone()
+        if not events_exist:
+            conn.execute('''
+                CREATE TABLE match_events (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    annot_id INTEGER NOT NULL,
+                    field TEXT NOT NULL,
+                    event_type TEXT NOT NULL,
+                    value TEXT,
+                    annotator TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('CREATE INDEX idx_match_events_key ON match_events (field, annot_id, seq)')
+            conn.execute('CREATE INDEX idx_match_events_annotator ON match_events (annotator, seq)')
+
+            # Existing rows become the baseline events, so the log alone describes the current state
+            conn.execute('''
+                INSERT INTO match_events (annot_id, field, event_type, value, annotator, created_at)
+                SELECT annot_id, 'match', CASE WHEN card_id = 'no_match' THEN 'no_match' ELSE 'match' END,
+                       card_id, 'baseline', updated_at
+                FROM matches ORDER BY annot_id
+            ''')
+            conn.execute('''
+                INSERT INTO match_events (annot_id, field, event_type, value, annotator, created_at)
+                SELECT annot_id, 'note', 'note', note_text, 'baseline', updated_at
+                FROM notes ORDER BY annot_id
+            ''')
+        conn.commit()
+
+        # Create backup catalog so backup listing and retention never scan the directory
+        catalog_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'backup_catalog'").fetchone()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS backup_catalog (
+                filename TEXT PRIMARY KEY,
+                backup_type TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                checksum TEXT NOT NULL,
+                change_seq INTEGER,
+                base_filename TEXT,
+                matches_count INTEGER,
+                notes_count INTEGER,
+                invalid_cards_count INTEGER,
+                created_at TIMESTAMP NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_backup_catalog_type ON backup_catalog (backup_type, created_at)')
+
+        # Create jobs table for the background job queue (see jobs.py)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_type TEXT NOT NULL,
+                args TEXT NOT NULL,
+                coalesce_key TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                run_after REAL NOT NULL,
+                pid INTEGER,
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after)')
+
+        # Create card_hashes table for perceptual hashes of card images (see duplicates.py)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS card_hashes (
+                card_id INTEGER PRIMARY KEY,
+                location TEXT NOT NULL,
+                phash TEXT NOT NULL,
+                dhash TEXT NOT NULL,
+                computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                revision INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(card_hashes)')}
+        if 'revision' not in columns:
+            # Older tables: versions were timestamps, too coarse for rehashes within a second
+            conn.execute('ALTER TABLE card_hashes ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+
+        # Create match_proposals table staging auto-matcher assignments for review (see automatch.py)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS match_proposals (
+                annot_id INTEGER PRIMARY KEY,
+                card_id INTEGER NOT NULL UNIQUE,
+                api TEXT NOT NULL,
+                pad_num INTEGER NOT NULL,
+                score REAL NOT NULL,
+                confidence REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_match_proposals_pad ON match_proposals (api, pad_num)')
+
         conn.commit()
         logger.info("Database initialized successfully")
 
-def save_match(annot_id, card_id):
-    """Save a match to the database"""
+    prune_change_log()
+
+    if not catalog_exists:
+        catalog_existing_backups()
+
+def get_data_version(conn=None):
+    """Get the current change version (highest change_log sequence number)"""
+    if conn is None:
+        with get_db() as conn:
+            return get_data_version(conn)
+    # sqlite_sequence keeps counting even after change_log rows are pruned
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+def prune_change_log(keep=CHANGE_LOG_RETENTION):
+    """Drop old change_log entries, keeping the most recent ones"""
     with get_db() as conn:
+        version = get_data_version(conn)
+        deleted = conn.execute('DELETE FROM change_log WHERE seq <= ?', (version - keep,)).rowcount
+        conn.commit()
+    if deleted:
+        logger.info(f"Pruned {deleted} change_log entries")
+
+def add_change_listener(listener):
+    """Register a callback for writes made through save_match / save_note
+
+    The callback is called as listener(table_name, changes, version_before, version_after)
+    where changes is a list of (annot_id, old_value, new_value) tuples.
+    """
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+def _notify_change(table_name, changes, version_before, version_after):
+    """Call registered change listeners, never failing the write itself"""
+    for listener in _change_listeners:
+        try:
+            listener(table_name, changes, version_before, version_after)
+        except Exception as e:
+            logger.error(f"Change listener failed: {e}")
+
+def _parse_card_id(card_id):
+    """Keep "no_match" as string, convert others to int if possible"""
+    if card_id is not None and card_id != "no_match":
+        try:
+            card_id = int(card_id)
+        except (ValueError, TypeError):
+            pass
+    return card_id
+
+def _match_versions(conn, annot_ids):
+    """Current row version of each annot_id, 0 for rows never written"""
+    versions = {int(annot_id): 0 for annot_id in annot_ids}
+    for chunk in _chunks(list(versions)):
+        cursor = conn.execute(f'''
+            SELECT annot_id, version FROM match_versions
+            WHERE annot_id IN ({', '.join('?' * len(chunk))})
+        ''', chunk)
+        versions.update({row['annot_id']: row['version'] for row in cursor})
+    return versions
+
+def save_match(annot_id, card_id, annotator=None, expected_version=None):
+    """Save a match to the database, recording a match event for annotator (a session id)
+
+    With expected_version (from get_match_version or a snapshot's match_versions)
+    the write is a compare-and-set: if the row changed since, nothing is written
+    and MatchConflictError is raised. Returns the row's new version.
+    """
+    with get_db() as conn:
+        # Take the write lock up front so the versions below bracket only this
+        # write, and no other process can change the row between check and write
+        conn.execute('BEGIN IMMEDIATE')
+        version_before = get_data_version(conn)
+        row = conn.execute('SELECT card_id FROM matches WHERE annot_id = ?', (annot_id,)).fetchone()
+        old_card_id = _parse_card_id(row['card_id']) if row else None
+
+        if expected_version is not None:
+            row_version = _match_versions(conn, [annot_id])[int(annot_id)]
+            if row_version != expected_version:
+                conn.rollback()
+                raise MatchConflictError({int(annot_id): {'card_id': old_card_id, 'version': row_version}})
+
         if card_id is None:
             # Delete the match
             conn.execute('DELETE FROM matches WHERE annot_id = ?', (annot_id,))
         else:
-            # Insert or update the match
-            conn.execute('''
-                INSERT OR REPLACE INTO matches (annot_id, card_id, updated_at)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-            ''', (annot_id, str(card_id)))
-
+            # Insert or update the match. Not INSERT OR REPLACE: that would
+            # silently delete another annotation's row holding the same card.
+            try:
+                conn.execute('''
+                    INSERT INTO matches (annot_id, card_id, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (annot_id) DO UPDATE
+                    SET card_id = excluded.card_id, updated_at = excluded.updated_at
+                ''', (annot_id, str(card_id)))
+            except sqlite3.IntegrityError:
+                conn.rollback()
+                raise CardAlreadyMatchedError(f"Card {card_id} is already matched to another annotation")
+
+        _record_events(conn, 'match', [(annot_id, card_id)], annotator)
+        row_version = _match_versions(conn, [annot_id])[int(annot_id)]
+        version_after = get_data_version(conn)
         conn.commit()
         logger.info(f"Saved match: annot_id={annot_id}, card_id={card_id}")
 
-def save_note(annot_id, note_text):
-    """Save a note to the database"""
+    _notify_change('matches', [(annot_id, old_card_id, _parse_card_id(card_id))],
+                   version_before, version_after)
+    return row_version
+
+def get_match_version(annot_id):
+    """Current row version of one annotation's match, for a later compare-and-set save_match"""
     with get_db() as conn:
+        return _match_versions(conn, [annot_id])[int(annot_id)]
+
+def save_note(annot_id, note_text, annotator=None):
+    """Save a note to the database, recording a note event for annotator (a session id)"""
+    with get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        version_before = get_data_version(conn)
+        row = conn.execute('SELECT note_text FROM notes WHERE annot_id = ?', (annot_id,)).fetchone()
+        old_note = row['note_text'] if row else None
+
         if not note_text:
             # Delete the note if empty
             conn.execute('DELETE FROM notes WHERE annot_id = ?', (annot_id,))
         else:
-            # Insert or update the note
+            # Insert or update the note (an upsert, so change_log records the old text)
             conn.execute('''
-                INSERT OR REPLACE INTO notes (annot_id, note_text, updated_at)
+                INSERT INTO notes (annot_id, note_text, updated_at)
                 VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (annot_id) DO UPDATE
+                SET note_text = excluded.note_text, updated_at = excluded.updated_at
             ''', (annot_id, note_text))
 
+        _record_events(conn, 'note', [(annot_id, note_text or None)], annotator)
+        version_after = get_data_version(conn)
         conn.commit()
         logger.info(f"Saved note: annot_id={annot_id}")
 
-def get_all_matches():
-    """Get all matches as a dictionary"""
-    matches = {}
+    _notify_change('notes', [(annot_id, old_note, note_text or None)],
+                   version_before, version_after)
+
+def _event_type(field, value):
+    if field == 'match':
+        if value is None:
+            return 'unmatch'
+        return 'no_match' if value == "no_match" else 'match'
+    return 'note_delete' if value is None else 'note'
+
+def _record_events(conn, field, changes, annotator=None):
+    """Append match or note events for (annot_id, new value) pairs inside the caller's transaction"""
+    conn.executemany('''
+        INSERT INTO match_events (annot_id, field, event_type, value, annotator)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(annot_id, field, _event_type(field, value), None if value is None else str(value), annotator)
+          for annot_id, value in changes])
+
+def _chunks(items, size=500):
+    """Split a list into chunks that stay under SQLite's bound parameter limit"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def save_matches_bulk(items, annotator=None, expected_versions=None):
+    """Save many matches in a single transaction
+
+    items is an iterable of (annot_id, card_id) pairs; card_id None deletes the
+    match, and a later pair for the same annot_id wins. If any card is already
+    matched elsewhere nothing is written and CardAlreadyMatchedError is raised.
+    expected_versions {annot_id: version} makes it a compare-and-set: if any of
+    those rows changed, nothing is written and MatchConflictError is raised.
+    """
+    new_cards = {}
+    for annot_id, card_id in items:
+        new_cards[int(annot_id)] = None if card_id is None else str(card_id)
+    if not new_cards:
+        return 0
+
     with get_db() as conn:
-        cursor = conn.execute('SELECT annot_id, card_id FROM matches')
-        for row in cursor:
-            # Keep "no_match" as string, convert others to int if possible
-            card_id = row['card_id']
-            if card_id != "no_match":
-                try:
-                    card_id = int(card_id)
-                except (ValueError, TypeError):
-                    pass
-            matches[row['annot_id']] = card_id
+        conn.execute('BEGIN IMMEDIATE')
+        version_before = get_data_version(conn)
+
+        annot_ids = list(new_cards)
+        old_rows = {}
+        for chunk in _chunks(annot_ids):
+            cursor = conn.execute(f'''
+                SELECT annot_id, card_id, created_at FROM matches
+                WHERE annot_id IN ({', '.join('?' * len(chunk))})
+            ''', chunk)
+            old_rows.update({row['annot_id']: (row['card_id'], row['created_at']) for row in cursor})
+
+        if expected_versions:
+            expected_versions = {int(annot_id): version for annot_id, version in expected_versions.items()}
+            changed_versions = {annot_id: version for annot_id, version
+                                in _match_versions(conn, expected_versions).items()
+                                if version != expected_versions[annot_id]}
+            if changed_versions:
+                current = {}
+                for chunk in _chunks(list(changed_versions)):
+                    current.update(_load_rows(conn, 'matches', chunk))
+                conn.rollback()
+                raise MatchConflictError({annot_id: {'card_id': current.get(annot_id), 'version': version}
+                                          for annot_id, version in changed_versions.items()})
+
+        # Clear every changed row first so cards can move between annotations
+        # within the batch without tripping the unique card_id index
+        changed = [annot_id for annot_id in annot_ids
+                   if old_rows.get(annot_id, (None,))[0] != new_cards[annot_id]]
+        conn.executemany('DELETE FROM matches WHERE annot_id = ?',
+                         [(annot_id,) for annot_id in changed if annot_id in old_rows])
+        try:
+            conn.executemany('''
+                INSERT INTO matches (annot_id, card_id, created_at, updated_at)
+                VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)
+            ''', [(annot_id, new_cards[annot_id], old_rows.get(annot_id, (None, None))[1])
+                  for annot_id in changed if new_cards[annot_id] is not None])
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            raise CardAlreadyMatchedError("One or more cards are already matched to another annotation")
+
+        _record_events(conn, 'match', [(annot_id, new_cards[annot_id]) for annot_id in changed], annotator)
+        version_after = get_data_version(conn)
+        conn.commit()
+        logger.info(f"Saved {len(changed)} matches in bulk ({len(annot_ids) - len(changed)} unchanged)")
+
+    _notify_change('matches',
+                   [(annot_id, _parse_card_id(old_rows.get(annot_id, (None,))[0]), _parse_card_id(new_cards[annot_id]))
+                    for annot_id in changed],
+                   version_before, version_after)
+    return len(changed)
+
+def save_notes_bulk(items, annotator=None):
+    """Save many notes in a single transaction
+
+    items is an iterable of (annot_id, note_text) pairs; an empty note deletes
+    it, and a later pair for the same annot_id wins.
+    """
+    new_notes = {}
+    for annot_id, note_text in items:
+        new_notes[int(annot_id)] = note_text or None
+    if not new_notes:
+        return 0
+
+    with get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        version_before = get_data_version(conn)
+
+        old_notes = {}
+        for chunk in _chunks(list(new_notes)):
+            old_notes.update(_load_rows(conn, 'notes', chunk))
+
+        changed = [annot_id for annot_id, note_text in new_notes.items() if old_notes.get(annot_id) != note_text]
+        conn.executemany('DELETE FROM notes WHERE annot_id = ?',
+                         [(annot_id,) for annot_id in changed if new_notes[annot_id] is None])
+        conn.executemany('''
+            INSERT INTO notes (annot_id, note_text, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (annot_id) DO UPDATE
+            SET note_text = excluded.note_text, updated_at = excluded.updated_at
+        ''', [(annot_id, new_notes[annot_id]) for annot_id in changed if new_notes[annot_id] is not None])
+
+        _record_events(conn, 'note', [(annot_id, new_notes[annot_id]) for annot_id in changed], annotator)
+        version_after = get_data_version(conn)
+        conn.commit()
+        logger.info(f"Saved {len(changed)} notes in bulk ({len(new_notes) - len(changed)} unchanged)")
+
+    _notify_change('notes',
+                   [(annot_id, old_notes.get(annot_id), new_notes[annot_id]) for annot_id in changed],
+                   version_before, version_after)
+    return len(changed)
+
+def event_state_sql(field, schema='main'):
+    """SQL for the current (annot_id, value) of a match_events field: the last event of each annotation"""
+    return f'''
+        SELECT e.annot_id, e.value FROM {schema}.match_events e
+        JOIN (
+            SELECT MAX(seq) AS seq FROM {schema}.match_events WHERE field = '{field}' GROUP BY annot_id
+        ) latest USING (seq)
+        WHERE e.value IS NOT NULL
+    '''
+
+def compact_match_events(retention_days=EVENT_RETENTION_DAYS):
+    """Drop events older than retention_days that no longer describe the current state
+
+    An old event is kept only while it is the latest event of its annotation and
+    field and still holds a value, so the log still rebuilds matches and notes.
+    """
+    with get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        deleted = conn.execute('''
+            DELETE FROM match_events
+            WHERE created_at < datetime('now', ?)
+              AND (value IS NULL OR EXISTS (
+                  SELECT 1 FROM match_events later
+                  WHERE later.field = match_events.field
+                    AND later.annot_id = match_events.annot_id
+                    AND later.seq > match_events.seq
+              ))
+        ''', (f'-{int(retention_days)} days',)).rowcount
+        conn.commit()
 
-    return matches
+    logger.info(f"Compacted match_events: removed {deleted} superseded events")
+    return deleted
+
+def get_match_events(annot_id=None, annotator=None, limit=100):
+    """Get the most recent match and note events, newest first, optionally for one annotation or annotator"""
+    query = 'SELECT * FROM match_events WHERE 1 = 1'
+    params = []
+    if annot_id is not None:
+        query += ' AND annot_id = ?'
+        params.append(annot_id)
+    if annotator is not None:
+        query += ' AND annotator = ?'
+        params.append(annotator)
+    query += ' ORDER BY seq DESC LIMIT ?'
+    params.append(limit)
 
-def get_all_notes():
-    """Get all notes as a dictionary"""
-    notes = {}
     with get_db() as conn:
-        cursor = conn.execute('SELECT annot_id, note_text FROM notes')
-        for row in cursor:
-            notes[row['annot_id']] = row['note_text']
+        return [dict(row) for row in conn.execute(query, params)]
+
+def row_diff_sql(table_name, old_schema, new_schema, keys_filter=''):
+    """SQL listing rows of a RESTORE_TABLES table that differ between two attached schemas
+
+    Yields (key, old value, new value, 'added' | 'removed' | 'changed').
+    keys_filter is an extra condition with an {alias} placeholder for the row alias.
+    """
+    key, value = RESTORE_TABLES[table_name]
+    return f'''
+        SELECT o.{key}, o.{value}, n.{value}, CASE WHEN n.{key} IS NULL THEN 'removed' ELSE 'changed' END
+        FROM {old_schema}.{table_name} o
+        LEFT JOIN {new_schema}.{table_name} n ON n.{key} = o.{key}
+        WHERE (n.{key} IS NULL OR o.{value} IS NOT n.{value}){keys_filter.format(alias='o')}
+        UNION ALL
+        SELECT n.{key}, NULL, n.{value}, 'added' FROM {new_schema}.{table_name} n
+        WHERE NOT EXISTS (SELECT 1 FROM {old_schema}.{table_name} o WHERE o.{key} = n.{key}){keys_filter.format(alias='n')}
+        ORDER BY 1
+    '''
+
+def row_keys_filter(table_name, keys=None):
+    """(keys_filter, params) limiting row_diff_sql to the given row keys, or to all rows if keys is None"""
+    if keys is None:
+        return '', []
+    key, _ = RESTORE_TABLES[table_name]
+    # row_diff_sql uses the filter once per half of its UNION
+    return f' AND {{alias}}.{key} IN (SELECT value FROM json_each(?))', [json.dumps(list(keys))] * 2
+
+def restore_rows_from(source_path, tables, keys=None, annotator='restore'):
+    """Make live tables match the same tables in the SQLite file source_path, in one transaction
+
+    keys limits the restore to those row keys. Returns {table: rows changed}.
+    """
+    changes_by_table = {}
+    with get_db() as conn:
+        conn.execute('ATTACH DATABASE ? AS src', (source_path,))
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            version_before = get_data_version(conn)
+
+            for table_name in tables:
+                key, value = RESTORE_TABLES[table_name]
+                keys_filter, keys_params = row_keys_filter(table_name, keys)
+                changes = conn.execute(row_diff_sql(table_name, 'main', 'src', keys_filter), keys_params).fetchall()
+                changed_keys = json.dumps([row[0] for row in changes])
+
+                # Clear every differing row first so cards can move between annotations
+                conn.execute(f'DELETE FROM main.{table_name} WHERE {key} IN (SELECT value FROM json_each(?))',
+                             (changed_keys,))
+
+                # Copy the source rows with every column both schemas have
+                src_columns = {row[1] for row in conn.execute(f'PRAGMA src.table_info({table_name})')}
+                columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA main.table_info({table_name})')
+                                    if row[1] in src_columns)
+                try:
+                    conn.execute(f'''
+                        INSERT INTO main.{table_name} ({columns})
+                        SELECT {columns} FROM src.{table_name} WHERE {key} IN (SELECT value FROM json_each(?))
+                    ''', (changed_keys,))
+                except sqlite3.IntegrityError:
+                    conn.rollback()
+                    raise CardAlreadyMatchedError("Restoring these matches would give a card to two annotations")
+
+                if table_name in EVENT_FIELDS:
+                    _record_events(conn, EVENT_FIELDS[table_name], [(row[0], row[2]) for row in changes], annotator)
+                if table_name == 'matches':
+                    changes_by_table[table_name] = [(row[0], _parse_card_id(row[1]), _parse_card_id(row[2]))
+                                                    for row in changes]
+                else:
+                    changes_by_table[table_name] = [(row[0], row[1], row[2]) for row in changes]
+
+            version_after = get_data_version(conn)
+            conn.commit()
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute('DETACH DATABASE src')
+
+    # Every table shares one version range: listeners that see a second
+    # notification for it treat their state as stale and rebuild
+    for table_name, changes in changes_by_table.items():
+        if changes:
+            _notify_change(table_name, changes, version_before, version_after)
+
+    counts = {table_name: len(changes) for table_name, changes in changes_by_table.items()}
+    logger.info(f"Restored rows: {counts}")
+    return counts
+
+def _load_rows(conn, table_name, keys=None):
+    """Read {key: value} for a cached table, optionally only for the given keys"""
+    query = {
+        'matches': 'SELECT annot_id, card_id FROM matches',
+        'notes': 'SELECT annot_id, note_text FROM notes',
+        'invalid_cards': 'SELECT card_id, reason FROM invalid_cards',
+    }[table_name]
+    if keys is not None:
+        query += f" WHERE {LOGGED_TABLES[table_name]} IN ({', '.join('?' * len(keys))})"
+
+    cursor = conn.execute(query, list(keys or ()))
+    if table_name == 'matches':
+        return {row[0]: _parse_card_id(row[1]) for row in cursor}
+    return {row[0]: row[1] for row in cursor}
+
+def _refresh_cache():
+    """Bring the cache up to the current change version and return it
+
+    Only rows touched since the cached version are re-read; a full reload
+    happens on first use or when the needed change_log entries were pruned.
+    """
+    global _cache
+
+    with _cache_lock:
+        with get_db() as conn:
+            # One read transaction so version and rows come from the same snapshot
+            conn.execute('BEGIN')
+            try:
+                version = get_data_version(conn)
+                cached_version = _cache['version']
+                if version == cached_version:
+                    return _cache
+
+                changed = None
+                if cached_version is not None:
+                    first_seq = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+                    if first_seq is not None and first_seq <= cached_version + 1:
+                        changed = {}
+                        cursor = conn.execute('''
+                            SELECT DISTINCT table_name, row_key FROM change_log
+                            WHERE seq > ? AND seq <= ?
+                        ''', (cached_version, version))
+                        for table_name, row_key in cursor:
+                            changed.setdefault(table_name, set()).add(row_key)
+                        if sum(len(keys) for keys in changed.values()) > CACHE_MAX_DELTA_KEYS:
+                            changed = None
+
+                cache = {'version': version}
+                for table_name in ('matches', 'notes', 'invalid_cards'):
+                    if changed is None:
+                        cache[table_name] = _load_rows(conn, table_name)
+                    elif table_name not in changed:
+                        cache[table_name] = _cache[table_name]
+                    else:
+                        rows = dict(_cache[table_name])
+                        keys = list(changed[table_name])
+                        for key in keys:
+                            rows.pop(key, None)
+                        for chunk in _chunks(keys):
+                            rows.update(_load_rows(conn, table_name, chunk))
+                        cache[table_name] = rows
+
+                cache['matched_cards'] = _update_matched_cards(
+                    _cache, cache, None if changed is None else changed.get('matches', ()))
+
+                # Row versions change exactly when matches rows do
+                if changed is None:
+                    cache['match_versions'] = {row[0]: row[1] for row in
+                                               conn.execute('SELECT annot_id, version FROM match_versions')}
+                elif 'matches' not in changed:
+                    cache['match_versions'] = _cache['match_versions']
+                else:
+                    cache['match_versions'] = {**_cache['match_versions'],
+                                               **_match_versions(conn, changed['matches'])}
+            finally:
+                conn.rollback()
+
+        _cache = cache
+        return cache
+
+def _update_matched_cards(old_cache, new_cache, changed_keys):
+    """Maintain the card_id -> annot_id reverse map of matches
+
+    changed_keys None means rebuild from scratch, otherwise only the listed
+    annot_ids are re-mapped.
+    """
+    matches = new_cache['matches']
+    if changed_keys is None:
+        return {card_id: annot_id for annot_id, card_id in matches.items() if card_id != "no_match"}
+    if not changed_keys:
+        return old_cache['matched_cards']
+
+    matched_cards = dict(old_cache['matched_cards'])
+    old_matches = old_cache['matches']
+    for annot_id in changed_keys:
+        old_card_id = old_matches.get(annot_id)
+        if old_card_id is not None and matched_cards.get(old_card_id) == annot_id:
+            del matched_cards[old_card_id]
+    for annot_id in changed_keys:
+        card_id = matches.get(annot_id)
+        if card_id is not None and card_id != "no_match":
+            matched_cards[card_id] = annot_id
+    return matched_cards
+
+def get_snapshot():
+    """Get matches, matched cards, notes and invalid cards as of one change version
+
+    Returns {'version', 'matches', 'matched_cards', 'match_versions', 'notes',
+    'invalid_cards'}, with match_versions {annot_id: row version} (absent is 0),
+    all read in a single transaction on the thread's pooled connection, so they
+    agree with each other even while other workers write (shared cache, treat
+    as read-only). Separate get_all_* calls may each see a newer version.
+    """
+    return _refresh_cache()
+
+def get_all_matches():
+    """Get all matches as a dictionary (shared cache, treat as read-only)"""
+    return _refresh_cache()['matches']
+
+def get_matched_cards():
+    """Get {card_id: annot_id} for matched cards (shared cache, treat as read-only)"""
+    return _refresh_cache()['matched_cards']
 
-    return notes
+def get_all_notes():
+    """Get all notes as a dictionary (shared cache, treat as read-only)"""
+    return _refresh_cache()['notes']
 
 def migrate_from_json():
     """Migrate existing JSON data to database"""
@@ -226,31 +1007,180 @@ def backup_database():
 
     logger.info("Database backup created")
 
-def create_file_backup(backup_type='manual'):
-    """Create a physical file backup of the database"""
-    import shutil
+def create_file_backup(backup_type='manual', incremental=None):
+    """Create a compressed file backup of the database and record it in backup_catalog
+
+    Full backups are an online SQLite copy gzipped to {type}_{timestamp}.db.gz.
+    Incremental backups (the default for DELTA_BACKUP_TYPES) hold only the rows
+    changed since the latest full backup, as {type}_{timestamp}.json.gz, and
+    fall back to a full backup when there is no usable base.
+    Returns (filename, size in bytes).
+    """
+    if incremental is None:
+        incremental = backup_type in DELTA_BACKUP_TYPES
+
+    with _backup_lock:
+        backup_dir = get_backup_dir()
+        entry = _create_delta_backup(backup_dir, backup_type) if incremental else None
+        if entry is None:
+            entry = _create_full_backup(backup_dir, backup_type)
+
+        backup_path = os.path.join(backup_dir, entry['filename'])
+        entry.update(backup_type=backup_type,
+                     size=os.path.getsize(backup_path),
+                     checksum=file_sha256(backup_path),
+                     created_at=datetime.now().isoformat())
+        _catalog_backup(entry)
+
+        # Clean up old backups based on type
+        cleanup_old_backups(backup_dir, backup_type)
+
+    logger.info(f"File backup created: {entry['filename']}")
+    return entry['filename'], entry['size']
+
+def _backup_filename(backup_type, suffix):
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"{backup_type}_{timestamp}{suffix}"
+
+def file_sha256(path):
+    """Compute the SHA-256 of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _write_atomic(path, write):
+    """Call write(tmp_path) then move the result into place"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-    # Create backup directory if it doesn't exist
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    backup_dir = os.path.join(base_dir, 'database', 'backups')
+def _count_rows(conn):
+    """Row counts of the backed-up tables, as stored in the catalog"""
+    return {f'{table_name}_count': conn.execute(f'SELECT COUNT(*) FROM {table_name}').fetchone()[0]
+            for table_name in ('matches', 'notes', 'invalid_cards')}
 
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
+def _catalog_backup(entry):
+    """Insert or replace a backup_catalog row"""
+    columns = [column for column in BACKUP_CATALOG_COLUMNS if column in entry]
+    with get_db() as conn:
+        conn.execute(f'''
+            INSERT OR REPLACE INTO backup_catalog ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', [entry[column] for column in columns])
+        conn.commit()
 
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f"{backup_type}_{timestamp}.db"
+def get_latest_full_backup():
+    """Get the catalog entry of the newest full backup that incremental backups can build on"""
+    with get_db() as conn:
+        row = conn.execute('''
+            SELECT * FROM backup_catalog
+            WHERE kind = 'full' AND change_seq IS NOT NULL
+            ORDER BY created_at DESC, rowid DESC LIMIT 1
+        ''').fetchone()
+    if row is None or not os.path.exists(os.path.join(get_backup_dir(), row['filename'])):
+        return None
+    return dict(row)
+
+def _create_full_backup(backup_dir, backup_type):
+    """Copy the live database page by page, then gzip the copy"""
+    backup_filename = _backup_filename(backup_type, '.db.gz')
     backup_path = os.path.join(backup_dir, backup_filename)
+    copy_path = f'{backup_path}.{os.getpid()}.copy'
 
-    # Copy the database file
-    source_db = get_db_path()
-    shutil.copy2(source_db, backup_path)
+    try:
+        # Copy through SQLite so pages still in the WAL are included. Stepping
+        # a few pages at a time lets writers commit in between; SQLite restarts
+        # the copy if another connection changes pages already copied.
+        with get_db() as conn:
+            target = sqlite3.connect(copy_path)
+            try:
+                conn.backup(target, pages=BACKUP_PAGES_PER_STEP)
+                # Standalone file: no -wal/-shm needed when it is restored
+                target.execute('PRAGMA journal_mode=DELETE')
+                entry = {'filename': backup_filename, 'kind': 'full',
+                         'change_seq': get_data_version(target), **_count_rows(target)}
+            finally:
+                target.close()
+
+        def compress(tmp_path):
+            with open(copy_path, 'rb') as source, \
+                    gzip.open(tmp_path, 'wb', compresslevel=BACKUP_COMPRESSLEVEL) as dest:
+                shutil.copyfileobj(source, dest, 1 << 20)
+
+        _write_atomic(backup_path, compress)
+    finally:
+        if os.path.exists(copy_path):
+            os.remove(copy_path)
 
-    # Clean up old backups based on type
-    cleanup_old_backups(backup_dir, backup_type)
+    return entry
 
-    logger.info(f"File backup created: {backup_filename}")
-    return backup_filename, os.path.getsize(backup_path)
+def _create_delta_backup(backup_dir, backup_type):
+    """Write the rows changed since the latest full backup, or return None if a full backup is needed"""
+    base = get_latest_full_backup()
+    if base is None:
+        return None
+
+    with get_db() as conn:
+        # One read transaction so the change range and row values agree
+        conn.execute('BEGIN')
+        try:
+            change_seq = get_data_version(conn)
+            if change_seq < base['change_seq']:
+                return None  # Database was replaced since the base was taken
+
+            first_seq = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+            if change_seq > base['change_seq'] and (first_seq is None or first_seq > base['change_seq'] + 1):
+                return None  # Needed change_log entries were pruned
+
+            changed = {}
+            cursor = conn.execute('''
+                SELECT DISTINCT table_name, row_key FROM change_log
+                WHERE seq > ? AND seq <= ?
+            ''', (base['change_seq'], change_seq))
+            for table_name, row_key in cursor:
+                changed.setdefault(table_name, set()).add(row_key)
+
+            # Current value of every changed row that still exists, and the keys of deleted rows
+            tables = {}
+            for table_name, keys in changed.items():
+                keys = sorted(keys)
+                rows = {}
+                for chunk in _chunks(keys):
+                    rows.update(_load_rows(conn, table_name, chunk))
+                tables[table_name] = {
+                    'rows': [[key, rows[key]] for key in keys if key in rows],
+                    'deleted': [key for key in keys if key not in rows],
+                }
+
+            row_counts = _count_rows(conn)
+        finally:
+            conn.rollback()
+
+    delta = {
+        'format': DELTA_BACKUP_FORMAT,
+        'base': base['filename'],
+        'base_change_seq': base['change_seq'],
+        'change_seq': change_seq,
+        'created': datetime.now().isoformat(),
+        'tables': tables,
+    }
+
+    backup_filename = _backup_filename(backup_type, '.json.gz')
+
+    def write(tmp_path):
+        with gzip.open(tmp_path, 'wt', compresslevel=BACKUP_COMPRESSLEVEL) as f:
+            json.dump(delta, f)
+
+    _write_atomic(os.path.join(backup_dir, backup_filename), write)
+
+    return {'filename': backup_filename, 'kind': 'delta', 'change_seq': change_seq,
+            'base_filename': base['filename'], **row_counts}
 
 def cleanup_old_backups(backup_dir, backup_type):
     """Remove old backups keeping only recent ones based on type"""
@@ -264,60 +1194,145 @@ def cleanup_old_backups(backup_dir, backup_type):
 
     max_files = retention_policies.get(backup_type, 10)
 
-    # Get all backup files of this type
-    pattern = f"{backup_type}_*.db"
-    backups = []
-    for filename in os.listdir(backup_dir):
-        if filename.startswith(f"{backup_type}_") and filename.endswith('.db'):
-            filepath = os.path.join(backup_dir, filename)
-            backups.append((filepath, os.path.getmtime(filepath)))
+    # The latest full backup is the base of incremental backups, never remove it
+    latest = get_latest_full_backup()
+    keep = latest['filename'] if latest else None
 
-    # Sort by modification time (newest first)
-    backups.sort(key=lambda x: x[1], reverse=True)
+    with get_db() as conn:
+        expired = [row[0] for row in conn.execute('''
+            SELECT filename FROM backup_catalog
+            WHERE backup_type = ? AND filename IS NOT ?
+            ORDER BY created_at DESC, rowid DESC
+            LIMIT -1 OFFSET ?
+        ''', (backup_type, keep, max_files))]
 
     # Remove old backups
-    for filepath, _ in backups[max_files:]:
+    for filename in expired:
+        delete_backup(filename)
+        logger.info(f"Removed old backup: {filename}")
+
+def delete_backup(filename):
+    """Remove a backup file and its backup_catalog row (either may already be gone)"""
+    filepath = os.path.join(get_backup_dir(), os.path.basename(filename))
+    if os.path.exists(filepath):
         os.remove(filepath)
-        logger.info(f"Removed old backup: {os.path.basename(filepath)}")
-
-def get_backup_info():
-    """Get information about existing backups"""
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    backup_dir = os.path.join(base_dir, 'database', 'backups')
+    with get_db() as conn:
+        conn.execute('DELETE FROM backup_catalog WHERE filename = ?', (filename,))
+        conn.commit()
 
-    if not os.path.exists(backup_dir):
-        return {'backups': [], 'total_size': 0, 'last_backup': None}
+def catalog_existing_backups():
+    """Add backup files missing from backup_catalog (one directory scan, e.g. after upgrading)"""
+    backup_dir = get_backup_dir()
+    with get_db() as conn:
+        known = {row[0] for row in conn.execute('SELECT filename FROM backup_catalog')}
 
-    backups = []
-    total_size = 0
-    last_backup = None
+    # Change sequence of the latest full backup, as recorded before the catalog existed
+    latest = {}
+    manifest_path = os.path.join(backup_dir, 'latest_full.json')
+    try:
+        with open(manifest_path, 'r') as f:
+            latest = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    added = 0
+    for filename in sorted(os.listdir(backup_dir)):
+        if filename in known or not filename.endswith(BACKUP_SUFFIXES):
+            continue
+
+        filepath = os.path.join(backup_dir, filename)
+        entry = {
+            'filename': filename,
+            'backup_type': filename.split('_', 1)[0],
+            'kind': 'delta' if filename.endswith('.json.gz') else 'full',
+            'size': os.path.getsize(filepath),
+            'checksum': file_sha256(filepath),
+            'created_at': datetime.fromtimestamp(os.path.getmtime(filepath)).isoformat(),
+        }
+        if filename == latest.get('filename'):
+            entry['change_seq'] = latest.get('change_seq')
+        if entry['kind'] == 'delta':
+            try:
+                with gzip.open(filepath, 'rt') as f:
+                    delta = json.load(f)
+                entry['change_seq'] = delta.get('change_seq')
+                entry['base_filename'] = delta.get('base')
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read delta backup {filename}: {e}")
+
+        _catalog_backup(entry)
+        added += 1
+
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    if added:
+        logger.info(f"Added {added} existing backup files to the catalog")
+    return added
+
+def get_backup_catalog(backup_type=None, kind=None, limit=50):
+    """Get catalog entries newest first, optionally filtered, e.g. to pick a backup to restore"""
+    query = 'SELECT * FROM backup_catalog WHERE 1 = 1'
+    params = []
+    if backup_type:
+        query += ' AND backup_type = ?'
+        params.append(backup_type)
+    if kind:
+        query += ' AND kind = ?'
+        params.append(kind)
+    query += ' ORDER BY created_at DESC, rowid DESC LIMIT ?'
+    params.append(limit)
 
-    for filename in os.listdir(backup_dir):
-        if filename.endswith('.db'):
-            filepath = os.path.join(backup_dir, filename)
-            file_stats = os.stat(filepath)
-            backup_time = datetime.fromtimestamp(file_stats.st_mtime)
+    with get_db() as conn:
+        return [dict(row) for row in conn.execute(query, params)]
 
-            backups.append({
-                'filename': filename,
-                'size': file_stats.st_size,
-                'created': backup_time.isoformat(),
-                'age': (datetime.now() - backup_time).total_seconds()
-            })
+def verify_backup(filename):
+    """Check a backup file against the size and checksum recorded in the catalog"""
+    with get_db() as conn:
+        row = conn.execute('SELECT size, checksum FROM backup_catalog WHERE filename = ?', (filename,)).fetchone()
+    if row is None:
+        return {'filename': filename, 'ok': False, 'error': 'Not in backup catalog'}
 
-            total_size += file_stats.st_size
+    filepath = os.path.join(get_backup_dir(), filename)
+    if not os.path.exists(filepath):
+        return {'filename': filename, 'ok': False, 'error': 'Backup file is missing'}
 
-            if last_backup is None or backup_time > last_backup:
-                last_backup = backup_time
+    size = os.path.getsize(filepath)
+    checksum = file_sha256(filepath) if size == row['size'] else None
+    ok = checksum == row['checksum']
+    return {
+        'filename': filename,
+        'ok': ok,
+        'error': None if ok else ('Size mismatch' if checksum is None else 'Checksum mismatch'),
+        'size': size,
+        'checksum': checksum,
+    }
 
-    # Sort by creation time (newest first)
-    backups.sort(key=lambda x: x['created'], reverse=True)
+def get_backup_info():
+    """Get information about existing backups"""
+    with get_db() as conn:
+        summary = conn.execute('SELECT COALESCE(SUM(size), 0), MAX(created_at) FROM backup_catalog').fetchone()
+        rows = conn.execute('''
+            SELECT filename, kind, size, created_at FROM backup_catalog
+            ORDER BY created_at DESC, rowid DESC LIMIT 10
+        ''').fetchall()
+
+    now = datetime.now()
+    backups = [{
+        'filename': row['filename'],
+        'kind': row['kind'],
+        'size': row['size'],
+        'created': row['created_at'],
+        'age': (now - datetime.fromisoformat(row['created_at'])).total_seconds()
+    } for row in rows]
+
+    total_size, last_backup = summary
+    last_backup = datetime.fromisoformat(last_backup) if last_backup else None
 
     return {
-        'backups': backups[:10],  # Return only last 10
+        'backups': backups,  # Return only last 10
         'total_size': total_size,
         'last_backup': last_backup.isoformat() if last_backup else None,
-        'last_backup_age': (datetime.now() - last_backup).total_seconds() if last_backup else None
+        'last_backup_age': (now - last_backup).total_seconds() if last_backup else None
     }
 
 def get_stats():
@@ -339,8 +1354,9 @@ def mark_card_invalid(card_id, reason=''):
     """Mark a card as invalid/duplicate"""
     with get_db() as conn:
         conn.execute('''
-            INSERT OR REPLACE INTO invalid_cards (card_id, reason)
+            INSERT INTO invalid_cards (card_id, reason)
             VALUES (?, ?)
+            ON CONFLICT (card_id) DO UPDATE SET reason = excluded.reason
         ''', (card_id, reason))
         conn.commit()
         logger.info(f"Marked card as invalid: card_id={card_id}, reason={reason}")
@@ -353,13 +1369,8 @@ def unmark_card_invalid(card_id):
         logger.info(f"Unmarked card as invalid: card_id={card_id}")
 
 def get_all_invalid_cards():
-    """Get all invalid cards as a dictionary"""
-    invalid_cards = {}
-    with get_db() as conn:
-        cursor = conn.execute('SELECT card_id, reason FROM invalid_cards')
-        for row in cursor:
-            invalid_cards[row['card_id']] = row['reason']
-    return invalid_cards
+    """Get all invalid cards as a dictionary (shared cache, treat as read-only)"""
+    return _refresh_cache()['invalid_cards']
 
 def is_card_invalid(card_id):
     """Check if a card is marked as invalid"""
@@ -367,6 +1378,68 @@ def is_card_invalid(card_id):
         result = conn.execute('SELECT 1 FROM invalid_cards WHERE card_id = ?', (card_id,)).fetchone()
         return result is not None
 
+def save_card_hashes(rows):
+    """Store perceptual hashes as [(card_id, location, phash, dhash)] with hex hash strings"""
+    with get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        # Every save gets a new revision, so get_card_hashes_version always changes
+        revision = conn.execute('SELECT COALESCE(MAX(revision), 0) + 1 FROM card_hashes').fetchone()[0]
+        conn.executemany('''
+            INSERT INTO card_hashes (card_id, location, phash, dhash, revision)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (card_id) DO UPDATE SET
+                location = excluded.location, phash = excluded.phash,
+                dhash = excluded.dhash, computed_at = CURRENT_TIMESTAMP, revision = excluded.revision
+        ''', [(*row, revision) for row in rows])
+        conn.commit()
+
+def get_card_hashes():
+    """Get {card_id: {'location', 'phash', 'dhash'}} for all hashed cards"""
+    with get_db() as conn:
+        rows = conn.execute('SELECT card_id, location, phash, dhash FROM card_hashes').fetchall()
+        return {row['card_id']: {'location': row['location'], 'phash': row['phash'], 'dhash': row['dhash']}
+                for row in rows}
+
+def get_card_hashes_version():
+    """Changes whenever card hashes are added or recomputed"""
+    with get_db() as conn:
+        return tuple(conn.execute('SELECT COUNT(*), MAX(revision) FROM card_hashes').fetchone())
+
+def replace_match_proposals(proposals):
+    """Replace all staged proposals with [{'annot_id', 'card_id', 'api', 'pad_num', 'score', 'confidence'}]"""
+    with get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM match_proposals')
+        conn.executemany('''
+            INSERT INTO match_proposals (annot_id, card_id, api, pad_num, score, confidence)
+            VALUES (:annot_id, :card_id, :api, :pad_num, :score, :confidence)
+        ''', proposals)
+        conn.commit()
+
+def get_match_proposals(api_name=None, pad_num=None):
+    """Get staged proposals, optionally for one API and/or PAD#, ordered by PAD# and annot_id"""
+    query = 'SELECT annot_id, card_id, api, pad_num, score, confidence, created_at FROM match_proposals WHERE 1 = 1'
+    params = []
+    if api_name is not None:
+        query += ' AND api = ?'
+        params.append(api_name)
+    if pad_num is not None:
+        query += ' AND pad_num = ?'
+        params.append(pad_num)
+    query += ' ORDER BY pad_num, annot_id'
+
+    with get_db() as conn:
+        return [dict(row) for row in conn.execute(query, params)]
+
+def delete_match_proposals(annot_ids):
+    """Remove the staged proposals for these annot_ids"""
+    annot_ids = [int(annot_id) for annot_id in annot_ids]
+    with get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        for chunk in _chunks(annot_ids):
+            conn.execute(f'DELETE FROM match_proposals WHERE annot_id IN ({", ".join("?" * len(chunk))})', chunk)
+        conn.commit()
+
 # Initialize database when module is imported
 init_db()
 
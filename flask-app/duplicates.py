@@ -0,0 +1,163 @@
+"""
+Near-duplicate detection for project card images
+Every card image gets two 64-bit perceptual hashes, stored in card_hashes:
+a pHash (low frequencies of the DCT of a 32x32 grayscale copy) and a dHash
+(brightness gradients of a 9x8 copy). Cards whose pHashes are within a small
+Hamming distance are found by multi-index hashing, without comparing every
+pair, and kept as suggestions only if their dHashes are close as well.
+"""
+
+import io
+import threading
+import logging
+
+import numpy as np
+from PIL import Image, ImageOps
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Images closer than this (bits out of 64) are suggested as duplicates
+MAX_PHASH_DISTANCE = 4
+MAX_DHASH_DISTANCE = 8
+
+PHASH_IMAGE_SIZE = 32
+HASH_SIZE = 8
+
+def _dct_matrix(n):
+    """Orthogonal DCT-II matrix, so dct(X) = D @ X @ D.T"""
+    k = np.arange(n)[:, np.newaxis]
+    i = np.arange(n)[np.newaxis, :]
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+_DCT = _dct_matrix(PHASH_IMAGE_SIZE)
+
+class HashError(Exception):
+    """Raised when an image cannot be decoded for hashing"""
+
+_suggestions_lock = threading.Lock()
+_suggestions = (None, {})  # (card_hashes version, {card_id: [(other card_id, distance), ...]})
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+def phash(image):
+    """64-bit DCT perceptual hash of a PIL image"""
+    gray = image.convert('L').resize((PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term is overall brightness and would dominate the median
+    median = np.median(low.flatten()[1:])
+    return _bits_to_int(low > median)
+
+def dhash(image):
+    """64-bit difference hash of a PIL image"""
+    gray = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def hash_image(data):
+    """(phash, dhash) of image bytes as 16-digit hex strings"""
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            # JPEG sources decode straight at a reduced scale
+            source.draft('L', (PHASH_IMAGE_SIZE * 4, PHASH_IMAGE_SIZE * 4))
+            image = ImageOps.exif_transpose(source)
+            return f'{phash(image):016x}', f'{dhash(image):016x}'
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise HashError(f"Cannot hash image: {e}")
+
+def hamming(a, b):
+    """Number of differing bits between two integer hashes"""
+    return (a ^ b).bit_count()
+
+class MultiIndexHash:
+    """Exact Hamming-radius search over 64-bit hashes by multi-index hashing
+
+    The bits are split into max_distance + 1 chunks. Two hashes within
+    max_distance of each other differ in at most max_distance chunks, so they
+    are equal in at least one: only hashes sharing a chunk value are compared.
+    """
+
+    def __init__(self, max_distance, bits=64):
+        self.max_distance = max_distance
+        chunks = min(max_distance + 1, bits)
+        bounds = [bits * i // chunks for i in range(chunks + 1)]
+        self.chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self.tables = [{} for _ in self.chunks]
+        self.values = []  # (hash, item) by entry number
+
+    def add(self, value, item):
+        entry = len(self.values)
+        self.values.append((value, item))
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table.setdefault((value >> shift) & mask, []).append(entry)
+
+    def search(self, value):
+        """All (distance, item) within max_distance of value"""
+        candidates = set()
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            candidates.update(table.get((value >> shift) & mask, ()))
+
+        results = []
+        for entry in candidates:
+            other, item = self.values[entry]
+            distance = hamming(value, other)
+            if distance <= self.max_distance:
+                results.append((distance, item))
+        return results
+
+def find_similar(hashes, max_phash_distance=MAX_PHASH_DISTANCE, max_dhash_distance=MAX_DHASH_DISTANCE):
+    """Near-duplicates among {card_id: {'phash', 'dhash'}}
+
+    Returns {card_id: [(other card_id, phash distance), ...]} sorted by distance,
+    for cards that have at least one.
+    """
+    parsed = {card_id: (int(row['phash'], 16), int(row['dhash'], 16)) for card_id, row in hashes.items()}
+
+    index = MultiIndexHash(max_phash_distance)
+    for card_id, (phash_value, _) in parsed.items():
+        index.add(phash_value, card_id)
+
+    similar = {}
+    for card_id, (phash_value, dhash_value) in parsed.items():
+        matches = [(other_id, distance) for distance, other_id in index.search(phash_value)
+                   if other_id != card_id and hamming(dhash_value, parsed[other_id][1]) <= max_dhash_distance]
+        if matches:
+            similar[card_id] = sorted(matches, key=lambda match: (match[1], match[0]))
+    return similar
+
+def group_similar(similar):
+    """Connected groups of similar cards, each sorted, largest groups first"""
+    groups = []
+    seen = set()
+    for card_id in sorted(similar):
+        if card_id in seen:
+            continue
+        group = set()
+        stack = [card_id]
+        while stack:
+            current = stack.pop()
+            if current in group:
+                continue
+            group.add(current)
+            stack.extend(other_id for other_id, _ in similar.get(current, ()))
+        seen |= group
+        groups.append(sorted(group))
+    groups.sort(key=lambda group: (-len(group), group[0]))
+    return groups
+
+def get_suggestions():
+    """Suggested duplicates for the stored hashes, recomputed only when they change"""
+    global _suggestions
+
+    with _suggestions_lock:
+        version = database.get_card_hashes_version()
+        if _suggestions[0] != version:
+            similar = find_similar(database.get_card_hashes())
+            _suggestions = (version, similar)
+            logger.info(f"Found {len(similar)} cards with suggested duplicates among {version[0]} hashed cards")
+        return _suggestions[1]
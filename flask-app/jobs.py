@@ -0,0 +1,231 @@
+"""
+Background jobs for ChemoPAD Annotation Matcher
+Slow side effects (backups, file exports) are queued in the SQLite jobs table
+and run by a small thread pool in each process, so requests return immediately.
+Jobs with the same coalesce key share one queued run, and a delay debounces
+bursts: ten PAD completions within the auto-backup delay produce a single backup.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Threads running jobs in each process
+JOB_WORKERS = 2
+
+# How often the dispatcher looks for jobs queued by other processes (seconds)
+POLL_INTERVAL = 2.0
+
+# Keep this many finished jobs for the status endpoints
+JOB_RETENTION = 500
+
+# Jobs kept scheduled once a dispatcher runs: {job_type: seconds between runs}
+PERIODIC_JOBS = {'compact_events': 24 * 3600}
+
+_handlers = {}  # {job_type: func}
+
+_dispatcher_lock = threading.Lock()
+_dispatcher_pid = None  # Process the dispatcher thread was started in
+_wakeup = threading.Event()
+_executor = None
+
+def register(job_type, func):
+    """Register func(*args) as the handler for job_type; its return value is stored as the job result"""
+    _handlers[job_type] = func
+
+def enqueue(job_type, *args, coalesce_key=None, delay=0):
+    """Queue a job and return its id
+
+    If a job with the same coalesce_key is still waiting to start, no new job
+    is added and the waiting job's id is returned instead. delay postpones the
+    start by that many seconds so later requests can coalesce into it.
+    """
+    if job_type not in _handlers:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    with database.get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        if coalesce_key is not None:
+            row = conn.execute('''
+                SELECT id FROM jobs WHERE coalesce_key = ? AND status = 'queued'
+                ORDER BY id LIMIT 1
+            ''', (coalesce_key,)).fetchone()
+            if row:
+                conn.commit()
+                logger.info(f"Coalesced {job_type} job into job {row['id']}")
+                return row['id']
+
+        job_id = conn.execute('''
+            INSERT INTO jobs (job_type, args, coalesce_key, run_after)
+            VALUES (?, ?, ?, ?)
+        ''', (job_type, json.dumps(args), coalesce_key, time.time() + delay)).lastrowid
+        conn.commit()
+
+    logger.info(f"Queued {job_type} job {job_id}")
+    start()
+    _wakeup.set()
+    return job_id
+
+def start():
+    """Start this process's dispatcher thread if it is not running (safe to call repeatedly)"""
+    global _dispatcher_pid, _executor
+
+    if _dispatcher_pid == os.getpid():
+        return
+
+    with _dispatcher_lock:
+        # Threads do not survive fork, so each gunicorn worker starts its own
+        if _dispatcher_pid == os.getpid():
+            return
+        _dispatcher_pid = os.getpid()
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        _fail_orphaned_jobs()
+        threading.Thread(target=_dispatch_loop, name='job-dispatcher', daemon=True).start()
+
+    # Coalescing keeps one queued run per periodic job across all processes
+    for job_type in PERIODIC_JOBS:
+        _schedule_periodic(job_type)
+
+def _schedule_periodic(job_type):
+    enqueue(job_type, coalesce_key=job_type, delay=PERIODIC_JOBS[job_type])
+
+def _dispatch_loop():
+    """Claim due jobs and hand them to the thread pool"""
+    while True:
+        _wakeup.clear()
+        timeout = POLL_INTERVAL
+        try:
+            job = _claim_next_job()
+            while job is not None:
+                _executor.submit(_run_job, job)
+                job = _claim_next_job()
+            next_run = _next_run_after()
+            if next_run is not None:
+                timeout = min(POLL_INTERVAL, max(next_run - time.time(), 0.05))
+        except Exception as e:
+            logger.error(f"Job dispatcher error: {e}")
+        _wakeup.wait(timeout)
+
+def _claim_next_job():
+    """Mark the oldest due job as running in this process and return it
+
+    An empty queue is seen with a plain read, so idle workers never take the
+    write lock that match saves need.
+    """
+    with database.get_db() as conn:
+        while True:
+            row = conn.execute('''
+                SELECT id, job_type, args FROM jobs
+                WHERE status = 'queued' AND run_after <= ?
+                ORDER BY run_after, id LIMIT 1
+            ''', (time.time(),)).fetchone()
+            if row is None:
+                return None
+
+            # Handlers are registered at import, so any process can run any job;
+            # the status guard keeps two processes from taking the same one
+            claimed = conn.execute('''
+                UPDATE jobs SET status = 'running', pid = ?, started_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'queued'
+            ''', (os.getpid(), row['id'])).rowcount
+            conn.commit()
+            if claimed:
+                return dict(row)
+
+def _next_run_after():
+    with database.get_db() as conn:
+        return conn.execute("SELECT MIN(run_after) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+def _run_job(job):
+    """Run one claimed job and record its outcome"""
+    status, result, error = 'done', None, None
+    start_time = time.perf_counter()
+    try:
+        handler = _handlers[job['job_type']]
+        result = json.dumps(handler(*json.loads(job['args'])))
+    except Exception as e:
+        status, error = 'failed', str(e)
+        logger.error(f"Job {job['id']} ({job['job_type']}) failed: {e}")
+
+    with database.get_db() as conn:
+        conn.execute('''
+            UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, result, error, job['id']))
+        conn.execute('''
+            DELETE FROM jobs
+            WHERE status IN ('done', 'failed') AND id <= (SELECT MAX(id) FROM jobs) - ?
+        ''', (JOB_RETENTION,))
+        conn.commit()
+
+    logger.info(f"Job {job['id']} ({job['job_type']}) {status} in {time.perf_counter() - start_time:.2f}s")
+
+    if job['job_type'] in PERIODIC_JOBS:
+        _schedule_periodic(job['job_type'])
+
+def _fail_orphaned_jobs():
+    """Mark jobs left running by processes that no longer exist as failed"""
+    with database.get_db() as conn:
+        rows = conn.execute("SELECT id, pid FROM jobs WHERE status = 'running'").fetchall()
+        orphaned = [row['id'] for row in rows if not _pid_alive(row['pid'])]
+        conn.executemany('''
+            UPDATE jobs SET status = 'failed', error = 'worker process exited', finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', [(job_id,) for job_id in orphaned])
+        conn.commit()
+
+    if orphaned:
+        logger.warning(f"Marked {len(orphaned)} orphaned jobs as failed")
+
+def _pid_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _job_dict(row):
+    job = dict(row)
+    job['args'] = json.loads(job['args'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def get_job(job_id):
+    """Get one job as a dictionary, or None"""
+    with database.get_db() as conn:
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+def get_jobs(status=None, limit=50):
+    """Get the most recent jobs, newest first, optionally only those with one status"""
+    with database.get_db() as conn:
+        if status:
+            rows = conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?',
+                                (status, limit)).fetchall()
+        else:
+            rows = conn.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [_job_dict(row) for row in rows]
+
+def backup_job(backup_type):
+    """Job handler: create a file backup"""
+    filename, size = database.create_file_backup(backup_type)
+    return {'filename': filename, 'size': size}
+
+register('backup', backup_job)
+
+def compact_events_job():
+    """Job handler: drop superseded match events past their retention"""
+    return {'removed': database.compact_match_events()}
+
+register('compact_events', compact_events_job)
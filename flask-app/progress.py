@@ -0,0 +1,163 @@
+"""
+Progress tracking for ChemoPAD Annotation Matcher
+Keeps matched / no-match / note counts per API and per (API, PAD#) in memory,
+updated by delta on every save instead of recomputed on every page view
+"""
+
+import threading
+import logging
+
+import database
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+
+_pad_index = {}  # {(API, PAD#): array of annot_ids}
+_annot_pads = {}  # {annot_id: (API, PAD#)}
+_pad_counts = {}  # {(API, PAD#): {'total', 'matched', 'no_match', 'notes'}}
+_api_counts = {}  # {API: {'total_pads', 'completed_pads'}}
+_pad_num_counts = {}  # {PAD#: {'groups', 'completed_groups'}} across all APIs
+_totals = {'matches': 0, 'notes': 0, 'completed_pads': 0}  # Match/note rows in the database, indexed or not
+_version = None  # change_log version the counts reflect, None means stale
+
+def configure(pad_index):
+    """Set the (API, PAD#) index to track and build counts from the database"""
+    global _pad_index, _annot_pads
+
+    with _lock:
+        _pad_index = pad_index
+        _annot_pads = {int(annot_id): key for key, annot_ids in pad_index.items() for annot_id in annot_ids}
+        database.add_change_listener(_on_change)
+        rebuild()
+
+def rebuild(snapshot=None):
+    """Recompute all counts from SQLite, or from a database.get_snapshot() already taken"""
+    global _pad_counts, _api_counts, _pad_num_counts, _version
+
+    with _lock:
+        # Version, matches and notes from one snapshot, so the counts describe exactly that version
+        if snapshot is None:
+            snapshot = database.get_snapshot()
+        version = snapshot['version']
+        matches = snapshot['matches']
+        notes = snapshot['notes']
+
+        _pad_counts = {}
+        _api_counts = {}
+        _pad_num_counts = {}
+        for (api, pad), annot_ids in _pad_index.items():
+            counts = {'total': len(annot_ids), 'matched': 0, 'no_match': 0, 'notes': 0}
+            for annot_id in annot_ids:
+                card_id = matches.get(annot_id)
+                if card_id == "no_match":
+                    counts['no_match'] += 1
+                elif card_id is not None:
+                    counts['matched'] += 1
+                if annot_id in notes:
+                    counts['notes'] += 1
+            _pad_counts[(api, pad)] = counts
+
+            complete = _is_complete(counts)
+            api_counts = _api_counts.setdefault(api, {'total_pads': 0, 'completed_pads': 0})
+            api_counts['total_pads'] += 1
+            api_counts['completed_pads'] += complete
+            pad_num_counts = _pad_num_counts.setdefault(pad, {'groups': 0, 'completed_groups': 0})
+            pad_num_counts['groups'] += 1
+            pad_num_counts['completed_groups'] += complete
+
+        _totals['matches'] = len(matches)
+        _totals['notes'] = len(notes)
+        _totals['completed_pads'] = sum(1 for counts in _pad_num_counts.values()
+                                        if counts['completed_groups'] == counts['groups'])
+        _version = version
+
+    logger.info(f"Rebuilt progress counts at version {version}")
+
+def refresh(snapshot=None):
+    """Rebuild counts if the database changed outside this process
+
+    With a snapshot (database.get_snapshot()), the counts are brought to its
+    version, so they agree with the rest of the request that took it.
+    """
+    with _lock:
+        version = database.get_data_version() if snapshot is None else snapshot['version']
+        if _version is None or version != _version:
+            rebuild(snapshot)
+
+def _is_complete(counts):
+    return counts['matched'] + counts['no_match'] == counts['total']
+
+def _on_change(table_name, changes, version_before, version_after):
+    """Apply a committed write from database.save_match / save_note"""
+    global _version
+
+    with _lock:
+        if _version != version_before:
+            # Someone else wrote since our last sync, deltas would be wrong
+            _version = None
+            return
+
+        for annot_id, old_value, new_value in changes:
+            if table_name == 'matches':
+                _apply_match(annot_id, old_value, new_value)
+            elif table_name == 'notes':
+                _apply_note(annot_id, old_value, new_value)
+        _version = version_after
+
+def _match_state(card_id):
+    if card_id is None:
+        return None
+    return 'no_match' if card_id == "no_match" else 'matched'
+
+def _apply_match(annot_id, old_card_id, new_card_id):
+    old_state = _match_state(old_card_id)
+    new_state = _match_state(new_card_id)
+    _totals['matches'] += (new_state is not None) - (old_state is not None)
+    if old_state == new_state or annot_id not in _annot_pads:
+        return
+
+    key = _annot_pads[annot_id]
+    counts = _pad_counts[key]
+    was_complete = _is_complete(counts)
+    if old_state:
+        counts[old_state] -= 1
+    if new_state:
+        counts[new_state] += 1
+    delta = _is_complete(counts) - was_complete
+
+    if delta:
+        api, pad = key
+        _api_counts[api]['completed_pads'] += delta
+        pad_num_counts = _pad_num_counts[pad]
+        was_pad_complete = pad_num_counts['completed_groups'] == pad_num_counts['groups']
+        pad_num_counts['completed_groups'] += delta
+        is_pad_complete = pad_num_counts['completed_groups'] == pad_num_counts['groups']
+        _totals['completed_pads'] += is_pad_complete - was_pad_complete
+
+def _apply_note(annot_id, old_note, new_note):
+    delta = (new_note is not None) - (old_note is not None)
+    _totals['notes'] += delta
+    if delta and annot_id in _annot_pads:
+        _pad_counts[_annot_pads[annot_id]]['notes'] += delta
+
+def get_api_progress(api_name):
+    """Get total and completed PAD# counts for one API"""
+    with _lock:
+        return dict(_api_counts.get(api_name, {'total_pads': 0, 'completed_pads': 0}))
+
+def get_pad_progress(api_name, pad_num):
+    """Get row, matched, no-match and note counts for one (API, PAD#)"""
+    with _lock:
+        counts = _pad_counts.get((api_name, pad_num), {'total': 0, 'matched': 0, 'no_match': 0, 'notes': 0})
+        return dict(counts, complete=_is_complete(counts))
+
+def get_totals():
+    """Get overall match, note and PAD# completion counts"""
+    with _lock:
+        return {
+            'matches': _totals['matches'],
+            'notes': _totals['notes'],
+            'total_pads': len(_pad_num_counts),
+            'completed_pads': _totals['completed_pads']
+        }
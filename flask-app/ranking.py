@@ -0,0 +1,137 @@
+"""
+Candidate ranking for ChemoPAD Annotation Matcher
+Scores every project card of a PAD# against every annotation row of that PAD#
+in one NumPy pass, from the camera, API / sample name, deleted status,
+creation date and whether the card is already used, so the most likely card
+is shown first. Per-row scores become confidences with a softmax.
+"""
+
+import re
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Score contributions; a card's score for a row is their sum
+WEIGHTS = {
+    'camera': 4.0,            # Camera matches camera_type_1 (ipad / iPad, pixel / Google Pixel 3a, ...)
+    'camera_mismatch': -4.0,  # Both known and different
+    'api': 2.0,               # sample_name is the annotation's API
+    'api_base': 1.0,          # Only the drug name before "(" agrees, e.g. Cisplatin / Cisplatin (x)
+    'deleted': -2.0,
+    'session': 2.0,           # Created close to the cards already matched for this PAD#
+    'used': -8.0,             # Matched to another annotation row
+}
+
+# Cards of one PAD# are photographed in one session; the session score halves every SESSION_HALF_LIFE
+SESSION_HALF_LIFE = 10 * 60  # seconds
+
+# Annotation camera names are lowercase keywords of the card camera names
+CAMERA_KEYWORDS = re.compile(r'(ipad|pixel|nokia)')
+
+_pads = {}  # {sample_id: {'ids', 'camera', 'api', 'api_base', 'deleted', 'created'}} in candidate order
+_positions = {}  # {card_id: (sample_id, position in that PAD's arrays)}
+_rows = {}  # {annot_id: (camera key, API key, API base key)}
+
+def camera_key(names):
+    """Comparable camera keys for a Series of camera names"""
+    names = names.fillna('').astype(str).str.lower().str.strip()
+    return names.str.extract(CAMERA_KEYWORDS, expand=False).fillna(names)
+
+def api_keys(names):
+    """(full name, name before "(") keys for a Series of API / sample names"""
+    names = names.fillna('').astype(str).str.lower().str.strip()
+    return names, names.str.split('(', n=1).str[0].str.strip()
+
+def configure(candidates_by_sample, annotations):
+    """Build feature arrays for {sample_id: [card dicts]}, kept in the same order, and the annotation rows"""
+    global _pads, _positions, _rows
+
+    pads = {}
+    positions = {}
+    for sample_id, candidates in candidates_by_sample.items():
+        cards = pd.DataFrame(candidates, columns=['id', 'camera_type_1', 'sample_name', 'deleted', 'date_of_creation'])
+        api, api_base = api_keys(cards['sample_name'])
+        created = pd.to_datetime(cards['date_of_creation'], errors='coerce')
+        pads[sample_id] = {
+            'ids': cards['id'].to_numpy(),
+            'camera': camera_key(cards['camera_type_1']).to_numpy(),
+            'api': api.to_numpy(),
+            'api_base': api_base.to_numpy(),
+            'deleted': cards['deleted'].fillna(False).astype(bool).to_numpy(),
+            # Seconds since the epoch, NaN where the date is missing or unparseable
+            'created': np.where(created.notna(), created.astype('int64') / 1e9, np.nan),
+        }
+        for position, card_id in enumerate(cards['id']):
+            positions.setdefault(card_id, (sample_id, position))
+
+    row_api, row_api_base = api_keys(annotations['API'])
+    rows = dict(zip(annotations['annot_id'].astype(int).tolist(),
+                    zip(camera_key(annotations['Camera']), row_api, row_api_base)))
+
+    _pads = pads
+    _positions = positions
+    _rows = rows
+    logger.info(f"Ranking features built for {len(positions)} cards in {len(pads)} PAD#s and {len(rows)} annotations")
+
+def score_pad(sample_id, annot_ids, matches, used_ids):
+    """Score matrix of a PAD#'s annotation rows against its cards
+
+    matches is the current {annot_id: card_id or "no_match"} and used_ids every
+    matched card id. Returns (card ids, scores) with scores[i, j] for
+    annot_ids[i] and card j, or None if the PAD# has no cards or rows.
+    """
+    pad = _pads.get(sample_id)
+    if pad is None or not len(annot_ids):
+        return None
+
+    features = np.array([_rows.get(int(annot_id), ('', '', '')) for annot_id in annot_ids], dtype=object)
+    row_camera, row_api, row_api_base = (features[:, [k]] for k in range(3))
+    current = np.array([matches.get(int(annot_id)) for annot_id in annot_ids], dtype=object)
+
+    same_camera = row_camera == pad['camera']
+    both_known = (row_camera != '') & (pad['camera'] != '')
+    same_api = row_api == pad['api']
+
+    scores = np.where(same_camera, WEIGHTS['camera'], np.where(both_known, WEIGHTS['camera_mismatch'], 0.0))
+    scores += np.where(same_api, WEIGHTS['api'], np.where(row_api_base == pad['api_base'], WEIGHTS['api_base'], 0.0))
+    scores += np.where(pad['deleted'], WEIGHTS['deleted'], 0.0)
+
+    # Cards created near the ones already matched for this PAD# belong to the same session
+    matched_positions = [_positions[card_id][1] for card_id in current
+                         if card_id in _positions and _positions[card_id][0] == sample_id]
+    if matched_positions:
+        session_times = pad['created'][matched_positions]
+        session_times = session_times[~np.isnan(session_times)]
+        if len(session_times):
+            gap = np.abs(pad['created'][:, np.newaxis] - session_times).min(axis=1)
+            scores += np.nan_to_num(WEIGHTS['session'] * 0.5 ** (gap / SESSION_HALF_LIFE))
+
+    is_used = np.array([card_id in used_ids for card_id in pad['ids']])
+    used_elsewhere = is_used & (current[:, np.newaxis] != pad['ids'])
+    scores += np.where(used_elsewhere, WEIGHTS['used'], 0.0)
+
+    return pad['ids'], scores
+
+def confidences(scores):
+    """Softmax of each row's scores: the estimated chance each card is the row's match"""
+    weights = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return weights / weights.sum(axis=1, keepdims=True)
+
+def rank_pad(sample_id, annot_ids, matches, used_ids):
+    """Ranked candidates per annotation row, most likely first
+
+    Returns one list per row of (position in the PAD#'s candidates, score,
+    confidence); ties keep the candidates' file order.
+    """
+    scored = score_pad(sample_id, annot_ids, matches, used_ids)
+    if scored is None:
+        return [[] for _ in annot_ids]
+
+    _, scores = scored
+    confidence = confidences(scores)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return [[(int(position), float(scores[i, position]), float(confidence[i, position])) for position in row_order]
+            for i, row_order in enumerate(order)]
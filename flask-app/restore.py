@@ -0,0 +1,246 @@
+"""
+Inspecting and restoring backups for ChemoPAD Annotation Matcher
+A source is 'live' (the current database), a backup filename from
+backup_catalog, '@<timestamp>' for the state at that time rebuilt from the
+change log, or 'events' for matches and notes rebuilt from match_events.
+Sources are materialized as SQLite files and compared or copied with
+set-based SQL over attached databases.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import logging
+
+import database
+
+logger = logging.getLogger(__name__)
+
+RESTORE_TABLES = database.RESTORE_TABLES
+
+class RestoreError(Exception):
+    """Raised when a source cannot be read or a restore cannot be applied"""
+
+@contextmanager
+def open_source(source):
+    """Yield the path of an SQLite file holding the restorable tables of source
+
+    Anything but 'live' is materialized into a temporary file that is removed afterwards.
+    """
+    if source == 'live':
+        yield database.get_db_path()
+        return
+
+    fd, path = tempfile.mkstemp(prefix='chemopad-restore-', suffix='.db')
+    os.close(fd)
+    try:
+        if source == 'events':
+            _materialize_events(path)
+        elif source.startswith('@'):
+            _materialize_at(parse_timestamp(source[1:]), path)
+        else:
+            _materialize_backup(source, path)
+        yield path
+    finally:
+        for suffix in ('', '-journal', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+def parse_timestamp(value):
+    """Parse an ISO timestamp; naive values are local time like backup timestamps"""
+    try:
+        return datetime.fromisoformat(value).astimezone(timezone.utc)
+    except ValueError:
+        raise RestoreError(f"Invalid timestamp: {value}")
+
+def _backup_path(filename):
+    # Only cataloged names, so a request cannot point outside the backup directory
+    with database.get_db() as conn:
+        cataloged = conn.execute('SELECT 1 FROM backup_catalog WHERE filename = ?', (filename,)).fetchone()
+    path = os.path.join(database.get_backup_dir(), filename)
+    if not cataloged or not os.path.exists(path):
+        raise RestoreError(f"Backup not found: {filename}")
+    return path
+
+def _materialize_backup(filename, path):
+    """Write the database state captured by a backup file to path"""
+    backup_path = _backup_path(filename)
+
+    if filename.endswith('.db.gz'):
+        with gzip.open(backup_path, 'rb') as source, open(path, 'wb') as dest:
+            shutil.copyfileobj(source, dest, 1 << 20)
+    elif filename.endswith('.db'):
+        shutil.copyfile(backup_path, path)
+    elif filename.endswith('.json.gz'):
+        with gzip.open(backup_path, 'rt') as f:
+            delta = json.load(f)
+        if not delta.get('base'):
+            raise RestoreError(f"Delta backup {filename} has no base backup")
+        _materialize_backup(delta['base'], path)
+        _apply_delta(path, delta)
+    else:
+        raise RestoreError(f"Unknown backup format: {filename}")
+
+    # Older plain copies may still be flagged as WAL databases
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        conn.close()
+
+def _apply_delta(path, delta):
+    """Apply an incremental backup's rows on top of its materialized base"""
+    conn = sqlite3.connect(path)
+    try:
+        for table_name, changes in delta['tables'].items():
+            key, value = RESTORE_TABLES[table_name]
+            if delta.get('format', 1) == 1:
+                rows = [row for row in changes if row[1] is not None]
+                deleted = [row[0] for row in changes if row[1] is None]
+            else:
+                rows, deleted = changes['rows'], changes['deleted']
+
+            conn.executemany(f'DELETE FROM {table_name} WHERE {key} = ?',
+                             [(row_key,) for row_key in deleted] + [(row[0],) for row in rows])
+            conn.executemany(f'INSERT INTO {table_name} ({key}, {value}) VALUES (?, ?)', rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _materialize_at(timestamp, path):
+    """Write the state of the live database at timestamp (UTC) to path
+
+    Works backwards from the live tables: every row changed after timestamp is
+    put back to the old value of its first later change_log entry.
+    """
+    changed_at = timestamp.strftime('%Y-%m-%d %H:%M:%S')  # change_log uses CURRENT_TIMESTAMP (UTC)
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('ATTACH DATABASE ? AS live', (database.get_db_path(),))
+        conn.execute('BEGIN')
+
+        first_seq, last_seq, cutoff_seq = conn.execute('''
+            SELECT MIN(seq), MAX(seq), MAX(CASE WHEN changed_at <= ? THEN seq END) FROM live.change_log
+        ''', (changed_at,)).fetchone()
+        if cutoff_seq is None:
+            if first_seq is not None and first_seq > 1:
+                raise RestoreError(f"Change log does not reach back to {timestamp.isoformat()}")
+            cutoff_seq = 0
+        unlogged = conn.execute('''
+            SELECT COUNT(*) FROM live.change_log WHERE seq > ? AND operation IS NULL
+        ''', (cutoff_seq,)).fetchone()[0]
+        if unlogged:
+            raise RestoreError(f"Change log entries after {timestamp.isoformat()} predate value logging")
+
+        for table_name, (key, value) in RESTORE_TABLES.items():
+            conn.execute(f'CREATE TABLE main.{table_name} AS SELECT * FROM live.{table_name}')
+            conn.execute(f'''
+                DELETE FROM main.{table_name} WHERE {key} IN (
+                    SELECT row_key FROM live.change_log WHERE table_name = ? AND seq > ?
+                )
+            ''', (table_name, cutoff_seq))
+            # First change after the cutoff: an INSERT means the row did not exist yet
+            conn.execute(f'''
+                INSERT INTO main.{table_name} ({key}, {value})
+                SELECT c.row_key, c.old_value FROM live.change_log c
+                JOIN (
+                    SELECT row_key, MIN(seq) AS seq FROM live.change_log
+                    WHERE table_name = ? AND seq > ? GROUP BY row_key
+                ) first USING (seq)
+                WHERE c.operation != 'INSERT'
+            ''', (table_name, cutoff_seq))
+
+        conn.commit()
+        conn.execute('DETACH DATABASE live')
+    finally:
+        conn.close()
+
+    logger.info(f"Rebuilt state at {timestamp.isoformat()} (change_log seq {cutoff_seq}, latest {last_seq})")
+
+def _materialize_events(path):
+    """Write matches and notes as derived from the match_events log to path
+
+    invalid_cards is not event-sourced and is copied from the live database.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('ATTACH DATABASE ? AS live', (database.get_db_path(),))
+        conn.execute('BEGIN')
+        for table_name, field in database.EVENT_FIELDS.items():
+            key, value = RESTORE_TABLES[table_name]
+            conn.execute(f'CREATE TABLE main.{table_name} AS SELECT * FROM live.{table_name} WHERE 0')
+            conn.execute(f'INSERT INTO main.{table_name} ({key}, {value}) {database.event_state_sql(field, "live")}')
+        conn.execute('CREATE TABLE main.invalid_cards AS SELECT * FROM live.invalid_cards')
+        conn.commit()
+        conn.execute('DETACH DATABASE live')
+    finally:
+        conn.close()
+
+def diff(old_source, new_source, tables=None, limit=None, keys=None):
+    """Row-level differences going from old_source to new_source
+
+    Returns {table: {'added', 'removed', 'changed': [{key, old, new}], 'counts'}}.
+    limit caps the rows listed per category (counts are always complete);
+    keys limits the diff to those row keys, as restore() does.
+    """
+    tables = list(tables or RESTORE_TABLES)
+    for table_name in tables:
+        if table_name not in RESTORE_TABLES:
+            raise RestoreError(f"Unknown table: {table_name}")
+
+    with open_source(old_source) as old_path, open_source(new_source) as new_path:
+        conn = sqlite3.connect(':memory:')
+        try:
+            conn.execute('ATTACH DATABASE ? AS old_db', (old_path,))
+            conn.execute('ATTACH DATABASE ? AS new_db', (new_path,))
+            conn.execute('BEGIN')  # One snapshot of each side, even for the live database
+
+            result = {}
+            for table_name in tables:
+                changes = {'added': [], 'removed': [], 'changed': []}
+                keys_filter, keys_params = database.row_keys_filter(table_name, keys)
+                for row_key, old_value, new_value, category in conn.execute(
+                        database.row_diff_sql(table_name, 'old_db', 'new_db', keys_filter), keys_params):
+                    changes[category].append({'key': row_key, 'old': old_value, 'new': new_value})
+
+                changes['counts'] = {category: len(rows) for category, rows in changes.items()}
+                if limit is not None:
+                    for category in ('added', 'removed', 'changed'):
+                        changes[category] = changes[category][:limit]
+                result[table_name] = changes
+
+            conn.rollback()
+        finally:
+            conn.close()
+
+    return result
+
+def restore(source, tables=None, keys=None, backup_first=True):
+    """Make the live tables (or only the given keys of them) match source, in one transaction
+
+    A full 'pre_restore' backup is taken first unless backup_first is False.
+    Returns {table: number of rows changed}. Raises CardAlreadyMatchedError if
+    restoring selected matches would give a card to two annotations.
+    """
+    tables = list(tables or RESTORE_TABLES)
+    for table_name in tables:
+        if table_name not in RESTORE_TABLES:
+            raise RestoreError(f"Unknown table: {table_name}")
+    if source == 'live':
+        raise RestoreError("Cannot restore the live database onto itself")
+
+    with open_source(source) as source_path:
+        if backup_first:
+            filename, _ = database.create_file_backup('pre_restore', incremental=False)
+            logger.info(f"Saved {filename} before restoring from {source}")
+
+        counts = database.restore_rows_from(source_path, tables, keys)
+
+    logger.info(f"Restored from {source}: {counts}")
+    return counts
@@ -0,0 +1,122 @@
+"""
+Binary snapshots of the source CSVs for fast worker startup
+Each snapshot is a pickled DataFrame plus a JSON manifest recording the source
+file's size, mtime and SHA-256. Stale snapshots fall back to the CSV and are rebuilt.
+"""
+
+import json
+import os
+import logging
+
+import pandas as pd
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Bump when the snapshot format changes so old snapshots are ignored
+SNAPSHOT_FORMAT = 1
+
+def get_snapshot_dir(csv_path):
+    """Get the snapshot directory for a source CSV (data/snapshots/)"""
+    snapshot_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), 'snapshots')
+
+    # Create snapshot directory if it doesn't exist
+    if not os.path.exists(snapshot_dir):
+        os.makedirs(snapshot_dir)
+
+    return snapshot_dir
+
+def _snapshot_paths(csv_path):
+    """Get (snapshot file, manifest file) paths for a source CSV"""
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    snapshot_dir = get_snapshot_dir(csv_path)
+    return (os.path.join(snapshot_dir, f'{name}.pkl'),
+            os.path.join(snapshot_dir, f'{name}.json'))
+
+def _source_manifest(csv_path):
+    stats = os.stat(csv_path)
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'pandas_version': pd.__version__,  # Pickles are tied to the pandas version
+        'source_size': stats.st_size,
+        'source_mtime_ns': stats.st_mtime_ns,
+        'source_sha256': database.file_sha256(csv_path),
+    }
+
+def _write_json_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def is_snapshot_fresh(csv_path):
+    """Check whether the snapshot of csv_path matches the current source file"""
+    snapshot_file, manifest_file = _snapshot_paths(csv_path)
+    if not os.path.exists(snapshot_file) or not os.path.exists(manifest_file):
+        return False
+
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    if manifest.get('format') != SNAPSHOT_FORMAT or manifest.get('pandas_version') != pd.__version__:
+        return False
+
+    stats = os.stat(csv_path)
+    if manifest.get('source_size') != stats.st_size:
+        return False
+    if manifest.get('source_mtime_ns') == stats.st_mtime_ns:
+        return True
+
+    # mtime changed (e.g. file copied or touched), fall back to the content hash
+    sha256 = database.file_sha256(csv_path)
+    if manifest.get('source_sha256') != sha256:
+        return False
+
+    # Same content: record the new mtime so the next check is cheap again
+    manifest['source_mtime_ns'] = stats.st_mtime_ns
+    _write_json_atomic(manifest_file, manifest)
+    return True
+
+def build_snapshot(csv_path, df=None, manifest=None):
+    """Write the snapshot for csv_path, parsing the CSV unless df is given
+
+    manifest should describe the source as it was before df was parsed, so an
+    edit made in between leaves the snapshot stale rather than wrong.
+    """
+    if df is None:
+        manifest = _source_manifest(csv_path)
+        df = pd.read_csv(csv_path)
+    elif manifest is None:
+        manifest = _source_manifest(csv_path)
+
+    snapshot_file, manifest_file = _snapshot_paths(csv_path)
+
+    tmp_path = f'{snapshot_file}.{os.getpid()}.tmp'
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, snapshot_file)
+    _write_json_atomic(manifest_file, manifest)
+
+    logger.info(f"Built snapshot {os.path.basename(snapshot_file)} ({len(df)} rows)")
+    return df
+
+def load_csv(csv_path):
+    """Load a source CSV from its snapshot when fresh, otherwise parse it and refresh the snapshot"""
+    try:
+        if is_snapshot_fresh(csv_path):
+            snapshot_file, _ = _snapshot_paths(csv_path)
+            return pd.read_pickle(snapshot_file)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot for {csv_path}: {e}")
+
+    manifest = _source_manifest(csv_path)
+    df = pd.read_csv(csv_path)
+    try:
+        build_snapshot(csv_path, df, manifest)
+    except Exception as e:
+        # A read-only data directory should not stop the app from starting
+        logger.warning(f"Could not write snapshot for {csv_path}: {e}")
+    return df
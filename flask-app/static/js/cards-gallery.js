@@ -1,47 +1,80 @@
-// Cards Gallery JavaScript - Client-side filtering and card management
+// Cards Gallery JavaScript - Server-side filtering with infinite scroll and card management
+
+// Paging state for the current filters
+const cardsState = {
+    filters: null,
+    cursor: null,
+    loading: false,
+    done: false,
+    generation: 0  // Bumped on every filter change so stale responses are dropped
+};
+
+let imageObserver = null;
 
 // Initialize on DOM load
 document.addEventListener('DOMContentLoaded', function() {
     setupLazyLoading();
     setupFilterListeners();
+    setupInfiniteScroll();
 
-    // Check if we have a preselected API filter
-    if (typeof preselectedAPI !== 'undefined' && preselectedAPI !== null) {
-        setTimeout(function() {
-            applyFilters();
-        }, 100);
-    } else {
-        applyFilters();
-    }
+    // The preselected API (if any) is already selected in the dropdown
+    applyFilters();
 });
 
 // Lazy loading for images
 function setupLazyLoading() {
-    const images = document.querySelectorAll('.gallery-image.lazy');
-
     if ('IntersectionObserver' in window) {
-        const imageObserver = new IntersectionObserver((entries, observer) => {
+        imageObserver = new IntersectionObserver((entries, observer) => {
             entries.forEach(entry => {
                 if (entry.isIntersecting) {
-                    const img = entry.target;
-                    img.src = img.dataset.src;
-                    img.classList.remove('lazy');
-                    img.classList.add('loaded');
-                    observer.unobserve(img);
+                    loadImage(entry.target);
+                    observer.unobserve(entry.target);
                 }
             });
         }, {
             rootMargin: '50px 0px',
             threshold: 0.01
         });
+    }
+}
+
+function loadImage(img) {
+    img.src = img.dataset.src;
+    img.classList.remove('lazy');
+    img.classList.add('loaded');
+}
 
-        images.forEach(img => imageObserver.observe(img));
+function observeImages(container) {
+    container.querySelectorAll('.gallery-image.lazy').forEach(img => {
+        if (imageObserver) {
+            imageObserver.observe(img);
+        } else {
+            loadImage(img);
+        }
+    });
+}
+
+// Infinite scroll: a sentinel below the last section triggers the next page
+function setupInfiniteScroll() {
+    const sentinel = document.getElementById('gallery-sentinel');
+    if (!sentinel) return;
+
+    if ('IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
+        }, { rootMargin: '600px 0px' });
+        observer.observe(sentinel);
     } else {
-        images.forEach(img => {
-            img.src = img.dataset.src;
-            img.classList.remove('lazy');
-            img.classList.add('loaded');
-        });
+        window.addEventListener('scroll', debounce(loadMoreIfNearEnd, 100));
+    }
+}
+
+function loadMoreIfNearEnd() {
+    const sentinel = document.getElementById('gallery-sentinel');
+    if (sentinel && sentinel.getBoundingClientRect().top < window.innerHeight + 600) {
+        loadNextPage();
     }
 }
 
@@ -64,32 +97,206 @@ function debounce(func, wait) {
     };
 }
 
-// Apply filters to cards
+// Apply filters: clear the loaded cards and start again from the first page
 function applyFilters() {
-    const filters = getActiveFilters();
-    const cardItems = document.querySelectorAll('.card-item');
+    cardsState.filters = getActiveFilters();
+    cardsState.cursor = null;
+    cardsState.loading = false;
+    cardsState.done = false;
+    cardsState.generation++;
+
+    document.querySelectorAll('.api-section .image-grid').forEach(grid => {
+        grid.innerHTML = '';
+    });
+    document.getElementById('gallery-sentinel').classList.remove('done');
 
-    let visibleCount = 0;
+    loadNextPage();
+}
 
-    cardItems.forEach(item => {
-        const isVisible = matchesFilters(item, filters);
+window.applyFilters = applyFilters;
 
-        if (isVisible) {
-            item.classList.remove('hidden');
-            visibleCount++;
-        } else {
-            item.classList.add('hidden');
+// Build the /api/cards query string for a set of filters
+function cardsQuery(filters, cursor, limit) {
+    const params = new URLSearchParams();
+    ['camera', 'status', 'match'].forEach(name => {
+        filters[name].forEach(value => params.append(name, value));
+    });
+    if (filters.api !== 'all') {
+        params.append('api', filters.api);
+    }
+    if (filters.similar) {
+        params.append('similar', '1');
+    }
+    if (filters.search) {
+        params.append('q', filters.search);
+    }
+    if (cursor !== null) {
+        params.append('cursor', cursor);
+    }
+    params.append('limit', limit);
+    return params.toString();
+}
+
+// Fetch and append the next page of cards for the current filters
+async function loadNextPage() {
+    if (cardsState.loading || cardsState.done || cardsState.filters === null) return;
+
+    const generation = cardsState.generation;
+    cardsState.loading = true;
+
+    try {
+        const response = await fetch('/api/cards?' + cardsQuery(cardsState.filters, cardsState.cursor, cardsPageSize));
+        const page = await response.json();
+        if (generation !== cardsState.generation) return;  // Filters changed meanwhile
+
+        appendCards(page.cards);
+        updateSectionCounts(page.api_counts);
+        document.getElementById('visible-count').textContent = page.total;
+
+        cardsState.cursor = page.next_cursor;
+        cardsState.done = page.next_cursor === null;
+        if (cardsState.done) {
+            document.getElementById('gallery-sentinel').classList.add('done');
+        }
+    } catch (error) {
+        console.error('Error loading cards page:', error);
+        cardsState.done = true;
+    } finally {
+        if (generation === cardsState.generation) {
+            cardsState.loading = false;
+        }
+    }
+
+    // A short page may leave the sentinel in view, which the observer does not report again
+    if (generation === cardsState.generation && !cardsState.done) {
+        loadMoreIfNearEnd();
+    }
+}
+
+// Add cards to their API sections
+function appendCards(cards) {
+    const fragments = {};
+
+    cards.forEach(card => {
+        const api = card.api.toLowerCase();
+        if (!fragments[api]) {
+            fragments[api] = document.createDocumentFragment();
         }
+        fragments[api].appendChild(renderCard(card));
     });
 
-    // Update section counts
-    updateSectionCounts();
+    Object.keys(fragments).forEach(api => {
+        const section = document.querySelector(`.api-section[data-api="${CSS.escape(api)}"]`);
+        if (!section) return;
+        const grid = section.querySelector('.image-grid');
+        grid.appendChild(fragments[api]);
+        observeImages(grid);
+    });
+}
 
-    // Update visible count
-    document.getElementById('visible-count').textContent = visibleCount;
+// Escape text for use in HTML
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value === null || value === undefined ? '' : String(value);
+    return div.innerHTML.replace(/"/g, '&quot;');
 }
 
-window.applyFilters = applyFilters;
+// Build the element for one card
+function renderCard(card) {
+    const element = document.createElement('div');
+    element.className = 'gallery-item card-item';
+    element.dataset.cardId = card.card_id;
+    element.dataset.api = card.api.toLowerCase();
+    element.dataset.sample = card.sample_name.toLowerCase();
+    element.dataset.camera = String(card.camera).toLowerCase();
+    element.dataset.status = card.is_invalid ? 'invalid' : 'valid';
+    element.dataset.match = card.is_matched ? 'matched' : 'unmatched';
+
+    let html;
+    if (card.image_url) {
+        html = `
+        <div class="image-container">
+            <img class="gallery-image lazy"
+                 data-src="/thumb/${escapeHtml(card.card_id)}?size=320"
+                 alt="Card ${escapeHtml(card.card_id)} - ${escapeHtml(card.sample_name)}">
+            <div class="image-overlay">
+                <span class="overlay-text">Database ID: ${escapeHtml(card.card_id)}</span>
+                <span class="overlay-text">PAD ID: ${escapeHtml(card.pad_id)}</span>
+                <span class="overlay-text">${escapeHtml(card.camera)}</span>
+                <span class="overlay-text">${escapeHtml(card.sample_name)}</span>
+            </div>
+        </div>`;
+    } else {
+        html = `
+        <div class="no-image-container">
+            <svg class="no-image-placeholder" viewBox="0 0 200 200">
+                <rect width="200" height="200" fill="#f0f0f0"/>
+                <text x="100" y="90" text-anchor="middle" fill="#999" font-size="14">No Image</text>
+                <text x="100" y="110" text-anchor="middle" fill="#999" font-size="10">DB ID: ${escapeHtml(card.card_id)}</text>
+                <text x="100" y="125" text-anchor="middle" fill="#999" font-size="10">PAD ID: ${escapeHtml(card.pad_id)}</text>
+            </svg>
+        </div>`;
+    }
+
+    // Card Actions
+    html += `
+        <div class="card-actions">
+            <button class="btn-quick-match" title="Quick match to annotation">🔗</button>
+            ${card.is_invalid
+                ? '<button class="btn-mark-invalid marked" title="Remove issue flag">✓</button>'
+                : '<button class="btn-mark-invalid" title="Flag card with issue">❌</button>'}
+        </div>`;
+
+    // Issue Badge
+    if (card.is_invalid) {
+        html += `
+        <div class="status-badge status-invalid clickable-badge" title="${escapeHtml(card.invalid_reason)}">
+            Issue
+        </div>`;
+    }
+
+    // Suggested Duplicate Badge
+    if (card.similar_cards.length > 0 && !card.is_invalid) {
+        html += `
+        <div class="status-badge status-similar clickable-badge"
+             title="Image looks like card ${escapeHtml(card.similar_cards.join(', '))}. Click to flag as duplicate.">
+            ≈ ${escapeHtml(card.similar_cards.slice(0, 3).join(', '))}${card.similar_cards.length > 3 ? '…' : ''}
+        </div>`;
+    }
+
+    // Match Status Badge
+    if (card.is_matched) {
+        html += `
+        <div class="status-badge status-matched">
+            ✓ Matched
+        </div>`;
+    }
+
+    element.innerHTML = html;
+
+    const img = element.querySelector('.gallery-image');
+    if (img) {
+        img.addEventListener('click', () => openImageModal(`/thumb/${card.card_id}?size=1280`, card.card_id, card.pad_id, card.sample_name));
+    }
+    element.querySelector('.btn-quick-match').addEventListener('click', () => openQuickMatchModal(card.card_id, card.sample_name));
+    element.querySelector('.btn-mark-invalid').addEventListener('click', () => {
+        if (card.is_invalid) {
+            unmarkInvalid(card.card_id);
+        } else {
+            markInvalid(card.card_id);
+        }
+    });
+    const similarBadge = element.querySelector('.status-similar');
+    if (similarBadge) {
+        similarBadge.addEventListener('click', () =>
+            markInvalid(card.card_id, `Possible duplicate of card ${card.similar_cards.join(', ')}`));
+    }
+    const issueBadge = element.querySelector('.status-invalid');
+    if (issueBadge) {
+        issueBadge.addEventListener('click', () => editIssue(card.card_id, card.invalid_reason));
+    }
+    return element;
+}
 
 // Get active filters
 function getActiveFilters() {
@@ -98,6 +305,7 @@ function getActiveFilters() {
         status: [],
         match: [],
         api: 'all',
+        similar: false,
         search: ''
     };
 
@@ -122,6 +330,12 @@ function getActiveFilters() {
         filters.api = apiFilter.value;
     }
 
+    // Only cards with suggested duplicates
+    const similarOnly = document.getElementById('similar-only');
+    if (similarOnly) {
+        filters.similar = similarOnly.checked;
+    }
+
     // Get search text
     const searchInput = document.getElementById('search-input');
     if (searchInput) {
@@ -131,53 +345,6 @@ function getActiveFilters() {
     return filters;
 }
 
-// Check if item matches filters
-function matchesFilters(item, filters) {
-    // Check camera
-    if (filters.camera.length > 0) {
-        const itemCamera = item.dataset.camera;
-        if (!filters.camera.includes(itemCamera)) {
-            return false;
-        }
-    }
-
-    // Check status
-    if (filters.status.length > 0) {
-        const itemStatus = item.dataset.status;
-        if (!filters.status.includes(itemStatus)) {
-            return false;
-        }
-    }
-
-    // Check match status
-    if (filters.match.length > 0) {
-        const itemMatch = item.dataset.match;
-        if (!filters.match.includes(itemMatch)) {
-            return false;
-        }
-    }
-
-    // Check API
-    if (filters.api !== 'all') {
-        const itemApi = item.dataset.api;
-        if (itemApi !== filters.api.toLowerCase()) {
-            return false;
-        }
-    }
-
-    // Check search
-    if (filters.search) {
-        const cardId = item.dataset.cardId.toString().toLowerCase();
-        const sample = item.dataset.sample || '';
-
-        if (!cardId.includes(filters.search) && !sample.includes(filters.search)) {
-            return false;
-        }
-    }
-
-    return true;
-}
-
 // Reset all filters
 function resetFilters() {
     // Check all checkboxes
@@ -185,6 +352,12 @@ function resetFilters() {
         checkbox.checked = true;
     });
 
+    // Suggested duplicates is an opt-in restriction, not a category
+    const similarOnly = document.getElementById('similar-only');
+    if (similarOnly) {
+        similarOnly.checked = false;
+    }
+
     // Reset API dropdown
     const apiFilter = document.getElementById('api-filter');
     if (apiFilter) {
@@ -224,24 +397,23 @@ function toggleSection(api) {
 
 window.toggleSection = toggleSection;
 
-// Update section counts after filtering
-function updateSectionCounts() {
-    const sections = document.querySelectorAll('.api-section');
+// Update section counts from the server's per-API totals
+function updateSectionCounts(apiCounts) {
+    const counts = {};
+    Object.keys(apiCounts).forEach(api => {
+        counts[api.toLowerCase()] = (counts[api.toLowerCase()] || 0) + apiCounts[api];
+    });
 
-    sections.forEach(section => {
-        const visibleItems = section.querySelectorAll('.card-item:not(.hidden)');
+    document.querySelectorAll('.api-section').forEach(section => {
+        const count = counts[section.dataset.api] || 0;
         const countBadge = section.querySelector('.count-badge');
 
         if (countBadge) {
-            countBadge.textContent = `${visibleItems.length} cards`;
+            countBadge.textContent = `${count} cards`;
         }
 
-        // Hide section if no visible items
-        if (visibleItems.length === 0) {
-            section.style.display = 'none';
-        } else {
-            section.style.display = 'block';
-        }
+        // Hide section if no cards match
+        section.style.display = count === 0 ? 'none' : 'block';
     });
 }
 
@@ -291,12 +463,12 @@ window.onclick = function(event) {
 }
 
 // Mark card with issue
-async function markInvalid(cardId) {
+async function markInvalid(cardId, suggestedReason) {
     let reason = '';
 
     // Keep prompting until user enters a reason or cancels
     while (true) {
-        reason = prompt('Describe the issue with this card (required):');
+        reason = prompt('Describe the issue with this card (required):', suggestedReason || '');
 
         // User cancelled
         if (reason === null) return;
@@ -462,20 +634,26 @@ async function searchAnnotations() {
     `;
 }
 
-// Export filtered cards to CSV
-function exportFilteredCards() {
-    const visibleItems = document.querySelectorAll('.card-item:not(.hidden)');
+// Export filtered cards to CSV (all pages, not only the loaded ones)
+async function exportFilteredCards() {
+    const filters = getActiveFilters();
     const data = [];
-
-    visibleItems.forEach(item => {
-        data.push({
-            card_id: item.dataset.cardId,
-            api: item.dataset.api,
-            sample: item.dataset.sample,
-            camera: item.dataset.camera,
-            status: item.dataset.status
+    let cursor = null;
+
+    do {
+        const response = await fetch('/api/cards?' + cardsQuery(filters, cursor, 500));
+        const page = await response.json();
+        page.cards.forEach(card => {
+            data.push({
+                card_id: card.card_id,
+                api: card.api.toLowerCase(),
+                sample: card.sample_name.toLowerCase(),
+                camera: String(card.camera).toLowerCase(),
+                status: card.is_invalid ? 'invalid' : 'valid'
+            });
         });
-    });
+        cursor = page.next_cursor;
+    } while (cursor !== null);
 
     // Convert to CSV
     const csv = convertToCSV(data);
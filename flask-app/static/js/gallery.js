@@ -1,4 +1,15 @@
-// Gallery JavaScript - Client-side filtering and image management
+// Gallery JavaScript - Server-side filtering with infinite scroll
+
+// Paging state for the current filters
+const galleryState = {
+    filters: null,
+    cursor: null,
+    loading: false,
+    done: false,
+    generation: 0  // Bumped on every filter change so stale responses are dropped
+};
+
+let imageObserver = null;
 
 // Initialize on DOM load
 document.addEventListener('DOMContentLoaded', function() {
@@ -7,46 +18,68 @@ document.addEventListener('DOMContentLoaded', function() {
     // Add event listeners for real-time filtering
     setupFilterListeners();
 
-    // Check if we have a preselected API filter
-    if (typeof preselectedAPI !== 'undefined' && preselectedAPI !== null) {
-        // Wait a moment for DOM to settle, then apply filters
-        setTimeout(function() {
-            applyFilters();
-        }, 100);
-    } else {
-        // Apply default filters to ensure correct initial state
-        applyFilters();
-    }
+    // Load the next page whenever the end of the gallery scrolls into view
+    setupInfiniteScroll();
+
+    // The preselected API (if any) is already selected in the dropdown
+    applyFilters();
 });
 
 // Lazy loading for images
 function setupLazyLoading() {
-    const images = document.querySelectorAll('.gallery-image.lazy');
-
     if ('IntersectionObserver' in window) {
-        const imageObserver = new IntersectionObserver((entries, observer) => {
+        imageObserver = new IntersectionObserver((entries, observer) => {
             entries.forEach(entry => {
                 if (entry.isIntersecting) {
-                    const img = entry.target;
-                    img.src = img.dataset.src;
-                    img.classList.remove('lazy');
-                    img.classList.add('loaded');
-                    observer.unobserve(img);
+                    loadImage(entry.target);
+                    observer.unobserve(entry.target);
                 }
             });
         }, {
             rootMargin: '50px 0px',
             threshold: 0.01
         });
+    }
+}
+
+function loadImage(img) {
+    img.src = img.dataset.src;
+    img.classList.remove('lazy');
+    img.classList.add('loaded');
+}
+
+function observeImages(container) {
+    container.querySelectorAll('.gallery-image.lazy').forEach(img => {
+        if (imageObserver) {
+            imageObserver.observe(img);
+        } else {
+            // Fallback for browsers without IntersectionObserver
+            loadImage(img);
+        }
+    });
+}
+
+// Infinite scroll: a sentinel below the last section triggers the next page
+function setupInfiniteScroll() {
+    const sentinel = document.getElementById('gallery-sentinel');
+    if (!sentinel) return;
 
-        images.forEach(img => imageObserver.observe(img));
+    if ('IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
+        }, { rootMargin: '600px 0px' });
+        observer.observe(sentinel);
     } else {
-        // Fallback for browsers without IntersectionObserver
-        images.forEach(img => {
-            img.src = img.dataset.src;
-            img.classList.remove('lazy');
-            img.classList.add('loaded');
-        });
+        window.addEventListener('scroll', debounce(loadMoreIfNearEnd, 100));
+    }
+}
+
+function loadMoreIfNearEnd() {
+    const sentinel = document.getElementById('gallery-sentinel');
+    if (sentinel && sentinel.getBoundingClientRect().top < window.innerHeight + 600) {
+        loadNextPage();
     }
 }
 
@@ -73,33 +106,178 @@ function debounce(func, wait) {
     };
 }
 
-// Apply filters to gallery items
+// Apply filters: clear the loaded items and start again from the first page
 function applyFilters() {
-    const filters = getActiveFilters();
-    const galleryItems = document.querySelectorAll('.gallery-item');
+    galleryState.filters = getActiveFilters();
+    galleryState.cursor = null;
+    galleryState.loading = false;
+    galleryState.done = false;
+    galleryState.generation++;
+
+    document.querySelectorAll('.image-grid').forEach(grid => {
+        grid.innerHTML = '';
+    });
+    document.getElementById('gallery-sentinel').classList.remove('done');
 
-    let visibleCount = 0;
+    loadNextPage();
+}
 
-    galleryItems.forEach(item => {
-        const isVisible = matchesFilters(item, filters);
+// Make applyFilters globally accessible for onclick
+window.applyFilters = applyFilters;
 
-        if (isVisible) {
-            item.classList.remove('hidden');
-            visibleCount++;
-        } else {
-            item.classList.add('hidden');
+// Build the /api/gallery query string for a set of filters
+function galleryQuery(filters, cursor, limit) {
+    const params = new URLSearchParams();
+    ['lighting', 'camera', 'background'].forEach(name => {
+        filters[name].forEach(value => params.append(name, value));
+    });
+    filters.match_status.forEach(value => params.append('status', value));
+    if (filters.api !== 'all') {
+        params.append('api', filters.api);
+    }
+    if (filters.search) {
+        params.append('q', filters.search);
+    }
+    if (cursor !== null) {
+        params.append('cursor', cursor);
+    }
+    params.append('limit', limit);
+    return params.toString();
+}
+
+// Fetch and append the next page of items for the current filters
+async function loadNextPage() {
+    if (galleryState.loading || galleryState.done || galleryState.filters === null) return;
+
+    const generation = galleryState.generation;
+    galleryState.loading = true;
+
+    try {
+        const response = await fetch('/api/gallery?' + galleryQuery(galleryState.filters, galleryState.cursor, galleryPageSize));
+        const page = await response.json();
+        if (generation !== galleryState.generation) return;  // Filters changed meanwhile
+
+        appendItems(page.items);
+        updateSectionCounts(page.lighting_counts);
+        document.getElementById('visible-count').textContent = page.total;
+
+        galleryState.cursor = page.next_cursor;
+        galleryState.done = page.next_cursor === null;
+        if (galleryState.done) {
+            document.getElementById('gallery-sentinel').classList.add('done');
+        }
+    } catch (error) {
+        console.error('Error loading gallery page:', error);
+        galleryState.done = true;
+    } finally {
+        if (generation === galleryState.generation) {
+            galleryState.loading = false;
+        }
+    }
+
+    // A short page may leave the sentinel in view, which the observer does not report again
+    if (generation === galleryState.generation && !galleryState.done) {
+        loadMoreIfNearEnd();
+    }
+}
+
+// Add items to their lighting sections
+function appendItems(items) {
+    const fragments = {};
+
+    items.forEach(item => {
+        const lighting = String(item.lighting).toLowerCase();
+        if (!fragments[lighting]) {
+            fragments[lighting] = document.createDocumentFragment();
         }
+        fragments[lighting].appendChild(renderGalleryItem(item));
     });
 
-    // Update section counts
-    updateSectionCounts();
+    Object.keys(fragments).forEach(lighting => {
+        const section = document.querySelector(`.lighting-section[data-lighting="${CSS.escape(lighting)}"]`);
+        if (!section) return;
+        const grid = section.querySelector('.image-grid');
+        grid.appendChild(fragments[lighting]);
+        observeImages(grid);
+    });
+}
 
-    // Update visible count
-    document.getElementById('visible-count').textContent = visibleCount;
+// Escape text for use in HTML
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value === null || value === undefined ? '' : String(value);
+    return div.innerHTML.replace(/"/g, '&quot;');
 }
 
-// Make applyFilters globally accessible for onclick
-window.applyFilters = applyFilters;
+function titleCase(value) {
+    return String(value).toLowerCase().replace(/(^|[\s_-])(\w)/g, (match, sep, letter) => sep + letter.toUpperCase());
+}
+
+// Build the element for one gallery item
+function renderGalleryItem(item) {
+    const element = document.createElement('div');
+    element.className = 'gallery-item';
+    element.dataset.annotId = item.annot_id;
+    element.dataset.pad = item.pad_num;
+    element.dataset.lighting = String(item.lighting).toLowerCase();
+    element.dataset.camera = String(item.camera).toLowerCase();
+    element.dataset.background = String(item.background).toLowerCase();
+    element.dataset.api = item.api;
+    element.dataset.sample = String(item.sample).toLowerCase();
+    element.dataset.status = item.match_status;
+
+    const overlay = `
+        <div class="image-overlay">
+            <span class="overlay-text">PAD#${escapeHtml(item.pad_num)}</span>
+            <span class="overlay-text">${escapeHtml(item.camera)}</span>
+            <span class="overlay-text">${escapeHtml(item.api)}</span>
+        </div>`;
+
+    let html;
+    if (item.image_url) {
+        html = `
+        <div class="image-container">
+            <img class="gallery-image lazy"
+                 data-src="/thumb/${escapeHtml(item.card_id)}?size=320"
+                 alt="PAD ${escapeHtml(item.pad_num)} - ${escapeHtml(item.lighting)}">
+            ${overlay}
+        </div>`;
+    } else {
+        const placeholder = item.match_status === 'unmatched' ? 'Not Matched' :
+            item.match_status === 'no_match' ? 'No Match' : 'No Image';
+        html = `
+        <div class="no-image-container">
+            <svg class="no-image-placeholder" viewBox="0 0 200 200">
+                <rect width="200" height="200" fill="#f0f0f0"/>
+                <text x="100" y="100" text-anchor="middle" fill="#999" font-size="14">${placeholder}</text>
+                <text x="100" y="120" text-anchor="middle" fill="#999" font-size="10">PAD#${escapeHtml(item.pad_num)}</text>
+            </svg>
+            ${overlay}
+        </div>`;
+    }
+
+    // Quality Indicators
+    if (item.note) {
+        html += `
+        <div class="quality-indicator" title="${escapeHtml(item.note)}">
+            💬 Note
+        </div>`;
+    }
+
+    // Match Status Badge
+    html += `
+        <div class="status-badge status-${escapeHtml(item.match_status)}">
+            ${escapeHtml(titleCase(item.match_status))}
+        </div>`;
+
+    element.innerHTML = html;
+
+    const img = element.querySelector('.gallery-image');
+    if (img) {
+        img.addEventListener('click', () => openImageModal(`/thumb/${item.card_id}?size=1280`, item.pad_num, item.lighting));
+    }
+    return element;
+}
 
 // Get active filters
 function getActiveFilters() {
@@ -147,61 +325,6 @@ function getActiveFilters() {
     return filters;
 }
 
-// Check if item matches filters
-function matchesFilters(item, filters) {
-    // Check lighting
-    if (filters.lighting.length > 0) {
-        const itemLighting = item.dataset.lighting;
-        if (!filters.lighting.includes(itemLighting)) {
-            return false;
-        }
-    }
-
-    // Check camera
-    if (filters.camera.length > 0) {
-        const itemCamera = item.dataset.camera;
-        if (!filters.camera.includes(itemCamera)) {
-            return false;
-        }
-    }
-
-    // Check background
-    if (filters.background.length > 0) {
-        const itemBackground = item.dataset.background;
-        if (!filters.background.includes(itemBackground)) {
-            return false;
-        }
-    }
-
-    // Check match status
-    if (filters.match_status.length > 0) {
-        const itemStatus = item.dataset.status;
-        if (!filters.match_status.includes(itemStatus)) {
-            return false;
-        }
-    }
-
-    // Check API
-    if (filters.api !== 'all') {
-        const itemApi = item.dataset.api;
-        if (itemApi !== filters.api) {
-            return false;
-        }
-    }
-
-    // Check search (case-insensitive)
-    if (filters.search) {
-        const padNumStr = item.dataset.pad.toString().toLowerCase();
-        const sample = item.dataset.sample || '';
-
-        if (!padNumStr.includes(filters.search) && !sample.includes(filters.search)) {
-            return false;
-        }
-    }
-
-    return true;
-}
-
 // Reset all filters
 function resetFilters() {
     // Check all checkboxes
@@ -247,36 +370,26 @@ function toggleSection(lighting) {
     }
 }
 
-// Update section counts after filtering
-function updateSectionCounts() {
-    const sections = document.querySelectorAll('.lighting-section');
+// Update section counts from the server's per-lighting totals
+function updateSectionCounts(lightingCounts) {
+    const counts = {};
+    Object.keys(lightingCounts).forEach(lighting => {
+        counts[lighting.toLowerCase()] = lightingCounts[lighting];
+    });
 
-    sections.forEach(section => {
-        const visibleItems = section.querySelectorAll('.gallery-item:not(.hidden)');
+    document.querySelectorAll('.lighting-section').forEach(section => {
+        const count = counts[section.dataset.lighting] || 0;
         const countBadge = section.querySelector('.count-badge');
 
         if (countBadge) {
-            countBadge.textContent = `${visibleItems.length} images`;
+            countBadge.textContent = `${count} images`;
         }
 
-        // Hide section if no visible items
-        if (visibleItems.length === 0) {
-            section.style.display = 'none';
-        } else {
-            section.style.display = 'block';
-        }
+        // Hide section if no items match
+        section.style.display = count === 0 ? 'none' : 'block';
     });
 }
 
-// Update visible count
-function updateVisibleCount() {
-    const totalItems = document.querySelectorAll('.gallery-item').length;
-    const visibleItems = document.querySelectorAll('.gallery-item:not(.hidden)').length;
-
-    document.getElementById('total-count').textContent = totalItems;
-    document.getElementById('visible-count').textContent = visibleItems;
-}
-
 // Open image modal
 function openImageModal(imageUrl, padNum, lighting) {
     const modal = document.getElementById('imageModal');
@@ -321,23 +434,29 @@ window.onclick = function(event) {
     }
 }
 
-// Export filtered results to CSV
-function exportFilteredGallery() {
-    const visibleItems = document.querySelectorAll('.gallery-item:not(.hidden)');
+// Export filtered results to CSV (all pages, not only the loaded ones)
+async function exportFilteredGallery() {
+    const filters = getActiveFilters();
     const data = [];
-
-    visibleItems.forEach(item => {
-        data.push({
-            annot_id: item.dataset.annotId,  // HTML: data-annot-id -> JS: annotId (camelCase)
-            pad_num: item.dataset.pad,
-            lighting: item.dataset.lighting,
-            camera: item.dataset.camera,
-            background: item.dataset.background,
-            api: item.dataset.api,
-            sample: item.dataset.sample,
-            status: item.dataset.status
+    let cursor = null;
+
+    do {
+        const response = await fetch('/api/gallery?' + galleryQuery(filters, cursor, 500));
+        const page = await response.json();
+        page.items.forEach(item => {
+            data.push({
+                annot_id: item.annot_id,
+                pad_num: item.pad_num,
+                lighting: String(item.lighting).toLowerCase(),
+                camera: String(item.camera).toLowerCase(),
+                background: String(item.background).toLowerCase(),
+                api: item.api,
+                sample: String(item.sample).toLowerCase(),
+                status: item.match_status
+            });
         });
-    });
+        cursor = page.next_cursor;
+    } while (cursor !== null);
 
     // Convert to CSV
     const csv = convertToCSV(data);
@@ -0,0 +1,251 @@
+"""
+Card image thumbnails for ChemoPAD Annotation Matcher
+Thumbnails are rendered with Pillow from the full-size card images, read from
+a local mirror of the image server (CHEMOPAD_IMAGE_ROOT) or fetched from its
+HTTP origin, and cached on disk. The cache is bounded by size and evicts the
+least recently served files first.
+"""
+
+import io
+import os
+import threading
+import time
+from urllib.parse import urljoin
+import logging
+
+import requests
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Thumbnail widths/heights served; a requested size is rounded up to one of these
+SIZES = (160, 320, 640, 1280)
+DEFAULT_SIZE = 320
+
+# processed_file_location values are paths under the image server's document root
+IMAGE_PATH_PREFIX = '/var/www/html/'
+
+# Local copy of the image server's document root; unset means fetch from IMAGE_ORIGIN
+IMAGE_ROOT = os.environ.get('CHEMOPAD_IMAGE_ROOT')
+IMAGE_ORIGIN = os.environ.get('CHEMOPAD_IMAGE_ORIGIN', 'https://pad.crc.nd.edu/')
+SOURCE_TIMEOUT = 15  # seconds
+
+# Upper bound on the disk cache; eviction brings it down to EVICT_TO of this
+CACHE_MAX_BYTES = int(os.environ.get('CHEMOPAD_THUMB_CACHE_MB', 2048)) * 1024 * 1024
+EVICT_TO = 0.9
+
+# nginx internal location aliased to the thumbnail directory (see deploy/nginx.conf);
+# when set, responses carry X-Accel-Redirect instead of the file body
+ACCEL_PREFIX = os.environ.get('CHEMOPAD_THUMB_ACCEL_PREFIX')
+
+# Served files have their access time refreshed at most this often (seconds)
+TOUCH_INTERVAL = 3600
+
+FORMATS = {
+    'webp': {'extension': 'webp', 'mimetype': 'image/webp',
+             'save': {'format': 'WEBP', 'quality': 80, 'method': 4}},
+    'jpeg': {'extension': 'jpg', 'mimetype': 'image/jpeg',
+             'save': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True}},
+}
+
+# Source hashes of pre-generated thumbnails (scripts/generate_thumbnails.py), in the thumbnail directory
+MANIFEST_NAME = 'manifest.jsonl'
+
+_cache_lock = threading.Lock()
+_cache_bytes = None  # Estimated size of the cache directory, None until first scanned
+
+class ThumbnailError(Exception):
+    """Raised when a source image cannot be read or rendered"""
+
+def get_thumb_dir():
+    """Get the thumbnail cache directory (CHEMOPAD_THUMB_DIR overrides thumbnails/ at the project root)"""
+    thumb_dir = os.environ.get('CHEMOPAD_THUMB_DIR')
+    if not thumb_dir:
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        thumb_dir = os.path.join(base_dir, 'thumbnails')
+
+    # Create thumbnail directory if it doesn't exist
+    if not os.path.exists(thumb_dir):
+        os.makedirs(thumb_dir)
+
+    return thumb_dir
+
+def pick_size(requested):
+    """Round a requested size up to the nearest served size"""
+    for size in SIZES:
+        if requested <= size:
+            return size
+    return SIZES[-1]
+
+def thumbnail_path(card_id, size, fmt):
+    """Cache path of one card's thumbnail"""
+    return os.path.join(get_thumb_dir(), str(size), f"{card_id}.{FORMATS[fmt]['extension']}")
+
+def accel_path(path):
+    """X-Accel-Redirect target for a cached thumbnail"""
+    relative = os.path.relpath(path, get_thumb_dir()).replace(os.sep, '/')
+    return ACCEL_PREFIX.rstrip('/') + '/' + relative
+
+def thumbnail_etag(path):
+    """ETag of a cached thumbnail; changes only when the file is rendered again"""
+    stat = os.stat(path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+def source_relpath(location):
+    """Path of a processed_file_location relative to the image server's document root"""
+    if location.startswith(IMAGE_PATH_PREFIX):
+        return location[len(IMAGE_PATH_PREFIX):]
+    return location.lstrip('/')
+
+def read_source(location):
+    """Read the full-size image for a processed_file_location"""
+    relative = source_relpath(location)
+
+    if IMAGE_ROOT:
+        root = os.path.realpath(IMAGE_ROOT)
+        path = os.path.realpath(os.path.join(root, relative))
+        if not path.startswith(root + os.sep):
+            raise ThumbnailError(f"Image path outside the image root: {location}")
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            raise ThumbnailError(f"Cannot read {path}: {e}")
+
+    url = urljoin(IMAGE_ORIGIN, relative)
+    try:
+        response = requests.get(url, timeout=SOURCE_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise ThumbnailError(f"Cannot fetch {url}: {e}")
+    return response.content
+
+def render_thumbnail(data, size, fmt):
+    """Render image bytes as a thumbnail fitting size x size, returned as encoded bytes"""
+    return render_thumbnails(data, [size], [fmt])[(size, fmt)]
+
+def render_thumbnails(data, sizes, formats):
+    """Render image bytes in several sizes and formats, decoding the source once
+
+    Returns {(size, fmt): encoded bytes}.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            # JPEG sources decode straight at a reduced scale
+            source.draft('RGB', (max(sizes), max(sizes)))
+            image = ImageOps.exif_transpose(source)
+
+            outputs = {}
+            # Largest first, each size scaled down from the one before
+            for size in sorted(sizes, reverse=True):
+                image = image.copy()
+                image.thumbnail((size, size), Image.LANCZOS)
+                for fmt in formats:
+                    outputs[(size, fmt)] = _encode(image, fmt)
+            return outputs
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f"Cannot render image: {e}")
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    output = io.BytesIO()
+    image.save(output, **FORMATS[fmt]['save'])
+    return output.getvalue()
+
+def write_thumbnail(path, data):
+    """Atomically write a rendered thumbnail, without cache size accounting"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def store_thumbnail(path, data):
+    """Write a rendered thumbnail into the cache and evict old files if it is over its bound"""
+    global _cache_bytes
+
+    write_thumbnail(path, data)
+
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _scan_cache()[1]
+        else:
+            _cache_bytes += len(data)
+        if _cache_bytes > CACHE_MAX_BYTES:
+            _cache_bytes = evict()
+
+def get_thumbnail(card_id, location, size, fmt):
+    """Path of a card's cached thumbnail, rendering it first if needed"""
+    path = thumbnail_path(card_id, size, fmt)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        start_time = time.perf_counter()
+        store_thumbnail(path, render_thumbnail(read_source(location), size, fmt))
+        logger.info(f"Rendered {size}px {fmt} thumbnail for card {card_id} "
+                    f"in {time.perf_counter() - start_time:.2f}s")
+        return path
+
+    # Access time is the LRU clock; mtime is left alone so the ETag stays stable
+    now = time.time()
+    if now - stat.st_atime > TOUCH_INTERVAL:
+        try:
+            os.utime(path, ns=(int(now * 1e9), stat.st_mtime_ns))
+        except OSError:
+            pass
+    return path
+
+def cache_size():
+    """Total size of the cached thumbnails in bytes"""
+    return _scan_cache()[1]
+
+def _scan_cache():
+    """List cached thumbnails as (atime, size, path) and their total size"""
+    entries = []
+    for root, _, filenames in os.walk(get_thumb_dir()):
+        for filename in filenames:
+            if filename.endswith('.tmp') or filename == MANIFEST_NAME:
+                continue
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+    return entries, sum(entry[1] for entry in entries)
+
+def evict(max_bytes=None):
+    """Remove least recently served thumbnails until the cache is under its bound
+
+    Returns the remaining cache size in bytes.
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries, total = _scan_cache()
+    if total <= max_bytes:
+        return total
+
+    target = max_bytes * EVICT_TO
+    removed = 0
+    for _, file_size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= file_size
+        removed += 1
+
+    logger.info(f"Evicted {removed} thumbnails, cache now {total / 1024 / 1024:.1f} MB")
+    return total
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Batch Auto-Matcher
+Proposes a project card for every unmatched annotation row, solving each PAD#
+as an assignment problem over the candidate ranking scores, and stages the
+proposals in the match_proposals table. Reviewers accept them in bulk from the
+PAD list or PAD pages. Rerun after every data refresh; previous proposals are
+replaced.
+
+Usage:
+  auto_match.py [--min-score N] [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add flask-app to path (script is in scripts/, so go up one level)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask-app'))
+
+import automatch
+import database
+import ranking
+import snapshot
+
+def load_inputs():
+    """Annotation (API, PAD#) index with ranking features configured, as the app builds them"""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_dir = os.path.join(base_dir, 'data')
+
+    annotations = snapshot.load_csv(os.path.join(data_dir, 'chemoPAD-annotations-final.csv'))
+    annotations = annotations[annotations['missing_card'] != True]
+    cards = snapshot.load_csv(os.path.join(data_dir, 'project_cards.csv'))
+
+    candidates_by_sample = {}
+    for card in cards.to_dict('records'):
+        candidates_by_sample.setdefault(card['sample_id'], []).append(card)
+    ranking.configure(candidates_by_sample, annotations)
+
+    annot_ids = annotations['annot_id'].astype('int64').to_numpy()
+    groups = annotations.groupby(['API', 'PAD#'], sort=False).indices
+    return {(api, int(pad)): annot_ids[positions] for (api, pad), positions in groups.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Propose matches for all unmatched annotation rows')
+    parser.add_argument('--min-score', type=float, default=automatch.MIN_SCORE,
+                        help='Lowest candidate score to propose')
+    parser.add_argument('--dry-run', action='store_true', help='Only print what would be proposed')
+    args = parser.parse_args()
+
+    print("🤖 Batch Auto-Match")
+    print("=" * 60)
+
+    start_time = time.perf_counter()
+    pad_index = load_inputs()
+    load_time = time.perf_counter() - start_time
+
+    state = database.get_snapshot()
+    matches = state['matches']
+    open_rows = sum(1 for annot_ids in pad_index.values() for annot_id in annot_ids
+                    if matches.get(int(annot_id)) is None)
+    print(f"Loaded {len(pad_index)} API/PAD# groups in {load_time:.1f}s, {open_rows} rows unmatched")
+
+    start_time = time.perf_counter()
+    proposals = automatch.propose(pad_index, matches, state['matched_cards'], state['invalid_cards'],
+                                  args.min_score)
+    solve_time = time.perf_counter() - start_time
+
+    per_api = {}
+    for proposal in proposals:
+        per_api[proposal['api']] = per_api.get(proposal['api'], 0) + 1
+
+    print(f"Proposed {len(proposals)} matches in {solve_time:.2f}s\n")
+    for api_name, count in sorted(per_api.items()):
+        print(f"  - {api_name}: {count}")
+
+    if args.dry_run:
+        print("\n(dry run, staged proposals left unchanged)")
+        return
+
+    database.replace_match_proposals(proposals)
+    print(f"\n✅ Staged {len(proposals)} proposals for review")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Backup Tool
+List, verify, diff and restore database backups
+
+A SOURCE is 'live', a backup filename (see `list`), @TIMESTAMP for the
+state at that time rebuilt from the change log, e.g. @2025-11-03T14:30, or
+'events' for matches and notes rebuilt from the match event log.
+
+Usage:
+  backup_tool.py list [--type TYPE]
+  backup_tool.py verify FILENAME
+  backup_tool.py diff OLD_SOURCE [NEW_SOURCE] [--table TABLE] [--limit N]
+  backup_tool.py restore SOURCE [--table TABLE] [--keys ID,ID,...] [--yes]
+  backup_tool.py compact [--days N]
+"""
+
+import argparse
+import os
+import sys
+
+# Add flask-app to path (script is in scripts/, so go up one level)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask-app'))
+
+import database
+import restore
+
+def list_backups(args):
+    print("🗄️  Cataloged Backups")
+    print("=" * 60)
+    for entry in database.get_backup_catalog(args.type, limit=args.limit):
+        counts = f"{entry['matches_count']} matches, {entry['notes_count']} notes" \
+            if entry['matches_count'] is not None else "counts unknown"
+        print(f"  {entry['filename']:<36} {entry['kind']:<5} {entry['size']:>10} bytes  "
+              f"{entry['created_at'][:19]}  {counts}")
+
+def verify_backup(args):
+    result = database.verify_backup(args.filename)
+    if result['ok']:
+        print(f"✅ {args.filename}: size and checksum match the catalog")
+    else:
+        print(f"❌ {args.filename}: {result['error']}")
+        sys.exit(1)
+
+def diff_sources(args):
+    tables = [args.table] if args.table else None
+    result = restore.diff(args.old_source, args.new_source, tables, limit=args.limit)
+
+    print(f"🔍 Changes from {args.old_source} to {args.new_source}")
+    print("=" * 60)
+    for table_name, changes in result.items():
+        counts = changes['counts']
+        print(f"\n📋 {table_name}: {counts['added']} added, {counts['removed']} removed, {counts['changed']} changed")
+        for category, marker in (('added', '+'), ('removed', '-'), ('changed', '~')):
+            for row in changes[category]:
+                print(f"  {marker} {row['key']}: {row['old']!r} -> {row['new']!r}")
+            if counts[category] > len(changes[category]):
+                print(f"  ... and {counts[category] - len(changes[category])} more {category}")
+
+def restore_source(args):
+    tables = [args.table] if args.table else None
+    keys = [int(key) for key in args.keys.split(',')] if args.keys else None
+
+    # Show what will change before touching anything
+    result = restore.diff('live', args.source, tables, limit=0, keys=keys)
+    total = 0
+    print(f"♻️  Restore from {args.source}")
+    print("=" * 60)
+    for table_name, changes in result.items():
+        counts = changes['counts']
+        total += sum(counts.values())
+        print(f"  - {table_name}: {counts['added']} to add, {counts['removed']} to remove, "
+              f"{counts['changed']} to change")
+    if keys is not None:
+        print(f"  (limited to the {len(keys)} selected keys)")
+
+    if total == 0:
+        print("\n✓ Live database already matches, nothing to restore")
+        return
+
+    if not args.yes:
+        response = input("\nProceed with restore? (yes/no): ").strip().lower()
+        if response not in ['yes', 'y']:
+            print("❌ Restore cancelled")
+            return
+
+    counts = restore.restore(args.source, tables, keys)
+    print(f"\n✅ Restore complete: {counts}")
+    print("   A pre_restore backup of the previous state was saved first")
+
+def compact_events(args):
+    removed = database.compact_match_events(args.days)
+    print(f"✅ Removed {removed} superseded match events older than {args.days} days")
+
+def main():
+    parser = argparse.ArgumentParser(description='List, verify, diff and restore database backups')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='List cataloged backups')
+    list_parser.add_argument('--type', help='Only this backup type (manual, auto, export, ...)')
+    list_parser.add_argument('--limit', type=int, default=50)
+    list_parser.set_defaults(func=list_backups)
+
+    verify_parser = subparsers.add_parser('verify', help='Check a backup against its catalog checksum')
+    verify_parser.add_argument('filename')
+    verify_parser.set_defaults(func=verify_backup)
+
+    diff_parser = subparsers.add_parser('diff', help='Row-level diff between two sources')
+    diff_parser.add_argument('old_source')
+    diff_parser.add_argument('new_source', nargs='?', default='live')
+    diff_parser.add_argument('--table', choices=sorted(restore.RESTORE_TABLES))
+    diff_parser.add_argument('--limit', type=int, default=20, help='Rows listed per category')
+    diff_parser.set_defaults(func=diff_sources)
+
+    restore_parser = subparsers.add_parser('restore', help='Restore rows or a whole snapshot into the live database')
+    restore_parser.add_argument('source')
+    restore_parser.add_argument('--table', choices=sorted(restore.RESTORE_TABLES))
+    restore_parser.add_argument('--keys', help='Comma-separated row keys (annot_id, or card_id for invalid_cards)')
+    restore_parser.add_argument('--yes', action='store_true', help='Do not ask for confirmation')
+    restore_parser.set_defaults(func=restore_source)
+
+    compact_parser = subparsers.add_parser('compact', help='Drop superseded match events past retention')
+    compact_parser.add_argument('--days', type=int, default=database.EVENT_RETENTION_DAYS)
+    compact_parser.set_defaults(func=compact_events)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (restore.RestoreError, database.CardAlreadyMatchedError) as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Database Connection Micro-benchmark
+Compares per-request SQLite overhead of a new connection per call (the old
+get_db) against the pooled per-thread connection, on a scratch database
+"""
+
+import os
+import shutil
+import sys
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Point the database module at a scratch file before it initializes
+scratch_dir = tempfile.mkdtemp(prefix='chemopad-bench-')
+os.environ['CHEMOPAD_DB_PATH'] = os.path.join(scratch_dir, 'bench.db')
+
+# Add flask-app to path (script is in scripts/, so go up one level)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask-app'))
+
+import database
+
+@contextmanager
+def connect_per_call():
+    """The previous get_db: open, set WAL, close on every call"""
+    conn = sqlite3.connect(database.get_db_path(), timeout=30.0)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def page_view(get_db):
+    """What a page view does: a few version checks and point lookups"""
+    for _ in range(3):
+        with get_db() as conn:
+            database.get_data_version(conn)
+    with get_db() as conn:
+        conn.execute('SELECT card_id FROM matches WHERE annot_id = ?', (1,)).fetchone()
+
+def save_request(get_db, annot_id):
+    """What a save_match request does: version check, one write, version check"""
+    with get_db() as conn:
+        database.get_data_version(conn)
+    with get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('''
+            INSERT INTO matches (annot_id, card_id) VALUES (?, 'no_match')
+            ON CONFLICT (annot_id) DO UPDATE SET updated_at = CURRENT_TIMESTAMP
+        ''', (annot_id,))
+        conn.commit()
+    with get_db() as conn:
+        database.get_data_version(conn)
+
+def run(label, func, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    elapsed = time.perf_counter() - start
+    per_request = elapsed / iterations * 1e6
+    print(f"  {label:<28} {per_request:8.1f} µs/request")
+    return per_request
+
+def benchmark(iterations=2000):
+    """Run both workloads with both connection strategies"""
+    print("⏱️  SQLite per-request overhead")
+    print("=" * 60)
+    print(f"Scratch database: {database.get_db_path()}")
+    print(f"Iterations: {iterations}\n")
+
+    results = {}
+    print("Page view (4 queries):")
+    results['view_old'] = run('connection per call', lambda i: page_view(connect_per_call), iterations)
+    results['view_new'] = run('pooled connection', lambda i: page_view(database.get_db), iterations)
+
+    print("\nsave_match (2 reads + 1 write):")
+    results['save_old'] = run('connection per call', lambda i: save_request(connect_per_call, i % 500), iterations)
+    results['save_new'] = run('pooled connection', lambda i: save_request(database.get_db, i % 500), iterations)
+
+    print("\nSpeedup:")
+    print(f"  Page view:  {results['view_old'] / results['view_new']:.1f}x")
+    print(f"  save_match: {results['save_old'] / results['save_new']:.1f}x")
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    try:
+        benchmark(iterations)
+    finally:
+        database.close_db()
+        # The database module also creates a backups directory next to the file
+        shutil.rmtree(scratch_dir)
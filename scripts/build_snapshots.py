@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Build Data Snapshots
+Converts the source CSVs into binary snapshots so app workers start without parsing CSV
+"""
+
+import os
+import sys
+import time
+
+# Add flask-app to path (script is in scripts/, so go up one level)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask-app'))
+
+import pandas as pd
+
+import snapshot
+
+SOURCE_FILES = ['chemoPAD-annotations-final.csv', 'project_cards.csv']
+
+def build_snapshots(force=False):
+    """Build snapshots for all source CSVs that are missing or stale"""
+
+    print("📦 Building Data Snapshots")
+    print("=" * 60)
+
+    # Get paths (script is in scripts/, so project root is one level up)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.dirname(script_dir)  # Go up to project root
+    data_dir = os.path.join(base_dir, 'data')
+
+    for filename in SOURCE_FILES:
+        csv_path = os.path.join(data_dir, filename)
+
+        if not os.path.exists(csv_path):
+            print(f"\n❌ Source file not found: {csv_path}")
+            continue
+
+        print(f"\n📂 {filename}")
+
+        if not force and snapshot.is_snapshot_fresh(csv_path):
+            print(f"  ✓ Snapshot is up to date")
+        else:
+            start = time.perf_counter()
+            df = snapshot.build_snapshot(csv_path)
+            print(f"  ✓ Built snapshot: {len(df)} rows in {time.perf_counter() - start:.3f}s")
+
+        # Compare load times so the benefit is visible
+        start = time.perf_counter()
+        pd.read_csv(csv_path)
+        csv_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        snapshot.load_csv(csv_path)
+        snapshot_time = time.perf_counter() - start
+
+        print(f"  - CSV parse:     {csv_time * 1000:.1f} ms")
+        print(f"  - Snapshot load: {snapshot_time * 1000:.1f} ms")
+
+    print("\n" + "=" * 60)
+    print("✅ Snapshots ready")
+
+if __name__ == '__main__':
+    try:
+        build_snapshots(force='--force' in sys.argv[1:])
+    except Exception as e:
+        print(f"\n❌ Error building snapshots: {e}")
+        sys.exit(1)
@@ -44,22 +44,27 @@ def cleanup_database():
     # Perform cleanup
     print("\n🗑️  Cleaning database...")
 
-    with database.get_db() as conn:
-        match_count = conn.execute('SELECT COUNT(*) FROM matches').fetchone()[0]
-        note_count = conn.execute('SELECT COUNT(*) FROM notes').fetchone()[0]
-        backup_count = conn.execute('SELECT COUNT(*) FROM backups').fetchone()[0]
-
-        print(f"  Deleting {match_count} matches...")
-        conn.execute('DELETE FROM matches')
+    # Through the bulk functions, so match_events records the removals and
+    # replaying the event log does not bring the data back
+    print(f"  Deleting {len(matches)} matches...")
+    database.save_matches_bulk([(annot_id, None) for annot_id in matches], annotator='cleanup')
 
-        print(f"  Deleting {note_count} notes...")
-        conn.execute('DELETE FROM notes')
+    print(f"  Deleting {len(notes)} notes...")
+    database.save_notes_bulk([(annot_id, '') for annot_id in notes], annotator='cleanup')
 
+    with database.get_db() as conn:
+        backup_count = conn.execute('SELECT COUNT(*) FROM backups').fetchone()[0]
         print(f"  Clearing {backup_count} in-database backups...")
         conn.execute('DELETE FROM backups')
-
         conn.commit()
 
+    # Backup files are offered for removal below; catalog rows of files already gone go now
+    stale = [entry['filename'] for entry in database.get_backup_catalog(limit=-1)
+             if not os.path.exists(os.path.join(database.get_backup_dir(), entry['filename']))]
+    print(f"  Removing {len(stale)} catalog entries of missing backup files...")
+    for filename in stale:
+        database.delete_backup(filename)
+
     # Verify cleanup
     matches = database.get_all_matches()
     notes = database.get_all_notes()
@@ -68,16 +73,13 @@ def cleanup_database():
     print(f"  Final state: {len(matches)} matches, {len(notes)} notes")
 
 def cleanup_backup_files():
-    """Clean up backup files"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    base_dir = os.path.dirname(script_dir)  # Go up to project root
-    backup_dir = os.path.join(base_dir, 'database', 'backups')
+    """Clean up backup files (full and incremental) and their catalog entries"""
+    backup_dir = database.get_backup_dir()
 
-    if not os.path.exists(backup_dir):
-        print("\n  No backup directory found")
-        return
-
-    backup_files = [f for f in os.listdir(backup_dir) if f.endswith('.db')]
+    # Catalog rows whose file is already gone are removed along with the files
+    backup_files = {f for f in os.listdir(backup_dir) if f.endswith(database.BACKUP_SUFFIXES)}
+    backup_files.update(entry['filename'] for entry in database.get_backup_catalog(limit=-1))
+    backup_files = sorted(backup_files)
 
     if not backup_files:
         print("\n  No backup files to remove")
@@ -88,8 +90,7 @@ def cleanup_backup_files():
 
     if response in ['yes', 'y']:
         for filename in backup_files:
-            filepath = os.path.join(backup_dir, filename)
-            os.remove(filepath)
+            database.delete_backup(filename)
             print(f"    Removed: {filename}")
         print("  ✅ Backup files removed")
     else:
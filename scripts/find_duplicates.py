@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Duplicate Card Finder
+Computes perceptual hashes (pHash and dHash) of every project card image,
+stores them in the card_hashes table and lists groups of near-duplicate cards.
+The same suggestions are shown in the Lab Card Inventory.
+
+Images are read from a local directory (--image-root, a mirror of the image
+server's document root) or fetched from the image server. Cards hashed before
+are skipped unless their image location changed or --rehash is given.
+
+Usage:
+  find_duplicates.py [--image-root DIR] [--origin URL] [--workers N] [--rehash]
+                     [--max-distance N] [--dhash-distance N] [--no-hash]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+# Add flask-app to path (script is in scripts/, so go up one level)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask-app'))
+
+# Hashes are saved in batches of this many cards
+SAVE_BATCH = 200
+
+def hash_card(card_id, location):
+    """Worker: (card_id, location, phash, dhash, error) for one card image"""
+    import duplicates
+    import thumbnails
+
+    try:
+        phash, dhash = duplicates.hash_image(thumbnails.read_source(location))
+        return card_id, location, phash, dhash, None
+    except (thumbnails.ThumbnailError, duplicates.HashError, OSError) as e:
+        return card_id, location, None, None, str(e)
+
+def hash_cards(args):
+    import database
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cards = pd.read_csv(os.path.join(base_dir, 'data', 'project_cards.csv'),
+                        usecols=['id', 'processed_file_location'])
+    cards = cards.dropna(subset=['processed_file_location']).drop_duplicates('id')
+
+    existing = database.get_card_hashes()
+    tasks = [(card_id, location) for card_id, location
+             in zip(cards['id'].astype(int).tolist(), cards['processed_file_location'])
+             if args.rehash or card_id not in existing or existing[card_id]['location'] != location]
+
+    print(f"🔢 Hashing {len(tasks)} card images ({len(cards) - len(tasks)} already hashed, {args.workers} workers)")
+    if not tasks:
+        return
+
+    hashed = failed = 0
+    batch = []
+    start_time = last_report = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(hash_card, card_id, location) for card_id, location in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            card_id, location, phash, dhash, error = future.result()
+            if error:
+                failed += 1
+                print(f"  ⚠️  Card {card_id}: {error}")
+            else:
+                hashed += 1
+                batch.append((card_id, location, phash, dhash))
+            if len(batch) >= SAVE_BATCH:
+                database.save_card_hashes(batch)
+                batch = []
+
+            now = time.perf_counter()
+            if now - last_report >= 5 or done == len(futures):
+                print(f"  {done}/{len(futures)} images  {done / (now - start_time):6.1f} images/s")
+                last_report = now
+
+    if batch:
+        database.save_card_hashes(batch)
+    print(f"  ✓ Hashed {hashed} images, {failed} failed, in {time.perf_counter() - start_time:.1f}s")
+
+def list_duplicates(args):
+    import database
+    import duplicates
+
+    hashes = database.get_card_hashes()
+    start_time = time.perf_counter()
+    similar = duplicates.find_similar(hashes, args.max_distance, args.dhash_distance)
+    groups = duplicates.group_similar(similar)
+    elapsed = time.perf_counter() - start_time
+    invalid_cards = database.get_all_invalid_cards()
+
+    print(f"\n🔍 Near-duplicate Cards (pHash ≤ {args.max_distance}, dHash ≤ {args.dhash_distance} bits)")
+    print("=" * 60)
+    print(f"Searched {len(hashes)} hashed cards in {elapsed * 1000:.0f} ms")
+    print(f"Found {len(groups)} groups covering {len(similar)} cards\n")
+
+    for group in groups:
+        first = group[0]
+        distances = {other_id: distance for other_id, distance in similar[first]}
+        members = []
+        for card_id in group:
+            label = str(card_id)
+            if card_id in distances:
+                label += f" (±{distances[card_id]})"
+            if card_id in invalid_cards:
+                label += " [flagged]"
+            members.append(label)
+        print(f"  - {', '.join(members)}")
+
+def main():
+    import duplicates
+
+    parser = argparse.ArgumentParser(description='Hash project card images and list near-duplicate cards')
+    parser.add_argument('--image-root', help='Local mirror of the image server (sets CHEMOPAD_IMAGE_ROOT)')
+    parser.add_argument('--origin', help='Image server URL (sets CHEMOPAD_IMAGE_ORIGIN)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: all cores)')
+    parser.add_argument('--rehash', action='store_true', help='Recompute hashes of all cards')
+    parser.add_argument('--no-hash', action='store_true', help='Only list duplicates from stored hashes')
+    parser.add_argument('--max-distance', type=int, default=duplicates.MAX_PHASH_DISTANCE,
+                        help='Largest pHash Hamming distance to report')
+    parser.add_argument('--dhash-distance', type=int, default=duplicates.MAX_DHASH_DISTANCE,
+                        help='Largest dHash Hamming distance to report')
+    args = parser.parse_args()
+
+    # The thumbnails module reads its configuration from the environment at import,
+    # and worker processes inherit it
+    if args.image_root:
+        os.environ['CHEMOPAD_IMAGE_ROOT'] = args.image_root
+    if args.origin:
+        os.environ['CHEMOPAD_IMAGE_ORIGIN'] = args.origin
+
+    if not args.no_hash:
+        hash_cards(args)
+    list_duplicates(args)
+
+if __name__ == '__main__':
+    main()
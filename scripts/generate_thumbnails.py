@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Thumbnail Pre-generation
+Renders thumbnails of every project card image in all served sizes and formats
+ahead of time, so the first gallery view of the day does not render them lazily
+
+Cards are rendered in parallel with one process per core. Source image hashes
+are appended to a manifest in the thumbnail directory as cards finish, so an
+interrupted run resumes where it stopped: cards whose thumbnails all exist are
+skipped without reading their source unless --rehash is given, in which case
+sources are re-read and only cards whose image content changed are re-rendered.
+
+Usage:
+  generate_thumbnails.py [--workers N] [--sizes 160,320,...] [--formats webp,jpeg]
+                         [--image-root DIR] [--origin URL] [--thumb-dir DIR] [--rehash]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+
+# Add flask-app to path (script is in scripts/, so go up one level)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask-app'))
+
+def ignore_sigint():
+    """Worker initializer: Ctrl-C is handled by the main process alone"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def render_card(card_id, location, sizes, formats, known_hash, rehash):
+    """Worker: render one card's thumbnails unless they are current
+
+    Returns (card_id, source sha256 or None, thumbnails written, bytes read, error).
+    """
+    import thumbnails
+
+    paths = {(size, fmt): thumbnails.thumbnail_path(card_id, size, fmt) for size in sizes for fmt in formats}
+    complete = all(os.path.exists(path) for path in paths.values())
+    if complete and known_hash and not rehash:
+        return card_id, known_hash, 0, 0, None
+
+    try:
+        data = thumbnails.read_source(location)
+        digest = hashlib.sha256(data).hexdigest()
+        # Thumbnails rendered lazily by the app have no manifest entry yet but are just as current
+        if complete and known_hash in (None, digest):
+            return card_id, digest, 0, len(data), None
+
+        outputs = thumbnails.render_thumbnails(data, sizes, formats)
+        for key, output in outputs.items():
+            thumbnails.write_thumbnail(paths[key], output)
+        return card_id, digest, len(outputs), len(data), None
+    except thumbnails.ThumbnailError as e:
+        return card_id, None, 0, 0, str(e)
+
+def load_manifest(manifest_path):
+    """Read {card_id: {'location', 'sha256'}} from the manifest, later lines winning"""
+    manifest = {}
+    if not os.path.exists(manifest_path):
+        return manifest
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            manifest[entry['card_id']] = entry
+    return manifest
+
+def compact_manifest(manifest_path, manifest):
+    """Rewrite the manifest with one line per card"""
+    tmp_path = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        for entry in manifest.values():
+            f.write(json.dumps(entry) + '\n')
+    os.replace(tmp_path, manifest_path)
+
+def generate_thumbnails(args):
+    import thumbnails
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    formats = args.formats.split(',')
+    for size in sizes:
+        if size not in thumbnails.SIZES:
+            print(f"❌ Error: size {size} is not served (choose from {', '.join(map(str, thumbnails.SIZES))})")
+            sys.exit(1)
+    for fmt in formats:
+        if fmt not in thumbnails.FORMATS:
+            print(f"❌ Error: unknown format {fmt} (choose from {', '.join(thumbnails.FORMATS)})")
+            sys.exit(1)
+
+    print("🖼️  Generating Thumbnails")
+    print("=" * 60)
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cards = pd.read_csv(os.path.join(base_dir, 'data', 'project_cards.csv'),
+                        usecols=['id', 'processed_file_location'])
+    cards = cards.dropna(subset=['processed_file_location']).drop_duplicates('id')
+
+    thumb_dir = thumbnails.get_thumb_dir()
+    manifest_path = os.path.join(thumb_dir, thumbnails.MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    tasks = []
+    for card_id, location in zip(cards['id'].astype(int).tolist(), cards['processed_file_location']):
+        entry = manifest.get(card_id)
+        # A card now pointing at a different file has to be rendered again
+        known_hash = entry['sha256'] if entry and entry['location'] == location else None
+        tasks.append((card_id, location, known_hash))
+
+    source = thumbnails.IMAGE_ROOT or thumbnails.IMAGE_ORIGIN
+    print(f"Cards with images: {len(tasks)} ({len(manifest)} in manifest)")
+    print(f"Source: {source}")
+    print(f"Output: {thumb_dir}")
+    print(f"Sizes: {', '.join(map(str, sizes))} px, formats: {', '.join(formats)}")
+    print(f"Workers: {args.workers}\n")
+
+    rendered = skipped = failed = thumbnails_written = bytes_read = 0
+    start_time = last_report = time.perf_counter()
+
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=ignore_sigint)
+    interrupted = False
+    locations = {card_id: location for card_id, location, _ in tasks}
+    with open(manifest_path, 'a') as manifest_file:
+        try:
+            futures = [executor.submit(render_card, card_id, location, sizes, formats, known_hash, args.rehash)
+                       for card_id, location, known_hash in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                card_id, digest, written, size_read, error = future.result()
+                bytes_read += size_read
+                if error:
+                    failed += 1
+                    print(f"  ⚠️  Card {card_id}: {error}")
+                elif written:
+                    rendered += 1
+                    thumbnails_written += written
+                else:
+                    skipped += 1
+
+                # Written as each card finishes, so an interrupted run resumes from here
+                if digest and (card_id not in manifest or manifest[card_id]['sha256'] != digest
+                               or manifest[card_id]['location'] != locations[card_id]):
+                    manifest[card_id] = {'card_id': card_id, 'location': locations[card_id], 'sha256': digest}
+                    manifest_file.write(json.dumps(manifest[card_id]) + '\n')
+                    manifest_file.flush()
+
+                now = time.perf_counter()
+                if now - last_report >= 5 or done == len(futures):
+                    elapsed = now - start_time
+                    print(f"  {done}/{len(futures)} cards  {rendered / elapsed:6.1f} cards/s rendered  "
+                          f"{thumbnails_written / elapsed:6.1f} thumbnails/s  {bytes_read / elapsed / 1e6:6.1f} MB/s read")
+                    last_report = now
+        except (KeyboardInterrupt, BrokenProcessPool) as e:
+            interrupted = True
+            reason = "Interrupted" if isinstance(e, KeyboardInterrupt) else "A worker process died"
+            print(f"\n⏸️  {reason}, run again to resume")
+        finally:
+            # Cards already rendering finish (the next run picks them up); queued ones are dropped
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    compact_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start_time
+    processed = rendered + skipped + failed
+    print(f"\n{'⏸️  Stopped' if interrupted else '✅ Done'} in {elapsed:.1f}s")
+    if interrupted:
+        print(f"  - Processed: {processed} of {len(tasks)} cards")
+    print(f"  - Rendered: {rendered} cards ({thumbnails_written} thumbnails)")
+    print(f"  - Already current: {skipped} cards")
+    print(f"  - Failed: {failed} cards")
+    if elapsed > 0:
+        print(f"  - Throughput: {processed / elapsed:.1f} cards/s, {thumbnails_written / elapsed:.1f} thumbnails/s "
+              f"on {args.workers} workers")
+
+    cache_bytes = thumbnails.cache_size()
+    if cache_bytes > thumbnails.CACHE_MAX_BYTES:
+        print(f"\n⚠️  Thumbnails take {cache_bytes / 1024 / 1024:.0f} MB, more than CHEMOPAD_THUMB_CACHE_MB "
+              f"({thumbnails.CACHE_MAX_BYTES / 1024 / 1024:.0f} MB); the app will evict some on its next render")
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-render thumbnails for all project card images')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: all cores)')
+    parser.add_argument('--sizes', default='160,320,640,1280', help='Comma-separated sizes in pixels')
+    parser.add_argument('--formats', default='webp,jpeg', help='Comma-separated formats')
+    parser.add_argument('--image-root', help='Local mirror of the image server (sets CHEMOPAD_IMAGE_ROOT)')
+    parser.add_argument('--origin', help='Image server URL (sets CHEMOPAD_IMAGE_ORIGIN)')
+    parser.add_argument('--thumb-dir', help='Thumbnail directory (sets CHEMOPAD_THUMB_DIR)')
+    parser.add_argument('--rehash', action='store_true',
+                        help='Re-read every source and re-render cards whose image changed')
+    args = parser.parse_args()
+
+    # The thumbnails module reads its configuration from the environment at import,
+    # and worker processes inherit it
+    if args.image_root:
+        os.environ['CHEMOPAD_IMAGE_ROOT'] = args.image_root
+    if args.origin:
+        os.environ['CHEMOPAD_IMAGE_ORIGIN'] = args.origin
+    if args.thumb_dir:
+        os.environ['CHEMOPAD_THUMB_DIR'] = args.thumb_dir
+
+    generate_thumbnails(args)
+
+if __name__ == '__main__':
+    main()
@@ -202,24 +202,34 @@ def import_export_data(export_file):
     # Import to database
     print(f"\n💾 Importing to database...")
 
-    for item in import_queue:
-        annot_id = item['annot_id']
-
-        # Import match
-        if item['match'] is not None:
-            try:
-                database.save_match(annot_id, item['match'])
-                stats['imported_matches'] += 1
-            except Exception as e:
-                print(f"  ❌ Error importing match for annot_id {annot_id}: {e}")
-
-        # Import note
-        if item['notes'] is not None:
-            try:
-                database.save_note(annot_id, item['notes'])
-                stats['imported_notes'] += 1
-            except Exception as e:
-                print(f"  ❌ Error importing note for annot_id {annot_id}: {e}")
+    # A card can only be matched once: keep the first row claiming it, and skip
+    # cards already matched to an annotation this import does not overwrite
+    matches_to_import = {item['annot_id']: item['match'] for item in import_queue if item['match'] is not None}
+    matched_cards = database.get_matched_cards()
+    claimed_cards = set()
+    for annot_id, card_id in list(matches_to_import.items()):
+        if card_id == "no_match":
+            continue
+        owner = matched_cards.get(card_id)
+        if card_id in claimed_cards or (owner is not None and owner != annot_id and owner not in matches_to_import):
+            print(f"  ❌ Error importing match for annot_id {annot_id}: card {card_id} is already matched to another annotation")
+            del matches_to_import[annot_id]
+        else:
+            claimed_cards.add(card_id)
+
+    # Write matches and notes in one transaction each
+    try:
+        database.save_matches_bulk(matches_to_import.items(), annotator='import')
+        stats['imported_matches'] = len(matches_to_import)
+    except Exception as e:
+        print(f"  ❌ Error importing matches: {e}")
+
+    try:
+        notes_to_import = [(item['annot_id'], item['notes']) for item in import_queue if item['notes'] is not None]
+        database.save_notes_bulk(notes_to_import, annotator='import')
+        stats['imported_notes'] = len(notes_to_import)
+    except Exception as e:
+        print(f"  ❌ Error importing notes: {e}")
 
     # Create backup after import
     print(f"\n💾 Creating backup after import...")
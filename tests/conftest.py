@@ -0,0 +1,32 @@
+"""
+Shared fixtures: every test gets its own scratch database
+"""
+
+import pytest
+
+import database
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Point the database module at a new, initialized file; call again for another one"""
+    count = 0
+
+    def use_new_database():
+        nonlocal count
+        count += 1
+        database.close_db()
+        monkeypatch.setenv('CHEMOPAD_DB_PATH', str(tmp_path / f'db{count}' / 'chemopad.db'))
+        # The row cache is keyed by change version, which restarts in every new file
+        monkeypatch.setattr(database, '_cache', {'version': None, 'matches': {}, 'matched_cards': {},
+                                                 'match_versions': {}, 'notes': {}, 'invalid_cards': {}})
+        database.init_db()
+        return database.get_db_path()
+
+    use_new_database()
+    yield use_new_database
+    database.close_db()
+
+@pytest.fixture
+def db(fresh_db):
+    """A scratch database for tests that need only one"""
+    return database
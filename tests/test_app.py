@@ -0,0 +1,79 @@
+"""
+Match save endpoints: compare-and-set conflicts surface as 409 with the current state
+"""
+
+import pytest
+
+@pytest.fixture
+def client(db):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['authenticated'] = True
+        session['annotator_id'] = 'test'
+    return client
+
+@pytest.fixture
+def pad():
+    """(API, PAD#, annot_ids, candidate card ids) of a PAD# with at least two rows and cards"""
+    import app as app_module
+
+    for (api_name, pad_num), annot_ids in app_module.pad_annot_ids.items():
+        candidates = [candidate['id'] for candidate in app_module.candidates_by_sample.get(pad_num, [])]
+        if len(annot_ids) >= 2 and len(candidates) >= 2:
+            return api_name, pad_num, [int(annot_id) for annot_id in annot_ids], candidates
+    pytest.skip('No PAD# with two rows and two cards in the data')
+
+def test_save_match_returns_new_version(client, pad):
+    _, _, annot_ids, cards = pad
+    response = client.post('/api/save_match', json={'annot_id': annot_ids[0], 'card_id': cards[0], 'version': 0})
+    assert response.status_code == 200
+    assert response.json == {'success': True, 'version': 1}
+
+def test_stale_version_gets_409_with_current_state(client, pad):
+    _, _, annot_ids, cards = pad
+    client.post('/api/save_match', json={'annot_id': annot_ids[0], 'card_id': cards[0], 'version': 0})
+
+    # A second annotator still showing version 0 marks the row as no match
+    response = client.post('/api/save_match', json={'annot_id': annot_ids[0], 'is_no_match': True, 'version': 0})
+    assert response.status_code == 409
+    assert response.json['conflict'] is True
+    assert response.json['current'] == {'card_id': cards[0], 'version': 1}
+
+def test_used_card_gets_409(client, pad):
+    _, _, annot_ids, cards = pad
+    client.post('/api/save_match', json={'annot_id': annot_ids[0], 'card_id': cards[0], 'version': 0})
+
+    response = client.post('/api/save_match', json={'annot_id': annot_ids[1], 'card_id': cards[0], 'version': 0})
+    assert response.status_code == 409
+    assert response.json['current'] == {'card_owner': annot_ids[0]}
+
+def test_bulk_save_conflict_saves_nothing(client, pad):
+    import database
+
+    _, _, annot_ids, cards = pad
+    client.post('/api/save_match', json={'annot_id': annot_ids[0], 'card_id': cards[0], 'version': 0})
+
+    response = client.post('/api/save_matches', json={'matches': [
+        {'annot_id': annot_ids[0], 'is_no_match': True, 'version': 0},
+        {'annot_id': annot_ids[1], 'card_id': cards[1], 'version': 0},
+    ]})
+    assert response.status_code == 409
+    assert set(response.json['current']) == {str(annot_ids[0])}
+    assert annot_ids[1] not in database.get_all_matches()
+
+@pytest.mark.parametrize('matches', [[5], ['a'], [{'annot_id': 1, 'version': '2'}], [{'annot_id': 1, 'version': True}]])
+def test_bulk_save_rejects_malformed_items(client, matches):
+    response = client.post('/api/save_matches', json={'matches': matches})
+    assert response.status_code == 400
+
+def test_pad_state_reports_versions(client, pad):
+    api_name, pad_num, annot_ids, cards = pad
+    client.post('/api/save_match', json={'annot_id': annot_ids[0], 'card_id': cards[0], 'version': 0})
+
+    state = client.get(f'/api/pad-state?api={api_name}&pad={pad_num}').json
+    rows = {row['annot_id']: row for row in state['rows']}
+    assert rows[annot_ids[0]] == {'annot_id': annot_ids[0], 'matched_id': cards[0], 'is_no_match': False, 'version': 1}
+    assert rows[annot_ids[1]]['version'] == 0
+    assert cards[0] in state['used_cards']
@@ -0,0 +1,79 @@
+"""
+Auto-matcher assignments against brute force on small matrices
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import automatch
+import ranking
+
+def brute_force_cost(cost):
+    """Lowest total cost over every assignment of min(n, m) rows to distinct columns"""
+    n, m = cost.shape
+    if n <= m:
+        return min(cost[range(n), list(cols)].sum() for cols in itertools.permutations(range(m), n))
+    return min(cost[list(rows), range(m)].sum() for rows in itertools.permutations(range(n), m))
+
+@pytest.mark.parametrize('shape', [(1, 1), (3, 3), (4, 6), (6, 4), (5, 5), (2, 7)])
+def test_hungarian_matches_brute_force(shape):
+    rng = np.random.default_rng(sum(shape))
+    for _ in range(40):
+        # Small integer costs so ties are common
+        cost = rng.integers(-5, 6, size=shape).astype(float)
+        rows, cols = automatch.hungarian(cost)
+
+        assert len(rows) == min(shape)
+        assert len(set(rows.tolist())) == len(rows) and len(set(cols.tolist())) == len(cols)
+        assert list(rows) == sorted(rows)
+        assert cost[rows, cols].sum() == pytest.approx(brute_force_cost(cost))
+
+def test_hungarian_prefers_the_cheaper_cross_assignment():
+    cost = np.array([[1.0, 2.0], [3.0, 9.0]])
+    rows, cols = automatch.hungarian(cost)
+    assert list(zip(rows.tolist(), cols.tolist())) == [(0, 1), (1, 0)]
+
+@pytest.fixture
+def small_pad():
+    """One PAD# with four cards and three annotation rows"""
+    cards = [
+        {'id': 101, 'camera_type_1': 'iPad', 'sample_name': 'Cisplatin', 'deleted': False,
+         'date_of_creation': '2024-01-01 10:00:00'},
+        {'id': 102, 'camera_type_1': 'Google Pixel 3a', 'sample_name': 'Cisplatin', 'deleted': False,
+         'date_of_creation': '2024-01-01 10:01:00'},
+        {'id': 103, 'camera_type_1': 'iPad', 'sample_name': 'Carboplatin', 'deleted': True,
+         'date_of_creation': '2024-01-01 10:02:00'},
+        {'id': 104, 'camera_type_1': 'Nokia', 'sample_name': 'Cisplatin (x)', 'deleted': False,
+         'date_of_creation': '2024-01-01 10:03:00'},
+    ]
+    annotations = pd.DataFrame({
+        'annot_id': [1, 2, 3],
+        'API': ['Cisplatin', 'Cisplatin', 'Cisplatin'],
+        'Camera': ['ipad', 'pixel', 'nokia'],
+    })
+    ranking.configure({7: cards}, annotations)
+    return [(1, 'Cisplatin'), (2, 'Cisplatin'), (3, 'Cisplatin')]
+
+def test_proposals_are_the_best_assignment(small_pad):
+    proposals = automatch.propose_pad(7, small_pad, {}, {}, {}, min_score=-100)
+    card_ids, scores = ranking.score_pad(7, [1, 2, 3], {}, {})
+
+    assert len(proposals) == 3
+    assert len({proposal['card_id'] for proposal in proposals}) == 3
+    total = sum(proposal['score'] for proposal in proposals)
+    assert total == pytest.approx(-brute_force_cost(-scores))
+    assert {proposal['annot_id']: proposal['card_id'] for proposal in proposals} == {1: 101, 2: 102, 3: 104}
+
+def test_proposals_skip_matched_rows_and_used_cards(small_pad):
+    matches = {1: 102}
+    proposals = automatch.propose_pad(7, small_pad, matches, {102: 1}, {104: 'blurry'}, min_score=-100)
+
+    assert {proposal['annot_id'] for proposal in proposals} == {2, 3}
+    assert {proposal['card_id'] for proposal in proposals} <= {101, 103}
+
+def test_weak_assignments_are_not_proposed(small_pad):
+    proposals = automatch.propose_pad(7, small_pad, {}, {}, {})
+    assert all(proposal['score'] >= automatch.MIN_SCORE for proposal in proposals)
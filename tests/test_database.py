@@ -0,0 +1,85 @@
+"""
+Compare-and-set match writes and the bulk write functions
+"""
+
+import pytest
+
+import database
+import restore
+
+def test_versions_count_every_write(db):
+    assert db.save_match(1, 10) == 1
+    assert db.save_match(1, "no_match") == 2
+    assert db.save_match(1, None) == 3
+    # Versions keep counting after an unmatch, so an old version never becomes valid again
+    assert db.save_match(1, 11) == 4
+    assert db.get_match_version(1) == 4
+    assert db.get_match_version(2) == 0
+
+def test_stale_version_is_rejected_with_current_state(db):
+    version = db.save_match(1, 10, expected_version=0)
+    db.save_match(1, 11, expected_version=version)
+
+    with pytest.raises(db.MatchConflictError) as excinfo:
+        db.save_match(1, "no_match", expected_version=version)
+    assert excinfo.value.conflicts == {1: {'card_id': 11, 'version': 2}}
+    assert db.get_all_matches()[1] == 11
+
+def test_bulk_conflict_writes_nothing(db):
+    db.save_match(1, 10)
+    with pytest.raises(db.MatchConflictError) as excinfo:
+        db.save_matches_bulk([(1, 12), (2, 13)], expected_versions={1: 0, 2: 0})
+    assert set(excinfo.value.conflicts) == {1}
+    assert db.get_all_matches() == {1: 10}
+
+def test_card_used_twice_is_rejected(db):
+    db.save_match(1, 10)
+    with pytest.raises(db.CardAlreadyMatchedError):
+        db.save_match(2, 10)
+    with pytest.raises(db.CardAlreadyMatchedError):
+        db.save_matches_bulk([(3, 20), (4, 20)])
+    assert db.get_all_matches() == {1: 10}
+
+def test_cards_can_move_within_a_batch(db):
+    db.save_matches_bulk([(1, 10), (2, 20)])
+    db.save_matches_bulk([(1, 20), (2, 10)])
+    assert db.get_all_matches() == {1: 20, 2: 10}
+    assert db.get_matched_cards() == {20: 1, 10: 2}
+
+# Each step is a batch; per-row saves apply it one pair at a time
+STEPS = [
+    [(1, 10), (2, 20), (3, "no_match"), (4, 40)],
+    [(2, None), (3, 30), (5, 20)],
+    [(1, None), (4, "no_match"), (6, 10)],
+]
+NOTE_STEPS = [
+    [(1, 'blurry'), (2, 'check lighting')],
+    [(1, ''), (3, 'retake')],
+]
+
+def _state():
+    return (dict(database.get_all_matches()), dict(database.get_matched_cards()),
+            dict(database.get_all_notes()))
+
+def test_bulk_and_per_row_saves_agree(fresh_db):
+    for step in STEPS:
+        for annot_id, card_id in step:
+            database.save_match(annot_id, card_id)
+    for step in NOTE_STEPS:
+        for annot_id, note_text in step:
+            database.save_note(annot_id, note_text)
+    per_row = _state()
+    per_row_events = restore.diff('live', 'events')
+
+    fresh_db()
+    for step in STEPS:
+        database.save_matches_bulk(step)
+    for step in NOTE_STEPS:
+        database.save_notes_bulk(step)
+
+    assert per_row == ({3: 30, 4: "no_match", 5: 20, 6: 10}, {30: 3, 20: 5, 10: 6},
+                       {2: 'check lighting', 3: 'retake'})
+    assert _state() == per_row
+    # Both leave an event log that replays to the same rows
+    for result in (per_row_events, restore.diff('live', 'events')):
+        assert all(sum(changes['counts'].values()) == 0 for changes in result.values())
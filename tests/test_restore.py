@@ -0,0 +1,85 @@
+"""
+Backup → restore round trips and match event log replay
+"""
+
+import database
+import restore
+
+def _state():
+    return dict(database.get_all_matches()), dict(database.get_all_notes())
+
+def _unchanged(result):
+    return all(sum(changes['counts'].values()) == 0 for changes in result.values())
+
+def test_full_and_delta_backups_restore_their_state(db):
+    db.save_matches_bulk([(1, 10), (2, 20), (3, "no_match")])
+    db.save_note(1, 'first')
+    full_state = _state()
+    full_name, _ = db.create_file_backup('manual', incremental=False)
+
+    db.save_matches_bulk([(1, None), (2, 21), (4, 40)])
+    db.save_note(1, '')
+    db.save_note(2, 'second')
+    delta_state = _state()
+    delta_name, _ = db.create_file_backup('manual', incremental=True)
+    assert delta_name.endswith('.json.gz')
+    assert db.get_backup_catalog(kind='delta')[0]['base_filename'] == full_name
+
+    db.save_matches_bulk([(2, None), (5, 10)])
+    db.save_note(3, 'later')
+
+    restore.restore(delta_name)
+    assert _state() == delta_state
+    assert _unchanged(restore.diff('live', delta_name))
+
+    restore.restore(full_name)
+    assert _state() == full_state
+    assert _unchanged(restore.diff('live', full_name))
+
+def test_restore_selected_keys_only(db):
+    db.save_matches_bulk([(1, 10), (2, 20)])
+    backup_name, _ = db.create_file_backup('manual', incremental=False)
+    db.save_matches_bulk([(1, 11), (2, 21)])
+
+    preview = restore.diff('live', backup_name, ['matches'], keys=[1])
+    assert preview['matches']['counts'] == {'added': 0, 'removed': 0, 'changed': 1}
+    assert restore.restore(backup_name, ['matches'], [1]) == {'matches': 1}
+    assert db.get_all_matches() == {1: 10, 2: 21}
+
+def test_restore_keeps_a_pre_restore_backup(db):
+    db.save_match(1, 10)
+    backup_name, _ = db.create_file_backup('manual', incremental=False)
+    db.save_match(1, 11)
+
+    restore.restore(backup_name)
+    assert db.get_backup_catalog('pre_restore')
+    assert db.get_all_matches() == {1: 10}
+
+def test_event_log_replays_to_live_state(db):
+    db.save_match(1, 10, annotator='a')
+    db.save_match(1, 11, annotator='b')
+    db.save_match(2, "no_match")
+    db.save_match(3, 30)
+    db.save_match(3, None)
+    db.save_matches_bulk([(4, 40), (5, 50)], annotator='c')
+    db.save_note(4, 'note')
+    db.save_notes_bulk([(4, ''), (5, 'other')])
+
+    assert _unchanged(restore.diff('live', 'events'))
+
+def test_event_log_restores_rows_lost_outside_the_app(db):
+    db.save_matches_bulk([(1, 10), (2, 20)])
+    db.save_note(2, 'keep me')
+    state = _state()
+
+    # Raw SQL bypasses match_events, like a bad manual fix-up would
+    with db.get_db() as conn:
+        conn.execute('DELETE FROM matches')
+        conn.execute('DELETE FROM notes')
+        conn.commit()
+    assert db.get_all_matches() == {}
+
+    result = restore.diff('live', 'events')
+    assert result['matches']['counts']['added'] == 2
+    restore.restore('events', ['matches', 'notes'])
+    assert _state() == state